@@ -0,0 +1,160 @@
+"""
+Micro-benchmark and regression check for the compiled term blacklist.
+
+The regression check runs the original set-by-set implementation and the
+compiled one over every blacklist entry (original, lower, upper and title
+case), the synthetic CV vocabulary, pattern-shaped strings and every
+DRUG_DICT key (upper, lower and title case). The only differences allowed
+are casing variants of listed terms that are not drug names, which the old
+case-sensitive sets let through; drug names must be filtered exactly as before.
+
+Run from backend/:
+    python -m benchmarks.bench_blacklist --check
+    python -m benchmarks.bench_blacklist --terms 50000
+"""
+import argparse
+import random
+import sys
+import time
+
+from benchmarks.synthetic_cv import DISTRACTOR_TERMS, SECTIONS
+from utils.term_blacklist import (
+    BLACKLISTS, DATE_PATTERN, MOSTLY_SPECIAL_CHARS, STUDY_CODE_PATTERN,
+    clean_text, filter_terms, get_blacklist, should_exclude_term,
+)
+
+PATTERN_SAMPLES = [
+    "NCT01234567", "A12B-CD-EFGH", "AB123", "US-12-A3", "2019–2021", "3/2020", "12/31/2020",
+    "--", "(x)", "***", "a", "Ab", "AB", "O2", "Fe", "x1", "•", "\u200b", "\t", "  ", "",
+    "IL-2", "5-FU", "CAR-T", "PD-1", "anti-PD-1", "mAb", "HER2+", "(R)", "[cisplatin]",
+]
+EXTRA_WORDS = [
+    "cisplatin", "Pembrolizumab", "KEYTRUDA", "nivolumab", "oncology", "immunotherapy",
+    "biomarker", "trial", "protocol", "the", "and", "Clinical", "clinical", "Care",
+]
+
+
+def legacy_should_exclude_term(term: str):
+    """
+    The blacklist check as it was before compilation: one case-sensitive set
+    probe per list, then the patterns and the short-term rule.
+    """
+    if not term or not term.strip():
+        return True
+    term_clean = clean_text(term)
+    if any(term_clean in terms for terms in BLACKLISTS.values()):
+        return True
+    if STUDY_CODE_PATTERN.match(term_clean) or DATE_PATTERN.match(term_clean):
+        return True
+    if len(term_clean) <= 2:
+        return not (term_clean.isupper() and term_clean.isalpha())
+    if MOSTLY_SPECIAL_CHARS.match(term_clean):
+        return True
+    return False
+
+
+def drug_name_terms():
+    """
+    Every DRUG_DICT key in upper, lower and title case ([] without the FDA data).
+    """
+    try:
+        from utils.drug_lookup_dict import DRUG_DICT, init_drug_dict
+
+        init_drug_dict()
+    except Exception as e:
+        print(f"Drug names skipped ({e})")
+        return []
+    return sorted({form for key in DRUG_DICT.keys() for form in (key, key.lower(), key.title())})
+
+
+def regression_terms():
+    terms = set(PATTERN_SAMPLES) | set(EXTRA_WORDS) | set(SECTIONS)
+    for terms_list in BLACKLISTS.values():
+        for term in terms_list:
+            terms.update((term, term.lower(), term.upper(), term.title()))
+    for phrase in DISTRACTOR_TERMS:
+        terms.update(phrase.split())
+    return sorted(terms)
+
+
+def check() -> bool:
+    listed = {clean_text(term).casefold() for terms in BLACKLISTS.values() for term in terms}
+    drug_terms = drug_name_terms()
+    terms = sorted(set(regression_terms()) | set(drug_terms))
+    compiled = get_blacklist()
+    unexpected, case_fixes = [], []
+    for term in terms:
+        old, new = legacy_should_exclude_term(term), compiled.category(term) is not None
+        if old == new:
+            continue
+        if new and clean_text(term).casefold() in listed and clean_text(term).upper() not in compiled.protected:
+            case_fixes.append(term)
+        else:
+            unexpected.append((term, old, new))
+
+    print(f"{len(terms)} terms checked ({len(drug_terms)} drug name forms), "
+          f"{len(case_fixes)} newly excluded casing variants")
+    for term in case_fixes:
+        print(f"  casing variant: {term!r} ({compiled.category(term)})")
+    for term, old, new in unexpected:
+        print(f"  changed: {term!r} excluded {old} -> {new} ({compiled.category(term)})")
+    return not unexpected
+
+
+def workload(count: int, seed: int = 0):
+    """
+    Candidate stream shaped like noun-chunk output: mostly repeated ordinary
+    words, some listed terms in mixed case, some codes.
+    """
+    rng = random.Random(seed)
+    listed = [term for terms in BLACKLISTS.values() for term in terms]
+    pool = EXTRA_WORDS + [word for phrase in DISTRACTOR_TERMS for word in phrase.split()]
+    terms = []
+    for _ in range(count):
+        roll = rng.random()
+        if roll < 0.3:
+            term = rng.choice(listed)
+            terms.append(term.lower() if rng.random() < 0.3 else term)
+        elif roll < 0.4:
+            terms.append(rng.choice(PATTERN_SAMPLES))
+        else:
+            terms.append(rng.choice(pool))
+    return terms
+
+
+def bench(label: str, func, repeat: int = 5):
+    """
+    Best of repeat runs, in seconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return label, min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark and regression-check the term blacklist")
+    parser.add_argument("--terms", type=int, default=20000)
+    parser.add_argument("--check", action="store_true", help="only run the regression check")
+    args = parser.parse_args()
+
+    passed = check()
+    if args.check:
+        sys.exit(0 if passed else 1)
+
+    terms = workload(args.terms)
+    get_blacklist()
+    results = [
+        bench("legacy per term", lambda: [legacy_should_exclude_term(term) for term in terms]),
+        bench("compiled per term", lambda: [should_exclude_term(term) for term in terms]),
+        bench("compiled batch", lambda: filter_terms(terms)),
+    ]
+    baseline = results[0][1]
+    for label, seconds in results:
+        print(f"{label:<20} {seconds * 1e3:8.2f} ms  {seconds / len(terms) * 1e9:8.0f} ns/term  x{baseline / seconds:.1f}")
+
+
+if __name__ == "__main__":
+    main()
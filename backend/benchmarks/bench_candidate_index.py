@@ -0,0 +1,117 @@
+"""
+Insert, merge and query cost of the candidate search index on synthetic
+extraction results. Each CV mentions a Zipf-distributed sample of drugs,
+each drug belongs to a few pharm classes, so common terms have very long
+posting lists, as real ones do. No model or PDF is needed.
+
+Run from backend/:
+    python -m benchmarks.bench_candidate_index --documents 200000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.load_test import percentile
+from utils.candidate_index import CANDIDATE_INDEX_MERGE_ROWS, CandidateIndex
+
+
+def synthetic_drugs(count: int, classes: int, rng):
+    return [
+        {
+            "product_ndc": f"{i:05d}-{i % 997:03d}",
+            "brand_name": f"Brand{i}",
+            "generic_name": f"drugium{i}",
+            "active_ingredients": [{"name": f"DRUGIUM{i} HYDROCHLORIDE"}],
+            "pharm_class": [f"Synthetic Class {rng.randrange(classes)} [EPC]" for _ in range(rng.randint(1, 3))],
+        }
+        for i in range(count)
+    ]
+
+
+def synthetic_cv(drugs, weights, rng, mentions: int):
+    chosen = {id(record): record for record in rng.choices(drugs, weights=weights, k=rng.randint(1, mentions))}
+    return [
+        {
+            "name": record["generic_name"],
+            "source": "exact_match",
+            "offsets": [[0, 1]] * rng.randint(1, 4),
+            "info": {"is_ingredient": False, "record": record},
+        }
+        for record in chosen.values()
+    ]
+
+
+def time_queries(index: CandidateIndex, queries, repeats: int):
+    rows = []
+    for query in queries:
+        latencies, total = [], 0
+        for _ in range(repeats):
+            start = time.perf_counter()
+            total = index.search(query, limit=20)["total"]
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        rows.append((query, total, percentile(latencies, 0.5) * 1000, percentile(latencies, 0.95) * 1000))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Candidate index insert / merge / query benchmark")
+    parser.add_argument("--documents", type=int, default=100000)
+    parser.add_argument("--drugs", type=int, default=5000)
+    parser.add_argument("--classes", type=int, default=300)
+    parser.add_argument("--mentions", type=int, default=30, help="max distinct drugs per CV")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--merge-rows", type=int, default=CANDIDATE_INDEX_MERGE_ROWS,
+                        help="pending rows that trigger a merge during the inserts")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    drugs = synthetic_drugs(args.drugs, args.classes, rng)
+    weights = [1 / (rank + 1) for rank in range(len(drugs))]
+
+    with tempfile.TemporaryDirectory(prefix="bench-candidates-") as directory:
+        path = os.path.join(directory, "candidates.sqlite3")
+        index = CandidateIndex(path, merge_rows=args.merge_rows)
+
+        start = time.perf_counter()
+        for offset in range(0, args.documents, args.batch_size):
+            index.add_many([
+                (f"cv-{number}", f"cv-{number}.pdf", synthetic_cv(drugs, weights, rng, args.mentions))
+                for number in range(offset, min(offset + args.batch_size, args.documents))
+            ])
+        insert_seconds = time.perf_counter() - start
+
+        queries = [
+            "drugium0",
+            "drugium4000",
+            "drugium0 AND drugium1",
+            "drugium0 OR drugium10 OR drugium100",
+            'class:"synthetic class 7"',
+            "(drugium1 OR drugium2) NOT drugium0",
+        ]
+        pending = time_queries(index, queries, max(1, args.repeats // 4))
+
+        start = time.perf_counter()
+        index.merge()
+        merge_seconds = time.perf_counter() - start
+        merged = time_queries(index, queries, args.repeats)
+
+        start = time.perf_counter()
+        for number in range(0, args.documents, max(1, args.documents // 1000)):
+            index.delete(f"cv-{number}")
+        delete_seconds = time.perf_counter() - start
+        stats = index.stats()
+
+    print(f"{args.documents} CVs: insert {args.documents / insert_seconds:.0f} CVs/s (background merges overlapping), final merge {merge_seconds:.2f}s, "
+          f"{stats['terms']} terms, {stats['bytes'] / 2**20:.1f} MB, 1000 deletes {delete_seconds:.2f}s")
+    print(f"{'query':<42}{'hits':>8}{'pending p50':>13}{'merged p50':>12}{'merged p95':>12}")
+    for (query, total, pending_p50, _), (_, _, p50, p95) in zip(pending, merged):
+        print(f"{query:<42}{total:>8}{pending_p50:>11.2f}ms{p50:>10.2f}ms{p95:>10.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
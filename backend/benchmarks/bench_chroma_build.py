@@ -0,0 +1,52 @@
+"""
+Build throughput of the fda_drugs collection (utils.chroma_builder) for
+several worker counts and batch sizes. Each configuration builds the first
+--limit deduplicated DRUG_DICT names into its own temporary Chroma store.
+
+Run from backend/:
+    python -m benchmarks.bench_chroma_build --limit 20000 --workers 1 2 4 --batch-sizes 64 256
+"""
+import argparse
+import tempfile
+import time
+
+from utils.chroma_builder import Encoder, build_collection, collect_names
+from utils.drug_lookup_dict import DRUG_DICT, init_drug_dict
+from utils.vectorstore_handler import EMBEDDING_MODEL_NAME
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chroma collection build throughput")
+    parser.add_argument("--limit", type=int, default=20000, help="names to embed per configuration")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[64, 256])
+    parser.add_argument("--chunk-size", type=int, default=8192)
+    args = parser.parse_args()
+
+    init_drug_dict()
+    names, raw = collect_names(DRUG_DICT)
+    print(f"{raw} raw names -> {len(names)} unique ({raw / max(1, len(names)):.1f}x dedup), embedding {min(args.limit, len(names))}")
+    names = names[:args.limit]
+
+    print(f"{'workers':>8}{'batch':>7}{'names/s':>10}{'encode s':>10}{'upsert s':>10}{'total s':>9}")
+    for workers in args.workers:
+        for batch_size in args.batch_sizes:
+            encoder = Encoder(EMBEDDING_MODEL_NAME, workers, batch_size)
+            try:
+                # Warm the pool so process start-up is not billed to the first configuration
+                encoder.encode(names[:workers * batch_size])
+                with tempfile.TemporaryDirectory(prefix="bench-chroma-") as directory:
+                    start = time.perf_counter()
+                    stats = build_collection(
+                        directory, names, DRUG_DICT.version, EMBEDDING_MODEL_NAME,
+                        chunk_size=args.chunk_size, encoder=encoder,
+                    )
+                    seconds = time.perf_counter() - start
+            finally:
+                encoder.close()
+            print(f"{workers:>8}{batch_size:>7}{len(names) / seconds:>10.0f}"
+                  f"{stats['encode_seconds']:>10.1f}{stats['upsert_seconds']:>10.1f}{seconds:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+Compares load time, resident memory and lookup latency of the compact drug
+index and the mmap'd binary artifact against the former full-record dictionaries.
+
+Each mode runs in a fresh subprocess so RSS numbers are not polluted.
+
+Run from backend/:
+    python -m benchmarks.bench_drug_index                 # uses ../data/drug-ndc-0001-of-0001.json
+    python -m benchmarks.bench_drug_index --synthetic 100000
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def current_rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def peak_rss_mb() -> float:
+    # VmHWM resets on exec, unlike ru_maxrss
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def legacy_build(fda_data: dict):
+    """
+    The previous build_drug_dict: full record references under every key.
+    """
+    drug_dict, ndc_dict = {}, {}
+    for record in fda_data.get("results", []):
+        brand = record.get("brand_name")
+        if brand:
+            drug_dict[brand.upper()] = {"is_ingredient": False, "record": record}
+        generic = record.get("generic_name")
+        if generic:
+            drug_dict[generic.upper()] = {"is_ingredient": False, "record": record}
+        for ing in record.get("active_ingredients", []):
+            ing_name = ing.get("name")
+            if ing_name:
+                drug_dict[ing_name.upper()] = {"is_ingredient": True, "record": record}
+        product_ndc = record.get("product_ndc")
+        if product_ndc:
+            ndc_dict[product_ndc] = record
+    return drug_dict, ndc_dict
+
+
+def synthetic_dataset(size: int, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    syllables = [c + v for c in "bcdfglmnprstvxz" for v in "aeiou"] + ["spla", "tin", "pem", "bro", "zu", "ox", "ol"]
+    stems = ["mab", "ine", "azole", "pril", "statin", "olol", "platin", "tinib", "cillin", "sartan"]
+    salts = ["", " HYDROCHLORIDE", " SODIUM", " SUCCINATE"]
+    results = []
+    for i in range(size):
+        name = ("".join(rng.choice(syllables) for _ in range(rng.randint(2, 3))) + rng.choice(stems)).upper()
+        results.append({
+            "product_ndc": f"{i // 1000:05d}-{i % 1000:03d}",
+            "brand_name": f"{name} {rng.choice(['TABLETS', 'INJECTION', 'CREAM'])}",
+            "generic_name": name + rng.choice(salts),
+            "active_ingredients": [{"name": name + rng.choice(salts), "strength": f"{rng.randint(1, 500)} mg/1"}],
+            "pharm_class": ["Platinum-based Drug [EPC]"],
+            "labeler_name": "Synthetic Labs",
+            "packaging": [{"package_ndc": f"{i}-1", "description": "100 TABLET in 1 BOTTLE " * 3}],
+            "openfda": {"manufacturer_name": ["Synthetic Labs"], "rxcui": [str(i)]},
+        })
+    return {"meta": {}, "results": results}
+
+
+def run_mode(mode: str, path: str):
+    baseline_rss = current_rss_mb()
+    start = time.perf_counter()
+
+    if mode == "legacy":
+        with open(path) as f:
+            fda_data = json.load(f)
+        drug_dict, _ = legacy_build(fda_data)
+        del fda_data
+    elif mode == "compact":
+        from utils.drug_lookup_dict import DRUG_DICT, build_store_from_json
+        store, _ = build_store_from_json(path)
+        DRUG_DICT.load(store)
+        drug_dict = DRUG_DICT
+    else:
+        # Artifact is prebuilt by the parent process, this only maps it
+        from utils.drug_artifact import MappedDrugStore
+        from utils.drug_lookup_dict import DRUG_DICT
+        DRUG_DICT.load(MappedDrugStore(path + ".bin"))
+        drug_dict = DRUG_DICT
+    load_seconds = time.perf_counter() - start
+
+    keys = list(drug_dict.keys())
+    sample = random.Random(1).sample(keys, min(10000, len(keys)))
+    start = time.perf_counter()
+    for key in sample:
+        _ = key in drug_dict
+    contains_us = (time.perf_counter() - start) / len(sample) * 1e6
+    start = time.perf_counter()
+    for key in sample:
+        _ = drug_dict[key]["record"]
+    lookup_us = (time.perf_counter() - start) / len(sample) * 1e6
+
+    print(json.dumps({
+        "mode": mode,
+        "keys": len(keys),
+        "load_seconds": round(load_seconds, 3),
+        "rss_mb": round(current_rss_mb() - baseline_rss, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "contains_us": round(contains_us, 3),
+        "lookup_us": round(lookup_us, 3),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the compact drug index against full-record dicts")
+    parser.add_argument("--data", default="../data/drug-ndc-0001-of-0001.json")
+    parser.add_argument("--synthetic", type=int, default=0, help="generate N synthetic records instead of reading --data")
+    parser.add_argument("--mode", choices=["legacy", "compact", "artifact"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args.data)
+        return
+
+    path = args.data
+    if args.synthetic:
+        tmp = tempfile.NamedTemporaryFile("w", suffix=".json", delete=False)
+        json.dump(synthetic_dataset(args.synthetic), tmp)
+        tmp.close()
+        path = tmp.name
+
+    from utils.drug_artifact import build_artifact
+    build_artifact(path, path + ".bin")
+
+    try:
+        for mode in ("legacy", "compact", "artifact"):
+            out = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_drug_index", "--mode", mode, "--data", path],
+                capture_output=True, text=True, check=True
+            ).stdout.strip().splitlines()[-1]
+            result = json.loads(out)
+            print(
+                f"{result['mode']:<9} keys={result['keys']:<8} load={result['load_seconds']:7.3f}s "
+                f"rss=+{result['rss_mb']:8.1f}MB peak={result['peak_rss_mb']:8.1f}MB "
+                f"contains={result['contains_us']:6.3f}us lookup={result['lookup_us']:7.3f}us"
+            )
+    finally:
+        os.unlink(path + ".bin")
+        if args.synthetic:
+            os.unlink(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,356 @@
+"""
+Reproducible end-to-end benchmark of the extraction path on a synthetic CV
+corpus, with the deterministic stub LLM (LLM_PROVIDER=stub) in place of
+OpenAI / Gemini.
+
+Every configuration runs in a fresh interpreter with its own empty caches,
+over the same generated PDFs. Each goes through load_pdf_text_from_upload ->
+scan_text_for_entities (or the async pipeline with --path async). The report
+per configuration has throughput, end-to-end and per-stage latency
+percentiles (see utils.metrics), peak RSS and precision / recall against the
+ground truth. It is saved as JSON together with the git commit, so runs can be
+compared across commits and settings.
+
+Run from backend/:
+    python -m benchmarks.bench_e2e run --documents 20 --pages 3 --output ../bench/e2e.json
+    python -m benchmarks.bench_e2e run --config batch64:SPACY_BATCH_SIZE=64 \\
+        --config nocache:EMBEDDING_CACHE_ENABLED=0,LLM_CACHE_ENABLED=0 \\
+        --config matrix:VECTOR_BACKEND=matrix --passes 2
+    python -m benchmarks.bench_e2e run --salt-strip-rate 0.2 \\
+        --config normalized --config plain:NORMALIZED_MATCH_ENABLED=0
+    python -m benchmarks.bench_e2e compare ../bench/before.json ../bench/after.json
+    python -m benchmarks.bench_e2e parity --documents 5
+
+parity runs scan_text_for_entities and ascan_text_for_entities over the same
+extracted texts and fails if the entity lists (order included) differ.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import types
+from dataclasses import asdict
+
+from benchmarks.cv_corpus import CorpusSpec, write_corpus
+from benchmarks.load_test import percentile
+
+# Defaults for every configuration; --config values override them
+BASE_ENV = {
+    "LLM_PROVIDER": "stub",
+    "LLM_STUB_LATENCY": "0",
+    "RESOURCES_WARM_UP": "1",
+    "LOG_LEVEL": "WARNING",
+}
+
+
+def parse_config(value: str):
+    """
+    "name:KEY=VALUE,KEY=VALUE" -> (name, {KEY: VALUE}).
+    """
+    name, _, assignments = value.partition(":")
+    env = {}
+    for assignment in filter(None, assignments.split(",")):
+        key, _, setting = assignment.partition("=")
+        env[key.strip()] = setting.strip()
+    return name, env
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def score(entities, truth):
+    """
+    Entity names matched against the ground-truth surface forms. A phrase
+    entity counts for the truth terms it contains; entities containing none
+    are false positives.
+    """
+    truth = set(truth)
+    found, false_positives = set(), 0
+    for entity in entities:
+        name = entity["name"].upper()
+        hits = {term for term in truth if term == name or term in name.replace("-", " ").split()}
+        if hits:
+            found |= hits
+        else:
+            false_positives += 1
+    return {"true_positives": len(found), "false_positives": false_positives, "false_negatives": len(truth - found)}
+
+
+def summarize_latencies(values):
+    values = sorted(values)
+    return {
+        "p50": round(percentile(values, 0.5), 4),
+        "p95": round(percentile(values, 0.95), 4),
+        "p99": round(percentile(values, 0.99), 4),
+        "mean": round(statistics.fmean(values), 4) if values else 0.0,
+    }
+
+
+def run_pass(corpus_dir: str, documents, path: str):
+    import asyncio
+
+    from services.extraction_pipeline import extract_entities_from_bytes
+    from services.pdf_parser import load_pdf_text_from_upload, scan_text_for_entities
+    from utils.metrics import request_timings
+
+    latencies, stage_seconds, counts = [], {}, {}
+    totals = {"true_positives": 0, "false_positives": 0, "false_negatives": 0}
+    pages = 0
+    start = time.perf_counter()
+    for document in documents:
+        with open(os.path.join(corpus_dir, document["file"]), "rb") as f:
+            data = f.read()
+        begin = time.perf_counter()
+        if path == "async":
+            stats = {}
+            entities = asyncio.run(extract_entities_from_bytes(data, stats=stats))
+            timings = stats["timings"]
+        else:
+            with request_timings() as request:
+                # Same object shape /extract receives (upload.file)
+                text = load_pdf_text_from_upload(types.SimpleNamespace(file=io.BytesIO(data)))
+                entities = scan_text_for_entities(text)
+            timings = request.as_dict()
+        latencies.append(time.perf_counter() - begin)
+
+        for stage, seconds in timings["seconds"].items():
+            stage_seconds.setdefault(stage, []).append(seconds)
+        for kind, count in timings["counts"].items():
+            counts[kind] = counts.get(kind, 0) + count
+        pages += timings["counts"].get("pages", 0)
+        for key, value in score(entities, document["truth"]).items():
+            totals[key] += value
+    elapsed = time.perf_counter() - start
+
+    tp, fp, fn = totals["true_positives"], totals["false_positives"], totals["false_negatives"]
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    return {
+        "seconds": round(elapsed, 3),
+        "documents_per_second": round(len(documents) / elapsed, 3),
+        "pages_per_second": round(pages / elapsed, 3),
+        "latency": summarize_latencies(latencies),
+        "stages": {stage: summarize_latencies(values) for stage, values in sorted(stage_seconds.items())},
+        "counts": counts,
+        "precision": round(precision, 4),
+        "recall": round(recall, 4),
+        "f1": round(2 * precision * recall / (precision + recall), 4) if precision + recall else 0.0,
+        **totals,
+    }
+
+
+def worker(corpus_dir: str, passes: int, path: str):
+    """
+    Runs inside the configuration's interpreter; prints one JSON line.
+    """
+    from utils.resources import RESOURCES, process_rss_bytes
+
+    with open(os.path.join(corpus_dir, "truth.json"), encoding="utf-8") as f:
+        documents = json.load(f)["documents"]
+
+    start = time.perf_counter()
+    RESOURCES.warm_up()
+    warm_up_seconds = time.perf_counter() - start
+    results = [run_pass(corpus_dir, documents, path) for _ in range(passes)]
+    print(json.dumps({
+        "warm_up_seconds": round(warm_up_seconds, 3),
+        "rss_mb": round(process_rss_bytes() / 2**20, 1),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "passes": results,
+    }))
+
+
+def parity_worker(corpus_dir: str):
+    """
+    Runs inside a fresh interpreter; prints one JSON line with the documents
+    whose sync and async entity lists differ.
+    """
+    import asyncio
+
+    from services.extraction_pipeline import ascan_text_for_entities
+    from services.pdf_parser import load_pdf_text_from_upload, scan_text_for_entities
+    from utils.resources import RESOURCES
+
+    with open(os.path.join(corpus_dir, "truth.json"), encoding="utf-8") as f:
+        documents = json.load(f)["documents"]
+    RESOURCES.warm_up()
+
+    mismatches = []
+    for document in documents:
+        with open(os.path.join(corpus_dir, document["file"]), "rb") as f:
+            text = load_pdf_text_from_upload(types.SimpleNamespace(file=f))
+        sync_entities = scan_text_for_entities(text)
+        async_entities = asyncio.run(ascan_text_for_entities(text))
+        if sync_entities != async_entities:
+            mismatches.append({
+                "file": document["file"],
+                "sync": [(entity["name"], entity["source"]) for entity in sync_entities],
+                "async": [(entity["name"], entity["source"]) for entity in async_entities],
+            })
+    print(json.dumps({"documents": len(documents), "mismatches": mismatches}))
+
+
+def run_child(name: str, env: dict, args):
+    """
+    Runs `bench_e2e <args>` in a fresh interpreter with the stub LLM and empty caches.
+    """
+    with tempfile.TemporaryDirectory(prefix=f"bench-{name}-") as cache_dir:
+        child_env = {
+            **os.environ, **BASE_ENV,
+            # Fresh caches, so every configuration starts cold
+            "EMBEDDING_CACHE_PATH": os.path.join(cache_dir, "embeddings.sqlite3"),
+            "LLM_CACHE_PATH": os.path.join(cache_dir, "llm_verdicts.sqlite3"),
+            "RESULT_CACHE_PATH": os.path.join(cache_dir, "results.sqlite3"),
+            **env,
+        }
+        return subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_e2e", *args],
+            env=child_env, capture_output=True, text=True,
+        )
+
+
+def run_config(name: str, env: dict, corpus_dir: str, passes: int, path: str):
+    completed = run_child(name, env, ["worker", corpus_dir, "--passes", str(passes), "--path", path])
+    if completed.returncode != 0:
+        raise RuntimeError(f"configuration {name} failed:\n{completed.stderr[-4000:]}")
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    return {"name": name, "env": env, **result}
+
+
+def print_report(report):
+    print(f"commit {report['commit']}  corpus {report['corpus']['spec']}")
+    print(f"{'config':<16}{'pass':>5}{'docs/s':>9}{'p50 s':>9}{'p95 s':>9}{'prec':>7}{'recall':>8}{'peak MB':>9}")
+    for config in report["configs"]:
+        for number, result in enumerate(config["passes"], 1):
+            print(
+                f"{config['name']:<16}{number:>5}{result['documents_per_second']:>9.2f}"
+                f"{result['latency']['p50']:>9.3f}{result['latency']['p95']:>9.3f}"
+                f"{result['precision']:>7.3f}{result['recall']:>8.3f}{config['peak_rss_mb']:>9.1f}"
+            )
+        last = config["passes"][-1]
+        print("    " + "  ".join(f"{stage}={values['p50']:.3f}/{values['p95']:.3f}" for stage, values in last["stages"].items()))
+        documents = report["corpus"]["spec"]["documents"]
+        print("    per CV: " + "  ".join(
+            f"{kind}={last['counts'].get(kind, 0) / documents:.1f}"
+            for kind in ("exact_matches", "normalized_matches", "fuzzy_matches", "vector_queries")
+        ))
+
+
+def compare(paths):
+    """
+    Prints each configuration's last pass from several result files side by side.
+    """
+    reports = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            reports.append(json.load(f))
+    print(f"{'file':<28}{'commit':<10}{'config':<16}{'docs/s':>9}{'p50 s':>9}{'p95 s':>9}{'f1':>7}{'vq/CV':>7}{'peak MB':>9}")
+    for path, report in zip(paths, reports):
+        documents = report["corpus"]["spec"]["documents"]
+        for config in report["configs"]:
+            result = config["passes"][-1]
+            print(
+                f"{os.path.basename(path):<28}{report['commit'] or '-':<10}{config['name']:<16}"
+                f"{result['documents_per_second']:>9.2f}{result['latency']['p50']:>9.3f}"
+                f"{result['latency']['p95']:>9.3f}{result['f1']:>7.3f}"
+                f"{result['counts'].get('vector_queries', 0) / documents:>7.1f}{config['peak_rss_mb']:>9.1f}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end extraction benchmark on synthetic CVs")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("run", help="generate the corpus and benchmark each configuration")
+    run.add_argument("--documents", type=int, default=20)
+    run.add_argument("--pages", type=int, default=3)
+    run.add_argument("--paragraphs-per-page", type=int, default=25)
+    run.add_argument("--drug-density", type=float, default=0.4)
+    run.add_argument("--misspell-rate", type=float, default=0.1)
+    run.add_argument("--distractor-rate", type=float, default=0.3)
+    run.add_argument("--salt-strip-rate", type=float, default=0.0,
+                     help="share of drug mentions written without their salt")
+    run.add_argument("--seed", type=int, default=0)
+    run.add_argument("--config", action="append", default=[],
+                     help="name:KEY=VALUE,... environment overrides (repeatable; default: one 'default' run)")
+    run.add_argument("--passes", type=int, default=1, help="passes over the corpus per configuration")
+    run.add_argument("--path", choices=("sync", "async"), default="sync")
+    run.add_argument("--corpus-dir", help="keep the generated corpus here instead of a temp dir")
+    run.add_argument("--output", help="write the JSON report here")
+    child = sub.add_parser("worker")
+    child.add_argument("corpus_dir")
+    child.add_argument("--passes", type=int, default=1)
+    child.add_argument("--path", default="sync")
+    diff = sub.add_parser("compare", help="compare saved reports")
+    diff.add_argument("reports", nargs="+")
+    parity = sub.add_parser("parity", help="check that the sync and async scans return the same entities")
+    parity.add_argument("--documents", type=int, default=5)
+    parity.add_argument("--seed", type=int, default=0)
+    parity_child = sub.add_parser("parity-worker")
+    parity_child.add_argument("corpus_dir")
+    args = parser.parse_args()
+
+    if args.command == "worker":
+        worker(args.corpus_dir, args.passes, args.path)
+        return
+    if args.command == "parity-worker":
+        parity_worker(args.corpus_dir)
+        return
+    if args.command == "compare":
+        compare(args.reports)
+        return
+    if args.command == "parity":
+        with tempfile.TemporaryDirectory(prefix="bench-corpus-") as corpus_dir:
+            write_corpus(corpus_dir, CorpusSpec(documents=args.documents, seed=args.seed))
+            completed = run_child("parity", {}, ["parity-worker", corpus_dir])
+        if completed.returncode != 0:
+            raise RuntimeError(f"parity check failed:\n{completed.stderr[-4000:]}")
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        for mismatch in result["mismatches"]:
+            print(f"{mismatch['file']}:\n  sync  {mismatch['sync']}\n  async {mismatch['async']}")
+        print(f"{result['documents']} documents, {len(result['mismatches'])} with different sync / async entities")
+        sys.exit(1 if result["mismatches"] else 0)
+
+    spec = CorpusSpec(
+        documents=args.documents, pages=args.pages, paragraphs_per_page=args.paragraphs_per_page,
+        drug_density=args.drug_density, misspell_rate=args.misspell_rate,
+        distractor_rate=args.distractor_rate, salt_strip_rate=args.salt_strip_rate, seed=args.seed,
+    )
+    configs = [parse_config(value) for value in args.config] or [("default", {})]
+    with tempfile.TemporaryDirectory(prefix="bench-corpus-") as temp_dir:
+        corpus_dir = args.corpus_dir or temp_dir
+        corpus = write_corpus(corpus_dir, spec)
+        report = {
+            "commit": git_commit(),
+            "created": time.time(),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+            "path": args.path,
+            "corpus": {"spec": asdict(spec), "vocabulary": corpus["vocabulary"]},
+            "configs": [run_config(name, env, corpus_dir, args.passes, args.path) for name, env in configs],
+        }
+
+    print_report(report)
+    if args.output:
+        directory = os.path.dirname(args.output)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved {args.output}")
+
+
+if __name__ == "__main__":
+    main()
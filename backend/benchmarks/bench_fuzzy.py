@@ -0,0 +1,129 @@
+"""
+Recall and latency of the fuzzy lexical tier against the SapBERT vector tier
+on a labeled list of misspelled drug names plus non-drug distractors.
+
+Run from backend/:
+    python -m benchmarks.bench_fuzzy --terms 2000
+    python -m benchmarks.bench_fuzzy --terms 500 --vector     # needs ../chroma_store
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+
+from benchmarks.bench_drug_index import synthetic_dataset
+from benchmarks.synthetic_cv import DISTRACTOR_TERMS
+from utils.drug_lookup_dict import DRUG_DICT, FDA_DATA_PATH, build_drug_dict, init_drug_dict
+from utils.fuzzy_index import FuzzyDrugIndex, normalize_name
+
+DISTRACTORS = DISTRACTOR_TERMS + [
+    "leadership", "oncology", "investigator", "regulatory", "immunology",
+    "publications", "biostatistics", "manufacturing", "commercialization",
+]
+
+
+def misspell(name: str, rng: random.Random) -> str:
+    """
+    Applies one realistic corruption: typo, dropped/doubled letter, swap,
+    hyphenation or casing change.
+    """
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    chars = list(name.lower())
+    i = rng.randrange(len(chars))
+    kind = rng.choice(["substitute", "delete", "insert", "transpose", "hyphenate", "case"])
+    if kind == "substitute":
+        chars[i] = rng.choice(letters)
+    elif kind == "delete" and len(chars) > 5:
+        del chars[i]
+    elif kind == "insert":
+        chars.insert(i, chars[i])
+    elif kind == "transpose" and i < len(chars) - 1:
+        chars[i], chars[i + 1] = chars[i + 1], chars[i]
+    elif kind == "hyphenate" and 2 < i < len(chars) - 2:
+        chars.insert(i, "-")
+    else:
+        return name.title()
+    return "".join(chars)
+
+
+def labeled_terms(count: int, seed: int = 0):
+    """
+    Returns [(term, expected normalized name or None)]; about one in five is a distractor.
+    """
+    rng = random.Random(seed)
+    names = [key for key in DRUG_DICT.keys() if key.isalpha() and 6 <= len(key) <= 20]
+    terms = []
+    for _ in range(count):
+        if rng.random() < 0.2:
+            terms.append((rng.choice(DISTRACTORS), None))
+        else:
+            name = rng.choice(names)
+            terms.append((misspell(name, rng), normalize_name(name)))
+    return terms
+
+
+def score(predictions, terms):
+    true_positive = sum(1 for p, (_, e) in zip(predictions, terms) if e and p and normalize_name(p) == e)
+    false_positive = sum(1 for p, (_, e) in zip(predictions, terms) if p and (not e or normalize_name(p) != e))
+    positives = sum(1 for _, e in terms if e)
+    recall = true_positive / positives if positives else 0.0
+    precision = true_positive / (true_positive + false_positive) if true_positive + false_positive else 0.0
+    return precision, recall
+
+
+def report(label, predictions, latencies, terms):
+    precision, recall = score(predictions, terms)
+    latencies = sorted(latencies)
+    p99 = latencies[int(len(latencies) * 0.99) - 1] if len(latencies) > 1 else latencies[0]
+    print(
+        f"{label:<8} precision={precision:6.3f} recall={recall:6.3f} "
+        f"p50={statistics.median(latencies) * 1e6:9.1f}us p99={p99 * 1e6:9.1f}us"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the fuzzy drug-name tier against the vector tier")
+    parser.add_argument("--terms", type=int, default=2000)
+    parser.add_argument("--synthetic", type=int, default=50000, help="records to generate when the FDA file is missing")
+    parser.add_argument("--vector", action="store_true", help="also run the SapBERT + Chroma tier")
+    args = parser.parse_args()
+
+    if os.path.exists(FDA_DATA_PATH):
+        init_drug_dict()
+    else:
+        build_drug_dict(synthetic_dataset(args.synthetic))
+
+    index = FuzzyDrugIndex(DRUG_DICT)
+    start = time.perf_counter()
+    index.compile()
+    print(f"Fuzzy index build: {time.perf_counter() - start:.2f}s")
+
+    terms = labeled_terms(args.terms)
+
+    predictions, latencies = [], []
+    for term, _ in terms:
+        start = time.perf_counter()
+        match = index.lookup(term)
+        latencies.append(time.perf_counter() - start)
+        predictions.append(match[0] if match else None)
+    report("fuzzy", predictions, latencies, terms)
+
+    if args.vector:
+        from services.pdf_parser import MAX_VECTOR_DISTANCE
+        from utils.vectorstore_handler import ChromaManager
+
+        vector_store = ChromaManager()
+        predictions, latencies = [], []
+        for term, _ in terms:
+            start = time.perf_counter()
+            result = vector_store.query(term, n_results=1)
+            latencies.append(time.perf_counter() - start)
+            documents, distances = result["documents"][0], result["distances"][0]
+            accepted = documents and distances[0] <= MAX_VECTOR_DISTANCE
+            predictions.append(documents[0] if accepted else None)
+        report("vector", predictions, latencies, terms)
+
+
+if __name__ == "__main__":
+    main()
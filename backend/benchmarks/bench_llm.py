@@ -0,0 +1,100 @@
+"""
+Latency of the chunked async LLM validation engine against the offline stub
+model, across chunk sizes and concurrency limits.
+
+Run from backend/:
+    python -m benchmarks.bench_llm --terms 200 --latency 0.5
+    python -m benchmarks.bench_llm --terms 200 --latency 0.5 --fail-every 4
+    python -m benchmarks.bench_llm --check   # fallback verdicts when the LLM fails
+"""
+import argparse
+import os
+import sys
+import time
+
+os.environ["LLM_PROVIDER"] = "stub"
+os.environ["LLM_CACHE_ENABLED"] = "0"
+
+from benchmarks.synthetic_cv import DISTRACTOR_TERMS, DRUG_NAMES
+from utils import llm_handler
+from utils.llm_stub import stub_verdict
+
+
+def word_contexts(count: int):
+    pool = DRUG_NAMES + DISTRACTOR_TERMS
+    return {
+        f"{pool[i % len(pool)]}{i // len(pool) or ''}": f"Managed a study of {pool[i % len(pool)]} in phase II"
+        for i in range(count)
+    }
+
+
+# FDA keys that are also ordinary words, and multi-word keys, for the fallback check
+COMMON_WORD_KEYS = ["ALLEGRA", "CLEAR", "RELIEF", "FOCUS", "ADVANCE"]
+MULTI_WORD_KEYS = ["SODIUM CHLORIDE", "DEXTROMETHORPHAN HYDROBROMIDE"]
+
+
+def check() -> bool:
+    """
+    Every stub call fails, so all verdicts come from the fallback: single
+    words must be rejected even when they are DRUG_DICT keys, multi-word
+    keys accepted.
+    """
+    if not len(llm_handler.DRUG_DICT):
+        # No FDA data loaded: stand in for the drug index with the check's own keys
+        llm_handler.DRUG_DICT = dict.fromkeys(COMMON_WORD_KEYS + MULTI_WORD_KEYS)
+    llm_handler.LLM_STUB_LATENCY = 0.0
+    llm_handler.LLM_STUB_FAIL_EVERY = 1
+    llm_handler.LLM_MAX_RETRIES = 0
+    llm_handler._CHAINS.clear()
+
+    words = [key.title() for key in COMMON_WORD_KEYS] + [key.lower() for key in MULTI_WORD_KEYS]
+    stats = {}
+    verdicts = llm_handler.llm_validate_pharmaceutical_terms(
+        {word: f"Led the {word} programme in phase II" for word in words}, stats=stats
+    )
+    expected = {word: len(word.split()) > 1 for word in words}
+    wrong = {word: verdict for word, verdict in verdicts.items() if verdict != expected[word]}
+    print(f"{len(words)} fallback verdicts ({stats['heuristic_terms']} heuristic), {len(wrong)} wrong")
+    for word, verdict in wrong.items():
+        print(f"  {word!r}: {verdict}, expected {expected[word]}")
+    return not wrong and stats["heuristic_terms"] == len(words)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chunked async LLM validation with the stub model")
+    parser.add_argument("--terms", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds per stub call")
+    parser.add_argument("--fail-every", type=int, default=0, help="every n-th stub call times out")
+    parser.add_argument("--chunk-sizes", default="1000,50,25,10")
+    parser.add_argument("--concurrency", default="1,4,8")
+    parser.add_argument("--check", action="store_true", help="only check the fallback verdicts")
+    args = parser.parse_args()
+
+    if args.check:
+        sys.exit(0 if check() else 1)
+
+    llm_handler.LLM_STUB_LATENCY = args.latency
+    llm_handler.LLM_STUB_FAIL_EVERY = args.fail_every
+    llm_handler.LLM_RETRY_BASE_DELAY = 0.05
+    w2s = word_contexts(args.terms)
+
+    for chunk_size in map(int, args.chunk_sizes.split(",")):
+        for concurrency in map(int, args.concurrency.split(",")):
+            llm_handler.LLM_CHUNK_SIZE = chunk_size
+            llm_handler.LLM_MAX_CONCURRENCY = concurrency
+            llm_handler._CHAINS.clear()
+
+            stats = {}
+            start = time.perf_counter()
+            verdicts = llm_handler.llm_validate_pharmaceutical_terms(w2s, stats=stats)
+            elapsed = time.perf_counter() - start
+            agreement = sum(verdicts[word] == stub_verdict(word) for word in w2s) / len(w2s)
+            print(
+                f"chunk={chunk_size:<5} concurrency={concurrency:<3} {elapsed:7.2f}s "
+                f"chunks={stats['chunks']} retries={stats['retries']} failed={stats['failed_chunks']} "
+                f"heuristic={stats['heuristic_terms']} agreement={agreement:.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
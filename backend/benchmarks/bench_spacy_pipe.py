@@ -0,0 +1,52 @@
+"""
+Compares per-line spaCy parsing against batched nlp.pipe parsing in
+collect_candidates on a synthetic CV corpus.
+
+Run from backend/:
+    python -m benchmarks.bench_spacy_pipe --cvs 20 --paragraphs 150 --batch-sizes 64 256 --n-process 1 2
+"""
+import argparse
+import os
+import time
+
+from benchmarks.synthetic_cv import generate_corpus
+from utils.drug_lookup_dict import init_drug_dict
+from services.pdf_parser import collect_candidates
+
+
+def run(corpus, **kwargs):
+    start = time.perf_counter()
+    outputs = [collect_candidates(text, **kwargs) for text in corpus]
+    return time.perf_counter() - start, outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark batched spaCy parsing of CV paragraphs")
+    parser.add_argument("--cvs", type=int, default=20)
+    parser.add_argument("--paragraphs", type=int, default=150)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[64, 256, 1024])
+    parser.add_argument("--n-process", type=int, nargs="+", default=[1])
+    args = parser.parse_args()
+
+    if os.path.exists("../data/drug-ndc-0001-of-0001.json"):
+        init_drug_dict()
+
+    corpus = generate_corpus(args.cvs, paragraphs=args.paragraphs)
+    lines = sum(len([p for p in text.split("\n") if p.strip()]) for text in corpus)
+    print(f"Corpus: {len(corpus)} CVs, {lines} paragraphs")
+
+    baseline_time, baseline = run(corpus, batched=False)
+    print(f"per-line           : {baseline_time:8.3f}s  ({lines / baseline_time:8.1f} paragraphs/s)")
+
+    for n_process in args.n_process:
+        for batch_size in args.batch_sizes:
+            elapsed, outputs = run(corpus, batched=True, batch_size=batch_size, n_process=n_process)
+            same = outputs == baseline
+            print(
+                f"pipe bs={batch_size:<5} np={n_process:<2}: {elapsed:8.3f}s  ({lines / elapsed:8.1f} paragraphs/s)"
+                f"  speedup x{baseline_time / elapsed:5.2f}  same candidates: {same}"
+            )
+
+
+if __name__ == "__main__":
+    main()
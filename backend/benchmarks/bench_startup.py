@@ -0,0 +1,51 @@
+"""
+Cold-start cost of a worker process: time from import to ready and RSS,
+with and without the warm-up step, each in a fresh interpreter.
+
+Run from backend/:
+    python -m benchmarks.bench_startup --runs 3
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+CHILD = """
+import json, time
+start = time.perf_counter()
+import main
+from utils.resources import RESOURCES, process_rss_bytes
+imported = time.perf_counter() - start
+RESOURCES.warm_up({load})
+print(json.dumps({{
+    "import_seconds": imported,
+    "ready_seconds": time.perf_counter() - start,
+    "rss_mb": process_rss_bytes() / 2**20,
+}}))
+"""
+
+
+def run(load: bool):
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD.format(load=load)], capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import-to-ready time and RSS of the API process")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    for label, load in (("lazy", False), ("warm", True)):
+        results = [run(load) for _ in range(args.runs)]
+        print(
+            f"{label:<5} import={statistics.median(r['import_seconds'] for r in results):6.2f}s "
+            f"ready={statistics.median(r['ready_seconds'] for r in results):6.2f}s "
+            f"rss={statistics.median(r['rss_mb'] for r in results):7.1f} MB"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Query latency of the in-process vector indexes against the Chroma client on
+fda_drugs, at several batch sizes, plus top-1 agreement with Chroma.
+Queries are stored embeddings with small Gaussian noise, so no model is loaded.
+
+Run from backend/ after `python -m utils.vector_index export [--hnsw]`:
+    python -m benchmarks.bench_vector_index --queries 512 --batch-sizes 1,8,32,128
+"""
+import argparse
+import statistics
+import time
+
+import chromadb
+import numpy as np
+
+from utils.resources import CHROMA_PERSIST_DIR
+from utils.vector_index import VECTOR_INDEX_DIR, load_vector_index
+from utils.vectorstore_handler import COLLECTION_NAME
+
+
+def sample_queries(collection, count: int, noise: float, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    total = collection.count()
+    offset = int(rng.integers(0, max(1, total - count)))
+    vectors = np.asarray(collection.get(limit=count, offset=offset, include=["embeddings"])["embeddings"], dtype=np.float32)
+    scale = noise * np.linalg.norm(vectors, axis=1, keepdims=True) / np.sqrt(vectors.shape[1])
+    return vectors + rng.normal(size=vectors.shape).astype(np.float32) * scale
+
+
+def run(search, queries, batch_size: int, k: int):
+    ids, per_query = [], []
+    for start in range(0, len(queries), batch_size):
+        batch = queries[start:start + batch_size]
+        begin = time.perf_counter()
+        result = search(batch, k)
+        per_query.append((time.perf_counter() - begin) / len(batch))
+        ids.extend(result["ids"])
+    return ids, statistics.median(per_query)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark in-process vector indexes against Chroma")
+    parser.add_argument("--queries", type=int, default=512)
+    parser.add_argument("--batch-sizes", default="1,8,32,128")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--noise", type=float, default=0.05, help="relative Gaussian noise added to stored vectors")
+    parser.add_argument("--index-dir", default=VECTOR_INDEX_DIR)
+    args = parser.parse_args()
+
+    collection = chromadb.PersistentClient(path=CHROMA_PERSIST_DIR).get_collection(COLLECTION_NAME)
+    queries = sample_queries(collection, args.queries, args.noise)
+
+    backends = {"chroma": lambda batch, k: collection.query(query_embeddings=batch.tolist(), n_results=k)}
+    for name in ("matrix", "hnsw"):
+        try:
+            index = load_vector_index(name, args.index_dir)
+        except (ValueError, ImportError) as e:
+            print(f"skipping {name}: {e}")
+            continue
+        backends[name] = index.query
+
+    for batch_size in map(int, args.batch_sizes.split(",")):
+        reference = None
+        for name, search in backends.items():
+            ids, seconds = run(search, queries, batch_size, args.k)
+            if reference is None:
+                reference = ids
+            agreement = np.mean([a[:1] == b[:1] for a, b in zip(ids, reference)])
+            print(f"batch={batch_size:<4} {name:<7} {seconds * 1e3:8.3f} ms/query  top1 vs chroma={agreement:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Synthetic pharma CV PDFs with ground truth, for the end-to-end benchmark.
+
+Each document has a fixed number of pages. Each paragraph is a drug sentence
+(probability drug_density), a distractor sentence (distractor_rate) or
+neutral filler. A drug mention is misspelled with probability misspell_rate,
+or written without its salt ("doxylamine" for DOXYLAMINE SUCCINATE) with
+probability salt_strip_rate.
+The ground truth lists the surface forms a perfect extractor would return:
+every drug name as written, misspelled ones included.
+"""
+import json
+import os
+import random
+from dataclasses import asdict, dataclass
+
+from benchmarks.bench_fuzzy import misspell
+from benchmarks.synthetic_cv import DISTRACTOR_TERMS, DRUG_NAMES, INDICATIONS, PHASES, SECTIONS
+
+DRUG_TEMPLATES = [
+    "Led the {phase} program evaluating {drug} in combination with {drug2} for {indication}.",
+    "Served as medical monitor for a randomized study of {drug} versus placebo.",
+    "Managed safety reporting for the {drug} franchise in {indication}.",
+    "Published {count} peer-reviewed articles on {drug} resistance.",
+]
+DISTRACTOR_TEMPLATES = [
+    "Designed and executed {distractor} initiatives across {count} global sites.",
+    "Coordinated investigator meetings and {distractor} for {indication} studies.",
+    "Responsible for {distractor} within the {indication} portfolio.",
+]
+FILLER_TEMPLATES = [
+    "Supervised a team of {count} direct reports.",
+    "Presented results at {count} international meetings.",
+    "Fluent in English and Spanish.",
+    "Member of the steering committee since {year}.",
+]
+
+
+@dataclass
+class CorpusSpec:
+    documents: int = 20
+    pages: int = 3
+    paragraphs_per_page: int = 25
+    drug_density: float = 0.4
+    misspell_rate: float = 0.1
+    distractor_rate: float = 0.3
+    salt_strip_rate: float = 0.0
+    seed: int = 0
+
+
+def drug_vocabulary(limit: int = 2000, seed: int = 0):
+    """
+    Single-word FDA names from DRUG_DICT when the FDA data is available,
+    otherwise the small built-in list.
+    """
+    try:
+        from utils.drug_lookup_dict import DRUG_DICT, init_drug_dict
+
+        init_drug_dict()
+        names = sorted(key.lower() for key in DRUG_DICT.keys() if key.isalpha() and 6 <= len(key) <= 20)
+    except Exception:
+        names = []
+    if not names:
+        return list(DRUG_NAMES)
+    return random.Random(seed).sample(names, min(limit, len(names)))
+
+
+def salt_stripped_vocabulary(limit: int = 500, seed: int = 0):
+    """
+    Bare names of salt-form DRUG_DICT keys that are not keys themselves, i.e.
+    mentions only the normalized name tier resolves without the vector store.
+    """
+    try:
+        from utils.drug_lookup_dict import DRUG_DICT, init_drug_dict
+        from utils.name_normalizer import normalize_drug_name
+
+        init_drug_dict()
+        names = sorted({
+            bare.lower() for bare in (normalize_drug_name(key) for key in DRUG_DICT.keys())
+            if bare.isalpha() and 6 <= len(bare) <= 20 and bare not in DRUG_DICT
+        })
+    except Exception:
+        names = []
+    if not names:
+        return ["dextromethorphan", "doxylamine", "sertraline", "metoprolol"]
+    return random.Random(seed).sample(names, min(limit, len(names)))
+
+
+def generate_document(seed: int, spec: CorpusSpec, names, bare_names=()):
+    """
+    Returns (pages as lists of paragraphs, ground-truth surface forms).
+    """
+    rng = random.Random(seed)
+    truth = set()
+
+    def mention():
+        if spec.salt_strip_rate and bare_names and rng.random() < spec.salt_strip_rate:
+            name = rng.choice(bare_names)
+            truth.add(name.upper())
+            return name
+        name = rng.choice(names)
+        if rng.random() < spec.misspell_rate:
+            name = misspell(name, rng)
+        truth.add(name.upper())
+        return name
+
+    pages = []
+    for page_number in range(spec.pages):
+        paragraphs = [f"Candidate {seed} - page {page_number + 1}", SECTIONS[page_number % len(SECTIONS)]]
+        for _ in range(spec.paragraphs_per_page):
+            roll = rng.random()
+            fields = {
+                "phase": rng.choice(PHASES), "indication": rng.choice(INDICATIONS),
+                "distractor": rng.choice(DISTRACTOR_TERMS), "count": rng.randint(2, 40),
+                "year": rng.randint(1995, 2024),
+            }
+            if roll < spec.drug_density:
+                template = rng.choice(DRUG_TEMPLATES)
+                fields["drug"] = mention()
+                fields["drug2"] = mention() if "{drug2}" in template else ""
+            elif roll < spec.drug_density + spec.distractor_rate:
+                template = rng.choice(DISTRACTOR_TEMPLATES)
+            else:
+                template = rng.choice(FILLER_TEMPLATES)
+            paragraphs.append(template.format(**fields))
+        pages.append(paragraphs)
+    return pages, sorted(truth)
+
+
+def render_pdf(pages, fontsize: float = 8) -> bytes:
+    import fitz
+
+    doc = fitz.open()
+    for paragraphs in pages:
+        page = doc.new_page()
+        remaining = page.insert_textbox(fitz.Rect(36, 36, 576, 806), "\n".join(paragraphs), fontsize=fontsize)
+        if remaining < 0:
+            raise ValueError("page overflow; lower paragraphs_per_page")
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def write_corpus(directory: str, spec: CorpusSpec):
+    """
+    Writes <n>.pdf files plus truth.json ({"spec", "documents": [{"file", "truth"}]}).
+    """
+    os.makedirs(directory, exist_ok=True)
+    names = drug_vocabulary(seed=spec.seed)
+    bare_names = salt_stripped_vocabulary(seed=spec.seed) if spec.salt_strip_rate else []
+    documents = []
+    for i in range(spec.documents):
+        pages, truth = generate_document(spec.seed + i, spec, names, bare_names)
+        filename = f"{i:04d}.pdf"
+        with open(os.path.join(directory, filename), "wb") as f:
+            f.write(render_pdf(pages))
+        documents.append({"file": filename, "truth": truth})
+    manifest = {"spec": asdict(spec), "vocabulary": len(names), "documents": documents}
+    with open(os.path.join(directory, "truth.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+    return manifest
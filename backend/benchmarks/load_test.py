@@ -0,0 +1,104 @@
+"""
+Load test for a running /extract endpoint: requests per second and latency
+percentiles at several concurrency levels. Standard library only on the client
+side; a synthetic CV PDF is generated with PyMuPDF when --pdf is not given.
+
+Run from backend/ against a server started with e.g. LLM_PROVIDER=stub:
+    python -m benchmarks.load_test --url http://localhost:8000/extract --concurrency 1,4,8,16
+"""
+import argparse
+import statistics
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.synthetic_cv import generate_cv_text
+
+
+def synthetic_pdf(seed: int = 0, paragraphs: int = 120) -> bytes:
+    import fitz
+
+    doc = fitz.open()
+    lines = generate_cv_text(seed, paragraphs=paragraphs).split("\n")
+    for start in range(0, len(lines), 50):
+        page = doc.new_page()
+        page.insert_textbox(fitz.Rect(40, 40, 560, 800), "\n".join(lines[start:start + 50]), fontsize=9)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def multipart_body(pdf_bytes: bytes, filename: str = "cv.pdf"):
+    boundary = uuid.uuid4().hex
+    body = b"".join([
+        f"--{boundary}\r\n".encode(),
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'.encode(),
+        b"Content-Type: application/pdf\r\n\r\n",
+        pdf_bytes,
+        f"\r\n--{boundary}--\r\n".encode(),
+    ])
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+def send(url: str, body: bytes, content_type: str, timeout: float):
+    request = urllib.request.Request(url, data=body, headers={"Content-Type": content_type}, method="POST")
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            ok = response.status == 200
+    except (urllib.error.URLError, TimeoutError, ConnectionError):
+        ok = False
+    return ok, time.perf_counter() - start
+
+
+def percentile(sorted_values, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def run_level(url: str, body: bytes, content_type: str, concurrency: int, requests: int, timeout: float):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda _: send(url, body, content_type, timeout), range(requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for ok, latency in results if ok)
+    errors = sum(1 for ok, _ in results if not ok)
+    print(
+        f"concurrency={concurrency:<4} requests={requests:<5} errors={errors:<4} "
+        f"rps={len(latencies) / elapsed:7.2f} "
+        f"p50={statistics.median(latencies) if latencies else 0:7.3f}s "
+        f"p95={percentile(latencies, 0.95):7.3f}s p99={percentile(latencies, 0.99):7.3f}s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the /extract endpoint")
+    parser.add_argument("--url", default="http://localhost:8000/extract")
+    parser.add_argument("--pdf", help="PDF to upload (default: a synthetic CV)")
+    parser.add_argument("--concurrency", default="1,4,8,16")
+    parser.add_argument("--requests", type=int, default=0, help="requests per level (default: 4x concurrency)")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+
+    if args.pdf:
+        with open(args.pdf, "rb") as f:
+            pdf_bytes = f.read()
+    else:
+        pdf_bytes = synthetic_pdf()
+    body, content_type = multipart_body(pdf_bytes)
+
+    # Warm-up request so model loading is not measured
+    send(args.url, body, content_type, args.timeout)
+
+    for concurrency in map(int, args.concurrency.split(",")):
+        run_level(args.url, body, content_type, concurrency, args.requests or concurrency * 4, args.timeout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import random
+
+# Small built-in vocabulary so CVs can be generated without the FDA dataset
+DRUG_NAMES = [
+    "cisplatin", "pembrolizumab", "nivolumab", "carboplatin", "paclitaxel",
+    "docetaxel", "itraconazole", "metformin", "atorvastatin", "trastuzumab",
+    "bevacizumab", "rituximab", "ibuprofen", "acetaminophen", "gemcitabine",
+    "dextromethorphan", "doxylamine", "olaparib", "osimertinib", "lenalidomide",
+]
+
+DISTRACTOR_TERMS = [
+    "oncology drug development", "clinical operations", "regulatory strategy",
+    "translational research", "biomarker discovery", "phase II trials",
+    "medical affairs", "portfolio management", "pharmacovigilance",
+    "health economics", "team leadership", "protocol design",
+]
+
+SECTIONS = ["SUMMARY", "EXPERIENCE", "EDUCATION", "PUBLICATIONS", "SKILLS", "AWARDS"]
+
+SENTENCE_TEMPLATES = [
+    "Led the {phase} program evaluating {drug} in combination with {drug2} for {indication}.",
+    "Designed and executed {distractor} initiatives across {count} global sites.",
+    "Served as medical monitor for a randomized study of {drug} versus placebo.",
+    "Managed {distractor} for the {drug} franchise, including safety reporting.",
+    "Published {count} peer-reviewed articles on {distractor} and {drug} resistance.",
+    "Coordinated investigator meetings and {distractor} for {indication} studies.",
+]
+
+INDICATIONS = [
+    "non-small cell lung cancer", "metastatic melanoma", "type 2 diabetes",
+    "ovarian cancer", "multiple myeloma", "hypercholesterolemia",
+]
+
+PHASES = ["Phase I", "Phase II", "Phase III", "first-in-human"]
+
+
+def generate_cv_text(seed: int, paragraphs: int = 120, drug_names=None) -> str:
+    """
+    Builds a deterministic synthetic pharma CV as plain text, one paragraph per line.
+    """
+    rng = random.Random(seed)
+    drugs = drug_names or DRUG_NAMES
+    lines = [f"Candidate {seed}", "Curriculum Vitae"]
+
+    for i in range(paragraphs):
+        if i % 20 == 0:
+            lines.append(SECTIONS[(i // 20) % len(SECTIONS)])
+        template = rng.choice(SENTENCE_TEMPLATES)
+        lines.append(template.format(
+            phase=rng.choice(PHASES),
+            drug=rng.choice(drugs),
+            drug2=rng.choice(drugs),
+            indication=rng.choice(INDICATIONS),
+            distractor=rng.choice(DISTRACTOR_TERMS),
+            count=rng.randint(2, 40),
+        ))
+        if rng.random() < 0.2:
+            lines.append("")
+
+    return "\n".join(lines)
+
+
+def generate_corpus(size: int, paragraphs: int = 120, seed: int = 0, drug_names=None):
+    """
+    Returns a list of synthetic CV texts.
+    """
+    return [generate_cv_text(seed + i, paragraphs=paragraphs, drug_names=drug_names) for i in range(size)]
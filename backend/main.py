@@ -1,15 +1,42 @@
+import asyncio
+import os
 import sys
+import time
 import fastapi
 import spacy
+from contextlib import asynccontextmanager
 from datetime import datetime
-from fastapi import FastAPI, UploadFile, HTTPException
+from typing import List
+from fastapi import FastAPI, UploadFile, HTTPException, BackgroundTasks, Header, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
-from utils.drug_lookup_dict import init_drug_dict
-from utils.vectorstore_handler import ChromaManager
-from services.pdf_parser import load_pdf_text_from_upload, scan_text_for_entities
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from utils.resources import RESOURCES, RESOURCES_WARM_UP, get_drug_index, get_vector_store
+from services.extraction_pipeline import extract_entities_from_file, index_extraction, result_cache_stats, spool_upload
 from services.entity_service import get_entity_from_id
+from services.response_format import (
+    cache_control, compact_payload, entities_etag, etag_matches, json_response, parse_ids,
+)
+from services.drug_update_service import (
+    RELOAD_STATUS, follow_reloads, is_reload_running, reload_check_due, reload_drug_data,
+)
+from services.job_service import JOB_MANAGER, QueueFullError
+from utils.candidate_index import CANDIDATE_INDEX_ENABLED, get_candidate_index
+from utils.llm_gate import LLM_GATE
+from utils.pdf_pages import PdfLimitError
+from utils.metrics import render_metrics
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Models load in the background; /health reports ready once they are warm
+    warm_up = asyncio.create_task(asyncio.to_thread(RESOURCES.warm_up, RESOURCES_WARM_UP))
+    await JOB_MANAGER.start()
+    yield
+    await JOB_MANAGER.stop()
+    await asyncio.gather(warm_up, return_exceptions=True)
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -18,28 +45,120 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Cache", "X-Cache-Tier", "ETag"],
 )
 
-# initialize drug lookup dict
-init_drug_dict()
+@app.middleware("http")
+async def follow_drug_reloads(request, call_next):
+    # A reload runs in one worker; the others pick it up from its stamp before serving
+    if RESOURCES.is_loaded("drug_index") and reload_check_due():
+        vector_store = get_vector_store() if RESOURCES.is_loaded("vector_store") else None
+        await asyncio.to_thread(follow_reloads, vector_store)
+    return await call_next(request)
 
-# Initialize vectorstore
-VECTOR_STORE = ChromaManager()
 
 # routes
 @app.post("/extract")
-def extract_entities_from_pdf(file: UploadFile):
+async def extract_entities_from_pdf(
+    file: UploadFile,
+    response: Response,
+    debug: str = None,
+    response_format: str = Query("full", alias="format"),
+    accept_encoding: str = Header(None),
+):
     """
-    Extract all pharma entities from a PDF file
+    Extract all pharma entities from a PDF file.
+    debug=timings adds the per-stage seconds and item counts of this request,
+    debug=true the full pipeline stats.
+    format=compact references records by product_ndc and sends each record
+    once in a "records" table (gzipped when accepted).
     """
     if file.content_type != "application/pdf":
         return {"error": "Invalid file type. Please upload a PDF file."}
     
-    text = load_pdf_text_from_upload(file)
-    search = scan_text_for_entities(text)
+    stats = {}
+    try:
+        path, digest = await spool_upload(file)
+        try:
+            search = await extract_entities_from_file(path, digest=digest, stats=stats)
+        finally:
+            os.remove(path)
+    except PdfLimitError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    await index_extraction(digest, file.filename, search)
+
+    # HIT from the bytes or text tier, MISS, or DISABLED
+    cache_headers = {
+        "X-Cache": {"miss": "MISS", "disabled": "DISABLED"}.get(stats["cache"], "HIT"),
+        "X-Cache-Tier": stats["cache"],
+    }
+    response.headers.update(cache_headers)
+    extra = {}
+    if debug == "timings":
+        extra = {"timings": stats["timings"]}
+    elif debug and debug.lower() in ("1", "true", "yes", "on"):
+        extra = {"debug": stats}
+
+    if response_format == "compact":
+        return json_response(compact_payload(search, **extra), accept_encoding, headers=cache_headers)
+    return {"search": search, **extra}
+
+
+@app.get("/extract/cache")
+def extract_cache_stats():
+    """
+    Hit/miss counters and size of the /extract result cache
+    """
+    return result_cache_stats()
+
+
+
+# Batch jobs
+@app.post("/jobs", status_code=202)
+async def create_job(files: List[UploadFile]):
+    """
+    Queue many CVs (PDFs and/or zips of PDFs) for extraction; returns the job id
+    """
+    if not JOB_MANAGER.running:
+        raise HTTPException(status_code=503, detail="job workers are not running")
 
-    return {"search": search}
+    # The multipart parser has already spooled the files; they are copied from there in a thread
+    uploads = [(file.filename or "upload.pdf", file.file) for file in files]
+    try:
+        job = await JOB_MANAGER.submit(uploads)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "30"})
+    except PdfLimitError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
+    return {"id": job["id"], "status": job["status"], "total": job["total"]}
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    Status, per-file progress and results of a batch job
+    """
+    job = await asyncio.to_thread(JOB_MANAGER.get, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"job {job_id} not found")
+    return await asyncio.to_thread(JOB_MANAGER.with_results, job)
+
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    """
+    Server-Sent Events stream of per-file and per-stage progress of a batch job
+    """
+    if not await asyncio.to_thread(JOB_MANAGER.get, job_id):
+        raise HTTPException(status_code=404, detail=f"job {job_id} not found")
+    return StreamingResponse(
+        JOB_MANAGER.stream_events(job_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
 
 
 @app.get("/entity/{id_or_uri}")
@@ -47,6 +166,7 @@ def get_entity_details(id_or_uri: str):
     """
     Get detailed information about a drug or ingredient.
     """
+    get_drug_index()
     entity = get_entity_from_id(id_or_uri)
     if not entity:
         return HTTPException(status_code=404, detail=f"entity with id {id_or_uri} not found")
@@ -54,22 +174,160 @@ def get_entity_details(id_or_uri: str):
     return entity
 
 
+@app.get("/entities")
+def get_entities(
+    ids: str,
+    v: str = None,
+    if_none_match: str = Header(None),
+    accept_encoding: str = Header(None),
+):
+    """
+    Batch lookup of drug / ingredient records by product_ndc or name.
+    Answers carry an ETag tied to the drug index version (304 on If-None-Match);
+    pass v=<version> from a compact /extract response to cache them for good.
+    """
+    try:
+        id_list = parse_ids(ids)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    get_drug_index()
+    etag = entities_etag(id_list)
+    headers = {"ETag": etag, "Cache-Control": cache_control(v)}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    entities, missing = {}, []
+    for entity_id in id_list:
+        entity = get_entity_from_id(entity_id)
+        if entity:
+            entities[entity_id] = entity
+        else:
+            missing.append(entity_id)
+    payload = {"version": get_drug_index().version, "entities": entities, "missing": missing}
+    return json_response(payload, accept_encoding, headers=headers)
+
+
+# Candidate search over every extracted CV
+@app.get("/candidates/search")
+async def search_candidates(q: str, ranked: bool = True, limit: int = Query(20, ge=1, le=200), offset: int = Query(0, ge=0), hits: bool = False):
+    """
+    Boolean / ranked search of indexed CVs by drug, ingredient, NDC or pharm class,
+    e.g. q=pembrolizumab OR class:"blocking antibody". hits=true adds each CV's entities and offsets.
+    """
+    if not CANDIDATE_INDEX_ENABLED:
+        raise HTTPException(status_code=404, detail="the candidate index is disabled")
+    start = time.perf_counter()
+    try:
+        answer = await asyncio.to_thread(get_candidate_index().search, q, ranked, limit, offset, hits)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"query": q, "took_ms": round((time.perf_counter() - start) * 1000, 2), **answer}
+
+
+@app.get("/candidates")
+def candidate_index_stats():
+    """
+    Size of the candidate index (documents, terms, pending merges)
+    """
+    if not CANDIDATE_INDEX_ENABLED:
+        return {"enabled": False}
+    return {"enabled": True, **get_candidate_index().stats()}
+
+
+@app.delete("/candidates/{cv_id}")
+def delete_candidate(cv_id: str):
+    """
+    Remove a CV (sha256 of its PDF) from the candidate index
+    """
+    if not CANDIDATE_INDEX_ENABLED or not get_candidate_index().delete(cv_id):
+        raise HTTPException(status_code=404, detail="CV not indexed")
+    return {"deleted": cv_id}
+
+
 # Helpful query vectorstore endpoint
 @app.get("/query")
 def query_vectorstore(term: str):
     """
     Helpful endpoint to query vectorstore directly
     """
-    results = VECTOR_STORE.query(term, n_results=5)
+    results = get_vector_store().query(term, n_results=5)
     return results
 
+
+@app.get("/query/cache")
+def query_cache_stats():
+    """
+    Hit/miss counters of the embedding and nearest-neighbour cache
+    """
+    return get_vector_store().cache_stats()
+
+# Drug data maintenance
+@app.post("/admin/drugs/reload")
+def reload_drugs(background_tasks: BackgroundTasks):
+    """
+    Incrementally reload the FDA NDC dump from ../data without restarting.
+    The reload runs in the worker that receives this request; once it is done
+    it writes DRUG_RELOAD_STAMP, and every other uvicorn worker loads the new
+    index (from the rewritten artifact) before its next request.
+    """
+    if is_reload_running():
+        raise HTTPException(status_code=409, detail="a drug data reload is already running")
+
+    get_drug_index()
+    background_tasks.add_task(reload_drug_data, get_vector_store())
+    return {"status": "started"}
+
+
+@app.get("/admin/drugs/reload")
+def reload_drugs_status():
+    """
+    Status of the last drug data reload
+    """
+    return RELOAD_STATUS
+
+
+# Local LLM gate
+@app.post("/admin/llm-gate")
+def configure_llm_gate(enabled: bool = None, low: float = None, high: float = None, reload: bool = False):
+    """
+    Switch the local LLM gate on or off, change its uncertainty band or reload its model
+    """
+    try:
+        return LLM_GATE.configure(enabled=enabled, low=low, high=high, reload=reload)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@app.get("/admin/llm-gate")
+def llm_gate_status():
+    """
+    Settings, model and decision counters of the local LLM gate
+    """
+    return LLM_GATE.status()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """
+    Pipeline stage timings, item counts and cache hit rates in the Prometheus text format
+    """
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
 # Health and version endpoints
 @app.get("/health")
 def health_check():
     """
-    Simple health check endpoint
+    Health and readiness: 503 until the models are loaded and warm
     """
-    return {"status": "healthy", "service": "AlpaPharma CV Analyzer"}
+    status = RESOURCES.status()
+    if not status["ready"]:
+        return JSONResponse(
+            status_code=503,
+            content={"status": "starting", "service": "AlpaPharma CV Analyzer", **status},
+        )
+    return {"status": "healthy", "service": "AlpaPharma CV Analyzer", **status}
 
 @app.get("/version")
 def get_version():
@@ -0,0 +1,111 @@
+import json
+import os
+import threading
+import time
+from utils.drug_lookup_dict import DRUG_DICT, FDA_DATA_PATH, load_drug_version, reload_drug_dict
+from utils.logs import get_logger
+
+log = get_logger(__name__)
+
+# Written once a reload (index swap + vector sync) is complete, so the other
+# uvicorn workers, which poll it, load the same data
+DRUG_RELOAD_STAMP = os.getenv("DRUG_RELOAD_STAMP", "../data/drug-index.reloaded")
+DRUG_RELOAD_CHECK_SECONDS = float(os.getenv("DRUG_RELOAD_CHECK_SECONDS", "2"))
+
+_RELOAD_LOCK = threading.Lock()
+RELOAD_STATUS = {"state": "idle"}
+
+_FOLLOW_LOCK = threading.Lock()
+_stamp_mtime_ns = None
+_next_check = 0.0
+
+
+def _write_reload_stamp(version: str):
+    tmp_path = f"{DRUG_RELOAD_STAMP}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": version, "pid": os.getpid(), "time": time.time()}, f)
+    os.replace(tmp_path, DRUG_RELOAD_STAMP)
+
+
+def reload_drug_data(vector_store, path: str = FDA_DATA_PATH):
+    """
+    Picks up a new openFDA NDC dump while the server keeps serving:
+    streams and diffs the dump, swaps the drug index and re-embeds only the
+    changed names into the fda_drugs collection.
+    Returns False if a reload is already running.
+    """
+    if not _RELOAD_LOCK.acquire(blocking=False):
+        return False
+
+    start = time.perf_counter()
+    RELOAD_STATUS.clear()
+    RELOAD_STATUS.update({"state": "running", "source": path})
+    try:
+        diff = reload_drug_dict(path)
+        vector_store.sync_names(diff["added_names"], diff["removed_names"])
+        _write_reload_stamp(DRUG_DICT.version)
+        RELOAD_STATUS.update({
+            "state": "done",
+            "seconds": round(time.perf_counter() - start, 2),
+            "added": len(diff["added"]),
+            "updated": len(diff["updated"]),
+            "removed": len(diff["removed"]),
+            "added_names": len(diff["added_names"]),
+            "removed_names": len(diff["removed_names"]),
+        })
+    except Exception as e:
+        log.error("Drug data reload failed: %s", e)
+        RELOAD_STATUS.update({"state": "failed", "error": str(e)})
+    finally:
+        _RELOAD_LOCK.release()
+    return True
+
+
+def is_reload_running() -> bool:
+    return _RELOAD_LOCK.locked()
+
+
+def reload_check_due() -> bool:
+    """
+    Cheap per-request test of whether follow_reloads should run now.
+    """
+    return time.monotonic() >= _next_check and not _RELOAD_LOCK.locked()
+
+
+def follow_reloads(vector_store=None):
+    """
+    Loads the drug index another worker reloaded to, if the reload stamp
+    names a version this process does not have, and drops this process's
+    neighbour cache and stale vector index. Returns True if it reloaded.
+    """
+    global _stamp_mtime_ns, _next_check
+    if not _FOLLOW_LOCK.acquire(blocking=False):
+        return False
+    try:
+        _next_check = time.monotonic() + DRUG_RELOAD_CHECK_SECONDS
+        try:
+            mtime_ns = os.stat(DRUG_RELOAD_STAMP).st_mtime_ns
+        except OSError:
+            return False
+        if mtime_ns == _stamp_mtime_ns:
+            return False
+        try:
+            with open(DRUG_RELOAD_STAMP, encoding="utf-8") as f:
+                version = json.load(f)["version"]
+        except (OSError, ValueError, KeyError) as e:
+            log.warning("Unreadable drug reload stamp %s: %s", DRUG_RELOAD_STAMP, e)
+            return False
+        if version == DRUG_DICT.version:
+            _stamp_mtime_ns = mtime_ns
+            return False
+
+        load_drug_version(version)
+        if vector_store is not None:
+            vector_store.refresh_after_reload()
+        _stamp_mtime_ns = mtime_ns
+        return True
+    except Exception as e:
+        log.error("Following drug data reload failed: %s", e)
+        return False
+    finally:
+        _FOLLOW_LOCK.release()
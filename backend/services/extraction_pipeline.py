@@ -0,0 +1,400 @@
+import asyncio
+import contextvars
+import functools
+import hashlib
+import os
+import queue
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from services.pdf_parser import (
+    EXACT_SCAN_MIN_LENGTH,
+    EXACT_SCAN_SINGLE_WORDS,
+    FUZZY_MATCH_ENABLED,
+    MAX_VECTOR_DISTANCE,
+    NORMALIZED_MATCH_ENABLED,
+    build_entities,
+    collect_candidates,
+    collect_candidates_from_paragraphs,
+    drop_known_candidates,
+    find_exact_drug_names,
+    merge_candidates,
+    resolve_tokens,
+)
+from utils.candidate_index import CANDIDATE_INDEX_ENABLED, get_candidate_index
+from utils.drug_lookup_dict import DRUG_DICT
+from utils.pdf_pages import (
+    PDF_MAX_BYTES,
+    PDF_PAGE_WORKERS,
+    PDF_PARALLEL_MIN_PAGES,
+    PdfLimitError,
+    check_page_count,
+    count_pages,
+    extract_page_range,
+    get_page_pool,
+    page_ranges,
+    start_page_pool,
+)
+from utils.llm_handler import LLM_CACHE_ENABLED, LLM_CACHE_PATH, PROMPT_VERSION, allm_validate_pharmaceutical_terms, get_provider
+from utils.llm_gate import LLM_GATE
+from utils.logs import get_logger
+from utils.metrics import (
+    EXTRACT_REQUESTS, EXTRACT_SECONDS, METRICS, count_items, observe_stage, request_timings,
+)
+from utils.resources import RESOURCES, get_drug_index, get_vector_store
+from utils.result_cache import content_hash, get_result_cache
+from utils.term_blacklist import blacklist_version
+from utils.verdict_cache import get_verdict_cache
+
+log = get_logger(__name__)
+
+RESOURCES.add_warm_up("pdf page pool", start_page_pool)
+
+# Workers for the CPU-bound stages (PDF text, spaCy, embeddings + Chroma).
+# Threads rather than processes: the models and the drug index are loaded once
+# and shared, and PyMuPDF, torch and Chroma release the GIL in their hot loops.
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", str(os.cpu_count() or 4)))
+
+CPU_EXECUTOR = ThreadPoolExecutor(max_workers=PIPELINE_WORKERS, thread_name_prefix="extract")
+# Page extraction of short documents gets its own threads: candidate passes
+# waiting for pages in CPU_EXECUTOR must never hold up the pages themselves
+PAGE_EXECUTOR = ThreadPoolExecutor(max_workers=PIPELINE_WORKERS, thread_name_prefix="pdf-pages")
+
+# Result cache settings
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "1") == "1"
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH", "../cache/results.sqlite3")
+RESULT_CACHE_MAX_BYTES = int(float(os.getenv("RESULT_CACHE_MAX_MB", "256")) * 1024 * 1024)
+
+# Bump whenever the entity logic changes, so cached results are not reused
+PIPELINE_VERSION = "5"
+
+
+async def run_in_cpu_pool(func, *args):
+    # Carry the context over, so stages timed in the pool count for this request
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(CPU_EXECUTOR, functools.partial(context.run, func, *args))
+
+
+def _report(progress, stage: str):
+    if progress is not None:
+        progress(stage)
+
+
+def result_fingerprint() -> str:
+    """
+    Identifies everything that shapes an /extract result; cached results are
+    only reused under the same fingerprint.
+    """
+    llm_provider, model_name = get_provider()
+    return "|".join(str(part) for part in (
+        PIPELINE_VERSION,
+        DRUG_DICT.version,
+        get_vector_store().collection_fingerprint(),
+        llm_provider, model_name, PROMPT_VERSION, LLM_GATE.fingerprint(),
+        blacklist_version(),
+        MAX_VECTOR_DISTANCE, NORMALIZED_MATCH_ENABLED, FUZZY_MATCH_ENABLED, EXACT_SCAN_SINGLE_WORDS, EXACT_SCAN_MIN_LENGTH,
+    ))
+
+
+async def spool_upload(upload_file, chunk_size: int = 1 << 20):
+    """
+    Streams an upload into a temp file, hashing it on the way.
+    Returns (path, sha256 hex); raises PdfLimitError past PDF_MAX_BYTES.
+    The caller removes the file.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    spool = tempfile.NamedTemporaryFile(prefix="upload-", suffix=".pdf", delete=False)
+    try:
+        with spool:
+            while True:
+                chunk = await upload_file.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > PDF_MAX_BYTES:
+                    raise PdfLimitError(f"upload exceeds {PDF_MAX_BYTES} bytes")
+                digest.update(chunk)
+                await run_in_cpu_pool(spool.write, chunk)
+    except BaseException:
+        os.remove(spool.name)
+        raise
+    return spool.name, digest.hexdigest()
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+async def extract_entities_from_bytes(file_bytes: bytes, stats: dict = None, progress=None):
+    """
+    extract_entities_from_file for PDF bytes already in memory.
+    """
+    if len(file_bytes) > PDF_MAX_BYTES:
+        raise PdfLimitError(f"upload exceeds {PDF_MAX_BYTES} bytes")
+    with tempfile.NamedTemporaryFile(prefix="upload-", suffix=".pdf") as spool:
+        spool.write(file_bytes)
+        spool.flush()
+        return await extract_entities_from_file(
+            spool.name, digest=content_hash(file_bytes), stats=stats, progress=progress
+        )
+
+
+async def extract_entities_from_file(path: str, digest: str = None, stats: dict = None, progress=None):
+    """
+    Async /extract pipeline for a PDF on disk.
+    progress, if given, is called with the name of each stage as it starts.
+    stats["timings"] gets the seconds per stage and the item counts of this
+    extraction (see utils.metrics).
+
+    Pages are extracted in parallel (page ranges in the PDF process pool, or
+    in the CPU pool for short documents) and fed in order to the spaCy
+    candidate pass as soon as they are ready; per-page timings land in
+    stats["pages"].
+
+    With the result cache enabled, a result is looked up by the hash of the
+    file bytes and then by the hash of the extracted text; stats["cache"]
+    tells which tier answered ("bytes", "text") or "miss".
+    """
+    stats = {} if stats is None else stats
+    start = time.perf_counter()
+    with request_timings() as timings:
+        try:
+            entities = await _extract_entities_from_file(path, digest, stats, progress)
+        finally:
+            stats["timings"] = timings.as_dict()
+    EXTRACT_REQUESTS.inc(cache=stats["cache"])
+    EXTRACT_SECONDS.observe(time.perf_counter() - start)
+    return entities
+
+
+async def _extract_entities_from_file(path: str, digest: str, stats: dict, progress):
+    await run_in_cpu_pool(get_drug_index)
+    cache = get_result_cache(RESULT_CACHE_PATH, RESULT_CACHE_MAX_BYTES) if RESULT_CACHE_ENABLED else None
+    stats["cache"] = "miss" if cache is not None else "disabled"
+
+    if cache is not None:
+        fingerprint = await run_in_cpu_pool(result_fingerprint)
+        bytes_digest = digest or await run_in_cpu_pool(file_hash, path)
+        cached = await run_in_cpu_pool(cache.get, "bytes", fingerprint, bytes_digest)
+        if cached is not None:
+            stats["cache"] = "bytes"
+            return cached
+
+    start = time.perf_counter()
+    _report(progress, "pdf")
+    page_count = await run_in_cpu_pool(count_pages, path)
+    check_page_count(page_count)
+
+    # The candidate pass consumes pages from this queue while later pages are extracted
+    page_queue = queue.Queue()
+    abandoned = threading.Event()
+
+    def paragraphs():
+        while not abandoned.is_set():
+            page_text = page_queue.get()
+            if page_text is None:
+                return
+            yield from page_text.split("\n")
+
+    candidates = asyncio.ensure_future(run_in_cpu_pool(collect_candidates_from_paragraphs, paragraphs()))
+    texts, page_timings = [], []
+    try:
+        async for page_number, page_text, seconds in extract_pages(path, page_count):
+            page_timings.append({"page": page_number + 1, "chars": len(page_text), "seconds": round(seconds, 4)})
+            if page_text:
+                texts.append(page_text)
+                page_queue.put(page_text)
+    except BaseException:
+        abandoned.set()
+        raise
+    finally:
+        page_queue.put(None)
+        if abandoned.is_set():
+            await asyncio.gather(candidates, return_exceptions=True)
+
+    text = "\n".join(texts)
+    observe_stage("pdf", time.perf_counter() - start)
+    count_items("pages", page_count)
+    stats.update({
+        "pdf_seconds": round(time.perf_counter() - start, 3),
+        "page_count": page_count,
+        "pages": page_timings,
+    })
+
+    if cache is not None:
+        text_digest = content_hash(text)
+        cached = await run_in_cpu_pool(cache.get, "text", fingerprint, text_digest)
+        if cached is not None:
+            abandoned.set()
+            await asyncio.gather(candidates, return_exceptions=True)
+            stats["cache"] = "text"
+            await run_in_cpu_pool(cache.put, "bytes", fingerprint, bytes_digest, cached)
+            return cached
+        cache.record_miss()
+
+    entities = await ascan_text_for_entities(text, stats=stats, progress=progress, candidates=candidates)
+
+    # Results with heuristic LLM fallbacks are not worth keeping
+    if cache is not None and not stats["llm"].get("heuristic_terms"):
+        await run_in_cpu_pool(cache.put, "text", fingerprint, text_digest, entities)
+        await run_in_cpu_pool(cache.put, "bytes", fingerprint, bytes_digest, entities)
+    return entities
+
+
+async def index_extraction(cv_id: str, name: str, entities):
+    """
+    Adds an extraction to the candidate search index, when enabled. Index
+    errors are logged and never fail the extraction.
+    """
+    if not CANDIDATE_INDEX_ENABLED:
+        return
+    try:
+        await run_in_cpu_pool(get_candidate_index().add, cv_id, name, entities)
+    except sqlite3.Error as e:
+        log.warning("Could not index CV %s: %s", cv_id, e)
+
+
+async def extract_pages(path: str, page_count: int):
+    """
+    Yields (page number, text, seconds) in page order. All page ranges are
+    submitted at once and awaited in order.
+    """
+    loop = asyncio.get_running_loop()
+    pool = get_page_pool() if page_count >= PDF_PARALLEL_MIN_PAGES else None
+    if pool is not None:
+        futures = [
+            loop.run_in_executor(pool, extract_page_range, path, start, stop)
+            for start, stop in page_ranges(page_count, PDF_PAGE_WORKERS)
+        ]
+    else:
+        futures = [
+            loop.run_in_executor(PAGE_EXECUTOR, extract_page_range, path, start, stop, False)
+            for start, stop in page_ranges(page_count, 1)
+        ]
+    try:
+        for future in futures:
+            for page in await future:
+                yield page
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def result_cache_stats():
+    if not RESULT_CACHE_ENABLED:
+        return {"enabled": False}
+    return {"enabled": True, **get_result_cache(RESULT_CACHE_PATH, RESULT_CACHE_MAX_BYTES).stats()}
+
+
+def cache_metrics():
+    """
+    Lookup counters of the result, LLM verdict and embedding caches for
+    /metrics. The vector store is not loaded just to be scraped.
+    """
+    lookups = []
+    if RESULT_CACHE_ENABLED:
+        counters = get_result_cache(RESULT_CACHE_PATH, RESULT_CACHE_MAX_BYTES).counters
+        lookups += [
+            ({"cache": "result", "result": "bytes_hit"}, counters["bytes_hits"]),
+            ({"cache": "result", "result": "text_hit"}, counters["text_hits"]),
+            ({"cache": "result", "result": "miss"}, counters["misses"]),
+        ]
+    if LLM_CACHE_ENABLED:
+        counters = get_verdict_cache(LLM_CACHE_PATH).counters
+        lookups += [
+            ({"cache": "llm_verdict", "result": "context_hit"}, counters["context_hits"]),
+            ({"cache": "llm_verdict", "result": "word_hit"}, counters["word_hits"]),
+            ({"cache": "llm_verdict", "result": "miss"}, counters["misses"]),
+        ]
+    if RESOURCES.is_loaded("vector_store"):
+        counters = get_vector_store().cache_stats()
+        for kind in ("embedding", "neighbor") if counters["enabled"] else ():
+            lookups += [
+                ({"cache": kind, "result": "memory_hit"}, counters[f"{kind}_memory_hits"]),
+                ({"cache": kind, "result": "disk_hit"}, counters[f"{kind}_disk_hits"]),
+                ({"cache": kind, "result": "miss"}, counters[f"{kind}_misses"]),
+            ]
+
+    ratios = {}
+    for labels, value in lookups:
+        hits, total = ratios.get(labels["cache"], (0, 0))
+        ratios[labels["cache"]] = (hits + (value if labels["result"] != "miss" else 0), total + value)
+    return [
+        ("cache_lookups_total", "counter", "Cache lookups by cache and outcome", lookups),
+        ("cache_hit_ratio", "gauge", "Share of cache lookups answered from the cache", [
+            ({"cache": cache}, hits / total) for cache, (hits, total) in ratios.items() if total
+        ]),
+        ("ready", "gauge", "1 once the models are loaded and warm", [({}, int(RESOURCES.ready))]),
+    ]
+
+
+METRICS.add_collector(cache_metrics)
+
+
+async def ascan_text_for_entities(text: str, stats: dict = None, progress=None, candidates=None):
+    """
+    Async equivalent of scan_text_for_entities with overlapping stages:
+
+    1. the exact name scan and the spaCy candidate pass run side by side
+       (candidates may be an already running candidate pass over the same text)
+    2. the LLM validates the ambiguous single words on the LLM loop while the
+       normalized name, fuzzy and vector tiers resolve the multi-word phrases
+       in the CPU pool
+    3. the words the LLM accepted go through the same tiers
+
+    Tokens are merged as in the sync path (merge_candidates: sorted phrases,
+    then sorted accepted words), so the entity list, its order and the dedup
+    between phrases and words are the same; `bench_e2e parity` checks this.
+    """
+    timings = {}
+    start = time.perf_counter()
+
+    _report(progress, "candidates")
+    exact_matches, (multi_words, word_to_sentence) = await asyncio.gather(
+        run_in_cpu_pool(find_exact_drug_names, text),
+        candidates if candidates is not None else run_in_cpu_pool(collect_candidates, text),
+    )
+    multi_words, word_to_sentence = drop_known_candidates(multi_words, word_to_sentence, exact_matches)
+    log.info(
+        "Found %d drug names by exact text scan, %d candidates for LLM validation",
+        len(exact_matches), len(word_to_sentence),
+    )
+    timings["candidates_seconds"] = round(time.perf_counter() - start, 3)
+
+    _report(progress, "llm")
+    stage = time.perf_counter()
+    phrases = sorted(multi_words)
+    llm_stats = {}
+    verdicts, (normalized_matches, fuzzy_matches, vector_matches) = await asyncio.gather(
+        allm_validate_pharmaceutical_terms(word_to_sentence, stats=llm_stats),
+        run_in_cpu_pool(resolve_tokens, phrases),
+    )
+    timings["llm_and_phrases_seconds"] = round(time.perf_counter() - stage, 3)
+
+    _report(progress, "resolve")
+    stage = time.perf_counter()
+    tokens = merge_candidates(multi_words, verdicts)
+    words = tokens[len(phrases):]
+    if words:
+        word_normalized, word_fuzzy, word_vector = await run_in_cpu_pool(resolve_tokens, words)
+        normalized_matches.update(word_normalized)
+        fuzzy_matches.update(word_fuzzy)
+        vector_matches.update(word_vector)
+    timings["words_seconds"] = round(time.perf_counter() - stage, 3)
+
+    entities = build_entities(text, exact_matches, tokens, fuzzy_matches, vector_matches, normalized_matches)
+    timings["scan_seconds"] = round(time.perf_counter() - start, 3)
+
+    if stats is not None:
+        stats.update(timings)
+        stats["llm"] = llm_stats
+    return entities
@@ -0,0 +1,482 @@
+import asyncio
+import fcntl
+import json
+import os
+import re
+import shutil
+import time
+import uuid
+import zipfile
+
+from services.extraction_pipeline import extract_entities_from_file, file_hash, index_extraction
+from utils.logs import get_logger
+from utils.pdf_pages import PDF_MAX_BYTES, PdfLimitError
+
+log = get_logger(__name__)
+
+# Job settings
+JOBS_DIR = os.getenv("JOBS_DIR", "../jobs")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# Files waiting in the queue across all jobs; submissions beyond it get 429
+JOB_QUEUE_MAX_DEPTH = int(os.getenv("JOB_QUEUE_MAX_DEPTH", "500"))
+JOB_MAX_FILES = int(os.getenv("JOB_MAX_FILES", "500"))
+# Total size of a job's uploads, and of its PDFs once zips are unpacked
+JOB_MAX_BYTES = int(float(os.getenv("JOB_MAX_MB", "500")) * 1024 * 1024)
+# How often event streams re-read the document of a job another worker process runs
+JOB_EVENTS_POLL_SECONDS = float(os.getenv("JOB_EVENTS_POLL_SECONDS", "1"))
+
+FINISHED_STATES = ("done", "failed")
+_JOB_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+class QueueFullError(Exception):
+    """
+    Raised when a submission does not fit in the job queue.
+    """
+
+
+def _copy_bounded(source, path: str, limit: int, error: str, chunk_size: int = 1 << 20) -> int:
+    """
+    Copies source into path chunk by chunk; raises PdfLimitError(error) past limit bytes.
+    """
+    written = 0
+    with open(path, "wb") as f:
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                return written
+            written += len(chunk)
+            if written > limit:
+                raise PdfLimitError(error)
+            f.write(chunk)
+
+
+def split_upload(filename: str, source, next_path, max_total: int = JOB_MAX_BYTES):
+    """
+    Streams an uploaded PDF, or every PDF inside a zip, from the binary file
+    object source to the paths next_path() hands out. Returns [(name, bytes)].
+    Raises PdfLimitError for a PDF over PDF_MAX_BYTES or PDFs over max_total
+    bytes in all; zip entries are checked by their declared size before
+    anything is decompressed.
+    """
+    source.seek(0)
+    if not zipfile.is_zipfile(source):
+        source.seek(0)
+        if PDF_MAX_BYTES <= max_total:
+            limit, error = PDF_MAX_BYTES, f"{filename} exceeds {PDF_MAX_BYTES} bytes"
+        else:
+            limit, error = max_total, f"the job's PDFs exceed {JOB_MAX_BYTES} bytes"
+        return [(filename, _copy_bounded(source, next_path(), limit, error))]
+    with zipfile.ZipFile(source) as archive:
+        entries = [
+            info for info in archive.infolist()
+            if not info.is_dir() and info.filename.lower().endswith(".pdf")
+            and not os.path.basename(info.filename).startswith(".")
+        ]
+        total = 0
+        for info in entries:
+            if info.file_size > PDF_MAX_BYTES:
+                raise PdfLimitError(f"{filename}: {info.filename} exceeds {PDF_MAX_BYTES} bytes")
+            total += info.file_size
+            if total > max_total:
+                raise PdfLimitError(f"{filename} unpacks to more than {max_total} bytes")
+        files = []
+        for info in entries:
+            # ZipExtFile stops at the declared size, so the checks above bound the reads
+            with archive.open(info) as entry:
+                size = _copy_bounded(entry, next_path(), info.file_size, f"{filename}: {info.filename} is corrupt")
+            files.append((os.path.basename(info.filename), size))
+        return files
+
+
+def format_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class JobManager:
+    """
+    Batch extraction jobs.
+
+    Every file of a job is one item on a bounded asyncio queue consumed by
+    JOB_WORKERS tasks running the same in-process pipeline as /extract, so the
+    loaded spaCy model, SapBERT and the drug index are reused.
+
+    Inputs are spooled to JOBS_DIR/<id>/<index>.pdf, each file's entities to
+    JOBS_DIR/<id>/<index>.json once it is done, and the job document (status
+    and per-file progress only) to JOBS_DIR/<id>.json after every change.
+
+    With several uvicorn workers, each job is run by the process holding an
+    flock on JOBS_DIR/<id>.lock: the one that accepted it, or after a crash
+    (the kernel drops the lock) the first one to start and claim it, which
+    queues its unfinished files again. Other workers answer for the job from
+    its document on disk.
+    """
+
+    def __init__(self, jobs_dir: str = JOBS_DIR, workers: int = JOB_WORKERS, max_depth: int = JOB_QUEUE_MAX_DEPTH):
+        self.jobs_dir = jobs_dir
+        self.workers = workers
+        self.max_depth = max_depth
+        self.jobs = {}
+        self._queue = None
+        self._tasks = []
+        self._subscribers = {}
+        self._write_locks = {}
+        # job id -> open lock file of the jobs this process runs
+        self._claims = {}
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def free_slots(self) -> int:
+        if self._queue is None:
+            return 0
+        return max(0, self.max_depth - self._queue.qsize())
+
+    async def start(self):
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        pending = self._load_jobs()
+        # Unfinished files from a previous run are always taken back
+        self._queue = asyncio.Queue(maxsize=max(self.max_depth, len(pending)))
+        for item in pending:
+            self._queue.put_nowait(item)
+        if pending:
+            log.info("Requeued %d unfinished files of unclaimed jobs", len(pending))
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        log.info("Started %d job workers (%d jobs on disk)", self.workers, len(self.jobs))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for job_id in list(self._claims):
+            self._release(job_id, remove=False)
+
+    def _claim(self, job_id: str) -> bool:
+        """
+        Takes the job's lock without waiting; False when another process holds it.
+        """
+        lock = open(os.path.join(self.jobs_dir, f"{job_id}.lock"), "w")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock.close()
+            return False
+        self._claims[job_id] = lock
+        return True
+
+    def _release(self, job_id: str, remove: bool = True):
+        lock = self._claims.pop(job_id, None)
+        if lock is None:
+            return
+        if remove:
+            # A process that opened the file before this point finds the job finished once it locks it
+            try:
+                os.remove(lock.name)
+            except OSError:
+                pass
+        lock.close()
+
+    def _load_jobs(self):
+        """
+        Loads the finished job documents and the unfinished jobs this process
+        manages to claim, and returns the (job id, file index) pairs of the
+        latter that still have to run. Jobs claimed by a live process are
+        left to it.
+        """
+        pending = []
+        for name in sorted(os.listdir(self.jobs_dir)):
+            if not name.endswith(".json"):
+                continue
+            job = self._read_job(os.path.join(self.jobs_dir, name))
+            if job is None:
+                continue
+            if job["status"] not in FINISHED_STATES:
+                job_id = job["id"]
+                if not self._claim(job_id):
+                    continue
+                # Read again under the lock: the previous owner may have just finished it
+                job = self._read_job(os.path.join(self.jobs_dir, name))
+                if job is None or job["status"] in FINISHED_STATES:
+                    self._release(job_id)
+                    if job is None:
+                        continue
+            self.jobs[job["id"]] = job
+            if job["status"] in FINISHED_STATES:
+                continue
+            for index, item in enumerate(job["files"]):
+                if item["status"] not in FINISHED_STATES:
+                    item.update({"status": "queued", "stage": None})
+                    pending.append((job["id"], index))
+        return pending
+
+    @staticmethod
+    def _read_job(path: str):
+        try:
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            log.warning("Skipping unreadable job file %s: %s", path, e)
+            return None
+
+    async def submit(self, uploads):
+        """
+        Creates a job from [(filename, binary file object)] (PDFs or zips of
+        PDFs) and queues its files. The files are spooled to disk in a thread.
+        Raises ValueError for an empty/oversized batch (PdfLimitError for one
+        over the size limits) and QueueFullError when the queue cannot take
+        every file.
+        """
+        if not self.free_slots():
+            raise QueueFullError("job queue is full")
+        job = await asyncio.to_thread(self._spool, uploads)
+        if job["total"] > self.free_slots():
+            await asyncio.to_thread(self._discard, job["id"])
+            raise QueueFullError(f"job queue is full ({self.free_slots()} free slots, {job['total']} files)")
+
+        self.jobs[job["id"]] = job
+        await asyncio.to_thread(self._write, job["id"], self._snapshot(job))
+        for index in range(job["total"]):
+            self._queue.put_nowait((job["id"], index))
+        return job
+
+    def _spool(self, uploads) -> dict:
+        """
+        Writes the uploads' PDFs to JOBS_DIR/<id>/<index>.pdf and returns the
+        new job document. Blocking; nothing is left behind on failure.
+        """
+        job_id = uuid.uuid4().hex
+        job_dir = os.path.join(self.jobs_dir, job_id)
+        os.makedirs(job_dir)
+        self._claim(job_id)
+        paths = []
+
+        def next_path():
+            if len(paths) == JOB_MAX_FILES:
+                raise ValueError(f"a job may contain at most {JOB_MAX_FILES} files")
+            paths.append(os.path.join(job_dir, f"{len(paths)}.pdf"))
+            return paths[-1]
+
+        try:
+            files, remaining = [], JOB_MAX_BYTES
+            for filename, source in uploads:
+                for name, size in split_upload(filename, source, next_path, max_total=remaining):
+                    files.append((name, size))
+                    remaining -= size
+                if remaining < 0:
+                    raise PdfLimitError(f"the job's PDFs exceed {JOB_MAX_BYTES} bytes")
+            if not files:
+                raise ValueError("no PDF files in the upload")
+        except BaseException:
+            self._discard(job_id)
+            raise
+
+        now = time.time()
+        return {
+            "id": job_id,
+            "status": "queued",
+            "created": now,
+            "updated": now,
+            "total": len(files),
+            "completed": 0,
+            "failed": 0,
+            "files": [{"name": name, "status": "queued", "stage": None, "bytes": size} for name, size in files],
+        }
+
+    def _discard(self, job_id: str):
+        shutil.rmtree(os.path.join(self.jobs_dir, job_id), ignore_errors=True)
+        self._release(job_id)
+
+    def get(self, job_id: str):
+        """
+        The job from memory, or from its document on disk when another worker
+        process runs it (or finished it since this one started). Blocking.
+        """
+        job = self.jobs.get(job_id)
+        if job is None and _JOB_ID.match(job_id):
+            job = self._read_job(os.path.join(self.jobs_dir, f"{job_id}.json"))
+        return job
+
+    def with_results(self, job: dict) -> dict:
+        """
+        The job with each finished file's entities read back from JOBS_DIR/<id>/<index>.json.
+        Blocking; documents written before results were split out already hold them.
+        """
+        files = []
+        for index, item in enumerate(job["files"]):
+            item = dict(item)
+            if item["status"] == "done" and "entities" not in item:
+                try:
+                    with open(self._result_path(job["id"], index), encoding="utf-8") as f:
+                        item["entities"] = json.load(f)
+                except (OSError, ValueError) as e:
+                    log.warning("Missing result for job %s file %s: %s", job["id"], index, e)
+            files.append(item)
+        return {**job, "files": files}
+
+    def summary(self, job: dict) -> dict:
+        """
+        The job without per-file results, as sent in progress events.
+        """
+        return {
+            **{key: value for key, value in job.items() if key != "files"},
+            "files": [{key: value for key, value in item.items() if key != "entities"} for item in job["files"]],
+        }
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue()
+        self._subscribers.setdefault(job_id, []).append(queue)
+        return queue
+
+    def unsubscribe(self, job_id: str, queue: asyncio.Queue):
+        subscribers = self._subscribers.get(job_id, [])
+        if queue in subscribers:
+            subscribers.remove(queue)
+        if not subscribers:
+            self._subscribers.pop(job_id, None)
+
+    async def stream_events(self, job_id: str, keepalive: float = 15.0):
+        """
+        Server-Sent Events for one job: a "job" snapshot first, then "progress"
+        (stage started) and "file" (file finished) events, and a final "job"
+        event when the whole job is finished.
+        """
+        if job_id not in self.jobs:
+            async for event in self._poll_events(job_id, keepalive):
+                yield event
+            return
+        queue = self.subscribe(job_id)
+        try:
+            job = self.jobs[job_id]
+            yield format_event("job", self.summary(job))
+            if job["status"] in FINISHED_STATES:
+                return
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), timeout=keepalive)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_event(event, data)
+                if event == "job":
+                    return
+        finally:
+            self.unsubscribe(job_id, queue)
+
+    async def _poll_events(self, job_id: str, keepalive: float):
+        """
+        Events of a job another worker process runs, from its document on
+        disk: the "job" snapshot, a "file" event per finished file, then the
+        final "job" event. Stage progress is only seen by the owning process.
+        """
+        job = await asyncio.to_thread(self.get, job_id)
+        if job is None:
+            return
+        yield format_event("job", self.summary(job))
+        reported = {index for index, item in enumerate(job["files"]) if item["status"] in FINISHED_STATES}
+        idle = 0.0
+        while job["status"] not in FINISHED_STATES:
+            await asyncio.sleep(JOB_EVENTS_POLL_SECONDS)
+            idle += JOB_EVENTS_POLL_SECONDS
+            job = await asyncio.to_thread(self.get, job_id) or job
+            for index, item in enumerate(job["files"]):
+                if index not in reported and item["status"] in FINISHED_STATES:
+                    reported.add(index)
+                    idle = 0.0
+                    yield format_event("file", _file_event(index, item))
+            if idle >= keepalive:
+                idle = 0.0
+                yield ": keep-alive\n\n"
+        yield format_event("job", self.summary(job))
+
+    def _publish(self, job_id: str, event: str, data: dict):
+        for queue in self._subscribers.get(job_id, []):
+            queue.put_nowait((event, data))
+
+    def _snapshot(self, job: dict) -> dict:
+        """
+        Copy of the job document safe to serialize off the loop while workers update it.
+        """
+        return {**job, "files": [dict(item) for item in job["files"]]}
+
+    def _result_path(self, job_id: str, index: int) -> str:
+        return os.path.join(self.jobs_dir, job_id, f"{index}.json")
+
+    async def _worker(self):
+        while True:
+            job_id, index = await self._queue.get()
+            try:
+                await self._process(job_id, index)
+            except Exception as e:
+                log.exception("Job worker error on %s/%s: %s", job_id, index, e)
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, job_id: str, index: int):
+        job = self.jobs[job_id]
+        item = job["files"][index]
+        if job["status"] == "queued":
+            job["status"] = "running"
+
+        def progress(stage: str):
+            item.update({"status": "running", "stage": stage})
+            job["updated"] = time.time()
+            self._publish(job_id, "progress", {"file": index, "name": item["name"], "stage": stage})
+
+        path = os.path.join(self.jobs_dir, job_id, f"{index}.pdf")
+        start = time.perf_counter()
+        try:
+            entities = await extract_entities_from_file(path, progress=progress)
+            await index_extraction(await asyncio.to_thread(file_hash, path), item["name"], entities)
+            await asyncio.to_thread(self._write_result, job_id, index, entities)
+            item.update({"status": "done", "stage": None, "entity_count": len(entities)})
+            job["completed"] += 1
+        except Exception as e:
+            log.warning("Job %s file %s failed: %s", job_id, item["name"], e)
+            item.update({"status": "failed", "stage": None, "error": str(e)})
+            job["failed"] += 1
+        item["seconds"] = round(time.perf_counter() - start, 3)
+
+        finished = job["completed"] + job["failed"] == job["total"]
+        if finished:
+            job["status"] = "done" if job["completed"] else "failed"
+        job["updated"] = time.time()
+
+        # Snapshot on the loop, serialize and write in a thread; one writer per job at a time
+        async with self._write_locks.setdefault(job_id, asyncio.Lock()):
+            await asyncio.to_thread(self._write, job_id, self._snapshot(job))
+        if finished:
+            self._write_locks.pop(job_id, None)
+            self._release(job_id)
+        if item["status"] == "done":
+            os.remove(path)
+
+        self._publish(job_id, "file", _file_event(index, item))
+        if finished:
+            self._publish(job_id, "job", self.summary(job))
+
+    def _write(self, job_id: str, job: dict):
+        _write_json(os.path.join(self.jobs_dir, f"{job_id}.json"), job)
+
+    def _write_result(self, job_id: str, index: int, entities: list):
+        _write_json(self._result_path(job_id, index), entities)
+
+
+def _file_event(index: int, item: dict) -> dict:
+    return {
+        "file": index, "name": item["name"], "status": item["status"],
+        "entities": item.get("entity_count", 0), "seconds": item["seconds"],
+    }
+
+
+def _write_json(path: str, payload):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f)
+    os.replace(tmp_path, path)
+
+
+JOB_MANAGER = JobManager()
@@ -1,26 +1,74 @@
 import fitz
+import os
 import re
-import spacy
+import time
+from collections import Counter
 
 from fastapi import UploadFile
 from utils.drug_lookup_dict import DRUG_DICT
-from utils.vectorstore_handler import ChromaManager
+from utils.resources import RESOURCES, get_drug_index, get_nlp, get_vector_store
 from utils.llm_handler import llm_validate_pharmaceutical_terms
-from utils.term_blacklist import should_exclude_term, clean_text
+from utils.term_blacklist import clean_text, filter_terms
 from utils.drug_lookup_dict import DRUG_DICT
+from utils.drug_matcher import DrugNameMatcher, find_offsets
+from utils.fuzzy_index import FuzzyDrugIndex
+from utils.name_normalizer import NormalizedDrugIndex
+from utils.logs import get_logger
+from utils.metrics import BLACKLIST_REJECTIONS, count_items, observe_stage, stage_timer
 
+log = get_logger(__name__)
 
-VECTOR_STORE = ChromaManager()
-nlp = spacy.load("en_core_web_sm")
+# Batched parsing settings (nlp.pipe)
+SPACY_BATCH_SIZE = int(os.getenv("SPACY_BATCH_SIZE", "256"))
+SPACY_N_PROCESS = int(os.getenv("SPACY_N_PROCESS", "1"))
+# Components the candidate logic never reads (noun chunks only need tagger + parser)
+SPACY_UNUSED_PIPES = ("ner", "lemmatizer")
+
+# Vector store hits above this distance are rejected
+MAX_VECTOR_DISTANCE = 50
+
+# Whole-text exact matching of drug names
+DRUG_MATCHER = DrugNameMatcher(DRUG_DICT)
+# Off: single-word names (often ordinary words too) are left to the noun-chunk
+# path, which runs them through the blacklist and LLM validation. On: they are
+# accepted without LLM validation if they pass the checks below.
+EXACT_SCAN_SINGLE_WORDS = os.getenv("EXACT_SCAN_SINGLE_WORDS", "0") == "1"
+EXACT_SCAN_MIN_LENGTH = int(os.getenv("EXACT_SCAN_MIN_LENGTH", "4"))
+
+# Salt / dosage-form / combination folding tier before the fuzzy and vector tiers
+NORMALIZED_MATCH_ENABLED = os.getenv("NORMALIZED_MATCH_ENABLED", "1") == "1"
+NORMALIZED_INDEX = NormalizedDrugIndex(DRUG_DICT)
+
+# Typo-tolerant lexical tier between exact matching and the vector store
+FUZZY_MATCH_ENABLED = os.getenv("FUZZY_MATCH_ENABLED", "1") == "1"
+FUZZY_INDEX = FuzzyDrugIndex(DRUG_DICT, min_length=int(os.getenv("FUZZY_MIN_LENGTH", "5")))
+
+
+def _compile_drug_matchers():
+    DRUG_MATCHER.compile()
+    if NORMALIZED_MATCH_ENABLED:
+        NORMALIZED_INDEX.compile()
+    if FUZZY_MATCH_ENABLED:
+        FUZZY_INDEX.compile()
+
+
+RESOURCES.add_warm_up("drug name matchers", _compile_drug_matchers)
 
 def load_pdf_text_from_upload(uploaded_file: UploadFile) -> str:
     """
     Extracts text directly from an uploaded PDF (in-memory).
     """
-    file_bytes = uploaded_file.file.read()
+    return load_pdf_text_from_bytes(uploaded_file.file.read())
+
+
+def load_pdf_text_from_bytes(file_bytes: bytes) -> str:
+    """
+    Extracts text from PDF bytes already read from the upload.
+    """
     text = []
     # Open the PDF from bytes using fitz
-    with fitz.open(stream=file_bytes, filetype="pdf") as doc:
+    with stage_timer("pdf"), fitz.open(stream=file_bytes, filetype="pdf") as doc:
+        count_items("pages", len(doc))
         for page in doc:
             page_text = page.get_text()
             if page_text:
@@ -28,22 +76,57 @@ def load_pdf_text_from_upload(uploaded_file: UploadFile) -> str:
     return "\n".join(text)
 
 
-def extract_candidates(text: str):
+def parse_paragraphs(paragraphs, batched: bool = True, batch_size: int = None, n_process: int = None):
     """
-    Extract candidate pharmaceutical terms using noun chunks.
-    Uses blacklist filtering and LLM validation for ambiguous single words.
+    Yields a spaCy Doc for every non-empty paragraph.
+    Batched mode streams through nlp.pipe with the trimmed pipeline,
+    otherwise each paragraph goes through the full pipeline one by one.
     """
+    paragraphs = (para for para in paragraphs if para.strip())
+    nlp = get_nlp()
 
-    candidates = set()
-    word_to_sentence = {}
+    if not batched:
+        for para in paragraphs:
+            yield nlp(para)
+        return
+
+    yield from nlp.pipe(
+        paragraphs,
+        batch_size=batch_size or SPACY_BATCH_SIZE,
+        n_process=n_process or SPACY_N_PROCESS,
+        disable=[name for name in SPACY_UNUSED_PIPES if name in nlp.pipe_names],
+    )
+
+
+def collect_candidates(text: str, batched: bool = True, batch_size: int = None, n_process: int = None):
+    """
+    Collects noun chunk candidates from the text.
+    Returns multi-word phrases (low ambiguity) and the single words that
+    need LLM validation mapped to their clean sentence context.
+    """
+    return collect_candidates_from_paragraphs(
+        text.split('\n'), batched=batched, batch_size=batch_size, n_process=n_process
+    )
+
+
+def collect_candidates_from_paragraphs(paragraphs, batched: bool = True, batch_size: int = None, n_process: int = None):
+    """
+    collect_candidates over an iterable of paragraphs (lines), which may be a
+    generator fed page by page while the rest of the PDF is still extracted.
+    """
+    # (word, clean sentence, blacklist check) in document order; single words
+    # are checked against the blacklist in one batch at the end
+    word_entries = []
     multi_words = set()
+    docs = 0
+    # Time spent waiting for paragraphs (pages still being extracted) is not parsing
+    waited = [0.0]
+    start = time.perf_counter()
 
-    paragraphs = text.split('\n')
-    print("start tokenizing CV terms...")
-    for para in paragraphs:
-        if not para.strip():
-            continue
-        doc = nlp(para)
+    log.debug("Tokenizing CV terms")
+    paragraphs = _timed(paragraphs, waited)
+    for doc in parse_paragraphs(paragraphs, batched=batched, batch_size=batch_size, n_process=n_process):
+        docs += 1
 
         for chunk in doc.noun_chunks:
             head = chunk.root
@@ -51,18 +134,14 @@ def extract_candidates(text: str):
                 candidate = clean_text(chunk.text.strip())
                 if candidate and not candidate.isdigit():
                     if len(candidate.split()) == 1:
+                        # Only ambiguous terms go to LLM with clean sentence context
+                        clean_sentence = clean_text(chunk.root.sent.text.strip())
 
-                        if should_exclude_term(candidate):
-                            continue  # Skip blacklisted terms
-                        else:
-                            # Only ambiguous terms go to LLM with clean sentence context
-                            clean_sentence = clean_text(chunk.root.sent.text.strip())
-
-                            # Skip one-word context duplicates (e.g., "CERTIFICATIONS": "CERTIFICATIONS")
-                            if candidate.lower() in clean_sentence.lower() and len(clean_sentence.split()) == 1:
-                                continue
+                        # Skip one-word context duplicates (e.g., "CERTIFICATIONS": "CERTIFICATIONS")
+                        if candidate.lower() in clean_sentence.lower() and len(clean_sentence.split()) == 1:
+                            continue
 
-                            word_to_sentence[candidate] = clean_sentence
+                        word_entries.append((candidate, clean_sentence, True))
                     else:
                         # Check multi-word phrases for embedded drug names
                         words_in_phrase = re.split(r'[\s\-/,]+', candidate)
@@ -76,7 +155,7 @@ def extract_candidates(text: str):
 
                                 # Skip one-word context duplicates for embedded drugs too
                                 if not (word_clean.lower() in clean_sentence.lower() and len(clean_sentence.split()) == 1):
-                                    word_to_sentence[word_clean] = clean_sentence
+                                    word_entries.append((word_clean, clean_sentence, False))
 
                                 has_embedded_drug = True
 
@@ -84,34 +163,247 @@ def extract_candidates(text: str):
                         if not has_embedded_drug:
                             multi_words.add(candidate)
 
-    # Add all multi-word phrases without embedded drugs (low ambiguity)
-    candidates.update(multi_words)
-    print("Preparing LLM call...")
-    print(f"Candidates for LLM validation: {len(word_to_sentence)} terms")
+    observe_stage("spacy", time.perf_counter() - start - waited[0])
+    count_items("paragraphs", docs)
+    count_items("candidates", len(word_entries) + len(multi_words))
+
+    # Skip blacklisted single words; embedded drugs are not checked
+    rejected = filter_blacklisted({word for word, _, check in word_entries if check})
+    word_to_sentence = {}
+    for word, sentence, check in word_entries:
+        if not (check and word in rejected):
+            word_to_sentence[word] = sentence
+    return multi_words, word_to_sentence
+
+
+def _timed(iterable, waited: list):
+    """
+    Passes iterable through, adding the seconds spent waiting on it to waited[0].
+    """
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            waited[0] += time.perf_counter() - start
+        yield item
+
+
+def filter_blacklisted(words):
+    """
+    Returns {word: blacklist category} for the words to drop, recording the
+    rejections per category.
+    """
+    with stage_timer("blacklist"):
+        _, rejected = filter_terms(words)
+    for category, count in Counter(rejected.values()).items():
+        BLACKLIST_REJECTIONS.inc(count, category=category)
+    return rejected
+
+
+def find_exact_drug_names(text: str):
+    """
+    Scans the whole text once for known drug names.
+    Returns {DRUG_DICT key: {"name": first surface form, "offsets": [[start, end], ...]}}.
+    Multi-word names are always kept; single words only with
+    EXACT_SCAN_SINGLE_WORDS, and if they do not look like ordinary
+    vocabulary (blacklist, stop words, minimum length).
+    """
+    start = time.perf_counter()
+    hits = list(DRUG_MATCHER.find(text))
+    stop_words = get_nlp().Defaults.stop_words
+    scan_seconds = time.perf_counter() - start
+    rejected = filter_blacklisted({hit["text"] for hit in hits if hit["words"] == 1}) if EXACT_SCAN_SINGLE_WORDS else {}
+
+    start = time.perf_counter()
+    matches = {}
+    for hit in hits:
+        if hit["words"] == 1:
+            word = hit["text"]
+            if (not EXACT_SCAN_SINGLE_WORDS or len(word) < EXACT_SCAN_MIN_LENGTH
+                    or word.lower() in stop_words or word in rejected):
+                continue
+
+        match = matches.setdefault(hit["key"], {"name": hit["text"], "offsets": []})
+        match["offsets"].append([hit["start"], hit["end"]])
+
+    observe_stage("exact_scan", scan_seconds + time.perf_counter() - start)
+    count_items("exact_matches", len(matches))
+    return matches
+
+
+def drop_known_candidates(multi_words, word_to_sentence, known_keys=None):
+    """
+    Removes the candidates whose upper-cased key is in known_keys
+    (already resolved, e.g. by the exact scan).
+    """
+    if known_keys:
+        multi_words = {term for term in multi_words if term.upper() not in known_keys}
+        word_to_sentence = {
+            word: sentence for word, sentence in word_to_sentence.items()
+            if word.upper() not in known_keys
+        }
+    return multi_words, word_to_sentence
+
+
+def extract_candidates(text: str, batched: bool = True, known_keys=None):
+    """
+    Extract candidate pharmaceutical terms using noun chunks.
+    Uses blacklist filtering and LLM validation for ambiguous single words.
+    Terms whose upper-cased key is in known_keys are already resolved and skipped.
+    """
+
+    multi_words, word_to_sentence = collect_candidates(text, batched=batched)
+    multi_words, word_to_sentence = drop_known_candidates(multi_words, word_to_sentence, known_keys)
+    log.info("Candidates for LLM validation: %d terms", len(word_to_sentence))
 
     # Batch validate single words and embedded drugs with LLM
-    if word_to_sentence:
-        validation_results = llm_validate_pharmaceutical_terms(word_to_sentence)
-        for word, is_pharma in validation_results.items():
-            if is_pharma:
-                candidates.add(word)
+    verdicts = llm_validate_pharmaceutical_terms(word_to_sentence) if word_to_sentence else {}
+    return merge_candidates(multi_words, verdicts)
+
+
+def merge_candidates(multi_words, verdicts: dict):
+    """
+    The candidate tokens in the order both scan paths resolve and report them:
+    the multi-word phrases without embedded drugs (low ambiguity), sorted,
+    then the words the LLM accepted, sorted.
+    """
+    phrases = sorted(multi_words)
+    words = sorted(word for word, is_pharma in verdicts.items() if is_pharma and word not in multi_words)
+    return phrases + words
+
+
 
-    print("LLM called finished")
+def lookup_normalized_matches(tokens):
+    """
+    Resolves tokens naming a drug without its salt, dosage form or
+    combination partners ("doxylamine" -> "DOXYLAMINE SUCCINATE").
+    Returns {key: DRUG_DICT key} for the tokens that matched.
+    """
+    if not NORMALIZED_MATCH_ENABLED:
+        return {}
 
-    return list(candidates)
+    matches = {}
+    with stage_timer("normalize"):
+        for token in tokens:
+            key = token.upper().strip()
+            if key in DRUG_DICT or key in matches:
+                continue
+            match = NORMALIZED_INDEX.lookup(token)
+            if match:
+                matches[key] = match
+    count_items("normalized_matches", len(matches))
+    return matches
 
 
+def lookup_fuzzy_matches(tokens, resolved=None):
+    """
+    Resolves misspelled / oddly hyphenated tokens against the drug names.
+    Returns {key: (DRUG_DICT key, edit distance)} for the tokens that matched.
+    """
+    if not FUZZY_MATCH_ENABLED:
+        return {}
+
+    resolved = resolved or {}
+    matches = {}
+    with stage_timer("fuzzy"):
+        for token in tokens:
+            key = token.upper().strip()
+            if key in DRUG_DICT or key in resolved or key in matches:
+                continue
+            match = FUZZY_INDEX.lookup(token)
+            if match:
+                matches[key] = match
+    count_items("fuzzy_matches", len(matches))
+    return matches
+
+
+def lookup_vector_matches(tokens, resolved=None):
+    """
+    Gathers every token that may need a vector lookup (anything that is not an
+    exact dictionary hit or already resolved) and resolves them all with one
+    batched query.
+    Returns {key: (document, distance)} for the nearest neighbour of each token.
+    """
+    resolved = resolved or {}
+    pending = {}
+    for token in tokens:
+        key = token.upper().strip()
+        if key not in DRUG_DICT and key not in resolved and key not in pending:
+            pending[key] = token
+
+    if not pending:
+        return {}
+
+    log.debug("Querying vector store for %d terms in one batch", len(pending))
+    count_items("vector_queries", len(pending))
+    query_results = get_vector_store().query_many(list(pending.values()), n_results=1)
+
+    matches = {}
+    for key, documents, distances in zip(pending, query_results["documents"], query_results["distances"]):
+        if documents:
+            matches[key] = (documents[0], distances[0])
+    return matches
+
+
+def resolve_tokens(tokens):
+    """
+    Runs the normalized name, fuzzy and batched vector tiers over the
+    candidate tokens; each tier only sees what the previous ones left.
+    Returns (normalized_matches, fuzzy_matches, vector_matches).
+    """
+    normalized_matches = lookup_normalized_matches(tokens)
+    fuzzy_matches = lookup_fuzzy_matches(tokens, resolved=normalized_matches)
+    log.debug("Resolved %d terms by normalized name, %d by fuzzy match", len(normalized_matches), len(fuzzy_matches))
+
+    vector_matches = lookup_vector_matches(tokens, resolved={**normalized_matches, **fuzzy_matches})
+    return normalized_matches, fuzzy_matches, vector_matches
+
 
 def scan_text_for_entities(text: str):
-    found_entities = []
+    get_drug_index()
+
+    # Known drug names found verbatim skip both the LLM and the vector store
+    exact_matches = find_exact_drug_names(text)
+    log.info("Found %d drug names by exact text scan", len(exact_matches))
+
     # Simple word-based scanning (can later improve with fuzzy/vectorstore)
-    tokens = extract_candidates(text)
-    seen = set()
+    tokens = extract_candidates(text, known_keys=exact_matches)
+    normalized_matches, fuzzy_matches, vector_matches = resolve_tokens(tokens)
+
+    return build_entities(text, exact_matches, tokens, fuzzy_matches, vector_matches, normalized_matches)
+
 
-    print("Starting Vectorstore querying...")
+def build_entities(text: str, exact_matches: dict, tokens, fuzzy_matches: dict, vector_matches: dict,
+                   normalized_matches: dict = None):
+    """
+    Turns the exact scan hits and the resolved candidate tokens into the
+    entity list returned by /extract.
+    """
+    with stage_timer("dictionary"):
+        found_entities = _build_entities(
+            text, exact_matches, tokens, fuzzy_matches, vector_matches, normalized_matches or {}
+        )
+    count_items("entities", len(found_entities))
+    return found_entities
+
+
+def _build_entities(text: str, exact_matches: dict, tokens, fuzzy_matches: dict, vector_matches: dict,
+                    normalized_matches: dict):
+    found_entities = []
+    for key, match in exact_matches.items():
+        found_entities.append({
+            "name": match["name"],
+            "source": "exact_match",
+            "offsets": match["offsets"],
+            "info": DRUG_DICT[key]
+        })
+    seen = set(exact_matches)
 
     for token in tokens:
-        print(f"Processing token: {token}")
         key = token.upper().strip()
         if key in seen:
             continue
@@ -121,11 +413,39 @@ def scan_text_for_entities(text: str):
             found_entities.append({
                 "name": token,
                 "source": "exact_match",
+                "offsets": find_offsets(text, token),
                 "info": DRUG_DICT[key]
             })
-            print(f" - Found exact match in drug dict: {token}")
-            
+            log.debug("Found exact match in drug dict: %s", token)
+
+        elif key in normalized_matches:
+            seen.add(key)
+            matched_key = normalized_matches[key]
+            found_entities.append({
+                "name": token,
+                "source": "normalized_match",
+                "matched": matched_key,
+                "offsets": find_offsets(text, token),
+                "info": DRUG_DICT[matched_key]
+            })
+            log.debug("Found normalized match %s for token: %s", matched_key, token)
+
+        elif key in fuzzy_matches:
+            seen.add(key)
+            matched_key, edit_distance = fuzzy_matches[key]
+            found_entities.append({
+                "name": token,
+                "source": "fuzzy_match",
+                "matched": matched_key,
+                "edit_distance": edit_distance,
+                "offsets": find_offsets(text, token),
+                "info": DRUG_DICT[matched_key]
+            })
+            log.debug("Found fuzzy match %s (edit distance %d) for token: %s", matched_key, edit_distance, token)
+
         else:
+            match = vector_matches.get(key)
+
             # check first word by word
             found = False
             for word in token.split(" "):
@@ -136,18 +456,21 @@ def scan_text_for_entities(text: str):
                 if word.upper().strip() in DRUG_DICT:
                     
                     # double check context with vectorstore
-                    query_results = VECTOR_STORE.query(token, n_results=1)  # to log
-                    if query_results["distances"][0][0] > 50:
-                        print(f" - Exact match {word} found but high distance {query_results['distances'][0][0]} in token: {token}")
+                    if match is None:
+                        continue
+                    document, distance = match
+                    if distance > MAX_VECTOR_DISTANCE:
+                        log.debug("Exact match %s found but high distance %s in token: %s", word, distance, token)
                         continue
                     
                     found_entities.append({
                         "name": word,
                         "source": "exact_match_partial",
-                        "distance": query_results["distances"][0][0],
+                        "distance": distance,
+                        "offsets": find_offsets(text, word),
                         "info": DRUG_DICT[word.upper().strip()]
                     })
-                    print(f" - Found partial exact match {word} in vector store with distance {query_results['distances'][0][0]} in token: {token}")
+                    log.debug("Found partial exact match %s in vector store with distance %s in token: %s", word, distance, token)
                     found = True
                     seen.add(key)
                     break
@@ -155,17 +478,18 @@ def scan_text_for_entities(text: str):
                 continue
 
             # Use vector store to find similar drugs
-            query_results = VECTOR_STORE.query(token, n_results=1)
-            if query_results and query_results.get("documents"):
+            if match:
+                document, distance = match
                 seen.add(key)
-                if query_results["distances"][0][0] > 50:
+                if distance > MAX_VECTOR_DISTANCE:
                     continue
                 found_entities.append({
                     "name": token,
                     "source": "vectorstore",
-                    "info": DRUG_DICT[query_results["documents"][0][0].upper()]
+                    "offsets": find_offsets(text, token),
+                    "info": DRUG_DICT[document.upper()]
                 })
-                print(f" - Found match {token} in vector store with distance {query_results['distances'][0][0]}")
+                log.debug("Found match %s in vector store with distance %s", token, distance)
                 # break
 
     return found_entities
@@ -0,0 +1,134 @@
+"""
+Compact /extract responses and the cacheable /entities record lookups.
+
+In compact form each entity drops its embedded FDA record and references it
+by product_ndc instead (by drug name for records without one), an id
+/entities resolves. Every distinct record is sent once in a "records"
+table, together with the drug index version the records belong to. Payloads
+are encoded with orjson when it is installed (json otherwise) and gzipped
+for clients that accept it.
+"""
+import gzip
+import hashlib
+import json
+import os
+
+from fastapi import Response
+from utils.drug_index import record_names
+from utils.drug_lookup_dict import DRUG_DICT
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Responses smaller than this are sent uncompressed
+RESPONSE_GZIP_MIN_BYTES = int(os.getenv("RESPONSE_GZIP_MIN_BYTES", "1024"))
+RESPONSE_GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", "5"))
+# /entities caching: max-age for unversioned requests, and the id limit per call
+ENTITIES_MAX_AGE = int(os.getenv("ENTITIES_MAX_AGE", "3600"))
+ENTITIES_MAX_IDS = int(os.getenv("ENTITIES_MAX_IDS", "200"))
+
+IMMUTABLE_MAX_AGE = 31536000
+
+
+def encode_json(payload) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def record_ref(record: dict) -> str:
+    """
+    product_ndc of the record; records without one are referenced by the
+    first of their names that DRUG_DICT maps back to them, so /entities can
+    resolve every ref.
+    """
+    product_ndc = record.get("product_ndc")
+    if product_ndc:
+        return product_ndc
+    names = [name for name, _ in record_names(record)]
+    for name in names:
+        entry = DRUG_DICT.get(name)
+        if entry is not None and entry["record"] == record:
+            return name
+    if names:
+        return names[0]
+    return "sha1:" + hashlib.sha1(encode_json(record)).hexdigest()[:16]
+
+
+def compact_entities(entities):
+    """
+    Returns (entity hits referencing their record, {ref: record}).
+    """
+    hits, records = [], {}
+    for entity in entities:
+        hit = {field: value for field, value in entity.items() if field != "info"}
+        info = entity.get("info") or {}
+        record = info.get("record", info)
+        ref = record_ref(record)
+        records.setdefault(ref, record)
+        hit["ref"] = ref
+        hit["is_ingredient"] = info.get("is_ingredient", False)
+        hits.append(hit)
+    return hits, records
+
+
+def compact_payload(entities, **extra) -> dict:
+    hits, records = compact_entities(entities)
+    return {"search": hits, "records": records, "version": DRUG_DICT.version, **extra}
+
+
+def json_response(payload, accept_encoding: str = None, status_code: int = 200, headers: dict = None) -> Response:
+    """
+    Encodes payload with the fast encoder, gzipped when the client accepts it
+    and the body is worth compressing.
+    """
+    body = encode_json(payload)
+    headers = dict(headers or {})
+    headers["Vary"] = "Accept-Encoding"
+    if len(body) >= RESPONSE_GZIP_MIN_BYTES and "gzip" in (accept_encoding or "").lower():
+        body = gzip.compress(body, compresslevel=RESPONSE_GZIP_LEVEL)
+        headers["Content-Encoding"] = "gzip"
+    return Response(content=body, status_code=status_code, media_type="application/json", headers=headers)
+
+
+def parse_ids(ids: str):
+    """
+    Comma-separated ids, deduplicated in order; raises ValueError past ENTITIES_MAX_IDS.
+    """
+    parsed = list(dict.fromkeys(part.strip() for part in ids.split(",") if part.strip()))
+    if not parsed:
+        raise ValueError("ids must list at least one product_ndc or drug name")
+    if len(parsed) > ENTITIES_MAX_IDS:
+        raise ValueError(f"at most {ENTITIES_MAX_IDS} ids per request")
+    return parsed
+
+
+def entities_etag(ids) -> str:
+    """
+    Weak ETag of an /entities answer: the drug index version plus the ids asked for.
+    """
+    digest = hashlib.sha1("\x1f".join(sorted(ids)).encode("utf-8")).hexdigest()[:16]
+    return f'W/"{DRUG_DICT.version}-{digest}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    # Weak comparison: W/"x" and "x" are the same tag
+    bare = etag[2:] if etag.startswith("W/") else etag
+    return "*" in candidates or any(
+        (tag[2:] if tag.startswith("W/") else tag) == bare for tag in candidates
+    )
+
+
+def cache_control(version: str = None) -> str:
+    """
+    Records never change within a drug index version, so requests pinned to
+    the current version (?v=) may be cached for good.
+    """
+    if version and version == DRUG_DICT.version:
+        return f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+    return f"public, max-age={ENTITIES_MAX_AGE}, must-revalidate"
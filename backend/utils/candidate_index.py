@@ -0,0 +1,780 @@
+"""
+Persistent inverted index of /extract results, answering "which CVs mention
+pembrolizumab or a kinase inhibitor?" without re-extracting any PDF.
+
+Every indexed CV (keyed by the sha256 of its PDF) contributes terms for
+each entity found in it:
+
+    name:<drug>     surface name, brand and generic name of the matched record
+    ing:<drug>      active ingredients of the matched record
+    ndc:<ndc>       product_ndc of the matched record
+    class:<class>   FDA pharmacologic classes of the matched record
+
+Drug names are folded like the normalized name tier (salts and dosage forms
+dropped), so "metformin" finds "Metformin HCl". The term frequency is the
+number of hits of the entity in the CV.
+
+Postings are doc-id deltas plus term frequencies, zlib-compressed, one row
+per term. New documents go to a pending table and deletes to a tombstone
+table. Queries read both, and merge() folds them into the compressed
+postings. Once CANDIDATE_INDEX_MERGE_ROWS pending rows pile up, a merge runs
+on a background thread, CANDIDATE_INDEX_MERGE_BATCH terms at a time.
+The file may be shared by several worker processes: every operation runs in
+one SQLite transaction and re-reads the in-memory caches when another process
+has committed since (PRAGMA data_version).
+
+Query syntax: terms combined with AND (also implicit), OR, NOT and
+parentheses. A bare word matches name: or ing:, and class: matches every
+class containing all the given words. Example:
+
+    (pembrolizumab OR nivolumab OR class:"blocking antibody") NOT ndc:0006-3026
+
+Run from backend/:
+    python -m utils.candidate_index backfill ../cvs --workers 4
+    python -m utils.candidate_index search 'class:"kinase inhibitor" AND imatinib'
+"""
+import argparse
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
+from itertools import groupby
+
+import numpy as np
+
+from utils.fuzzy_index import normalize_name
+from utils.logs import get_logger
+from utils.name_normalizer import normalize_drug_name
+from utils.result_cache import content_hash
+
+log = get_logger(__name__)
+
+CANDIDATE_INDEX_ENABLED = os.getenv("CANDIDATE_INDEX_ENABLED", "1") == "1"
+CANDIDATE_INDEX_PATH = os.getenv("CANDIDATE_INDEX_PATH", "../index/candidates.sqlite3")
+CANDIDATE_INDEX_MERGE_ROWS = int(os.getenv("CANDIDATE_INDEX_MERGE_ROWS", "100000"))
+# Terms folded per lock hold during a merge; searches and adds run in between
+CANDIDATE_INDEX_MERGE_BATCH = int(os.getenv("CANDIDATE_INDEX_MERGE_BATCH", "1000"))
+
+FIELDS = ("name", "ing", "ndc", "class")
+# BM25 term frequency saturation
+BM25_K1 = 1.2
+
+_QUERY_TOKEN = re.compile(r'\(|\)|[A-Za-z]+:"[^"]*"|"[^"]*"|[^\s()]+')
+_OPERATORS = {"AND", "OR", "NOT"}
+
+
+def term_value(name: str) -> str:
+    """
+    Indexed form of a drug name; salt-only names ("SODIUM CHLORIDE") keep their words.
+    """
+    return normalize_drug_name(name) or normalize_name(name)
+
+
+def document_terms(entities) -> Counter:
+    """
+    {term: frequency} of a CV's /extract entities.
+    """
+    terms = Counter()
+    for entity in entities:
+        hits = max(len(entity.get("offsets") or ()), 1)
+        info = entity.get("info") or {}
+        record = info.get("record", info)
+        names = {term_value(entity["name"])}
+        names.update(term_value(record[field]) for field in ("brand_name", "generic_name") if record.get(field))
+        entity_terms = {f"name:{name}" for name in names if name}
+        entity_terms.update(
+            f"ing:{term_value(ingredient['name'])}"
+            for ingredient in record.get("active_ingredients", []) if ingredient.get("name")
+        )
+        if record.get("product_ndc"):
+            entity_terms.add(f"ndc:{record['product_ndc']}")
+        entity_terms.update(f"class:{normalize_name(pharm_class)}" for pharm_class in record.get("pharm_class", []))
+        for term in entity_terms:
+            terms[term] += hits
+    return terms
+
+
+def entity_summary(entities):
+    return [
+        {
+            "name": entity["name"],
+            "source": entity.get("source"),
+            "product_ndc": (entity.get("info") or {}).get("record", {}).get("product_ndc"),
+            "offsets": entity.get("offsets", []),
+        }
+        for entity in entities
+    ]
+
+
+EMPTY = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64))
+
+
+def encode_postings(doc_ids, frequencies) -> bytes:
+    """
+    Sorted doc ids as uint32 deltas followed by uint16 term frequencies, zlib-compressed.
+    """
+    deltas = np.diff(np.asarray(doc_ids, dtype=np.int64), prepend=0).astype(np.uint32)
+    frequencies = np.minimum(np.asarray(frequencies), 65535).astype(np.uint16)
+    return zlib.compress(deltas.tobytes() + frequencies.tobytes())
+
+
+def decode_postings(data: bytes, df: int):
+    raw = zlib.decompress(data)
+    doc_ids = np.frombuffer(raw, dtype=np.uint32, count=df).cumsum(dtype=np.int64)
+    frequencies = np.frombuffer(raw, dtype=np.uint16, count=df, offset=4 * df).astype(np.float64)
+    return doc_ids, frequencies
+
+
+def _without(postings, deleted):
+    doc_ids, frequencies = postings
+    if not len(deleted) or not len(doc_ids):
+        return postings
+    keep = ~np.isin(doc_ids, deleted, assume_unique=True)
+    return doc_ids[keep], frequencies[keep]
+
+
+def _concat(parts):
+    """
+    Postings of disjoint document sets as one sorted postings pair.
+    """
+    parts = [part for part in parts if len(part[0])]
+    if not parts:
+        return EMPTY
+    if len(parts) == 1:
+        return parts[0]
+    doc_ids = np.concatenate([part[0] for part in parts])
+    frequencies = np.concatenate([part[1] for part in parts])
+    order = np.argsort(doc_ids, kind="stable")
+    return doc_ids[order], frequencies[order]
+
+
+def _union(parts):
+    """
+    Postings of possibly overlapping document sets, frequencies summed.
+    Doc ids are dense, so this is a bincount rather than a sort.
+    """
+    parts = [part for part in parts if len(part[0])]
+    if len(parts) <= 1:
+        return parts[0] if parts else EMPTY
+    dense = np.bincount(
+        np.concatenate([part[0] for part in parts]), weights=np.concatenate([part[1] for part in parts])
+    )
+    doc_ids = np.flatnonzero(dense)
+    return doc_ids, dense[doc_ids]
+
+
+def _mask(doc_ids, size: int):
+    mask = np.zeros(size, dtype=bool)
+    mask[doc_ids] = True
+    return mask
+
+
+def _intersect(a, b):
+    if not len(a) or not len(b):
+        return EMPTY[0]
+    return a[_mask(b, max(a[-1], b[-1]) + 1)[a]]
+
+
+def _difference(a, b):
+    if not len(a) or not len(b):
+        return a
+    return a[~_mask(b, max(a[-1], b[-1]) + 1)[a]]
+
+
+def _union_ids(arrays):
+    arrays = [doc_ids for doc_ids in arrays if len(doc_ids)]
+    if len(arrays) <= 1:
+        return arrays[0] if arrays else EMPTY[0]
+    return np.flatnonzero(_mask(np.concatenate(arrays), max(doc_ids[-1] for doc_ids in arrays) + 1))
+
+
+def _lookup(doc_ids, frequencies, wanted):
+    """
+    Frequencies of the wanted doc ids in a postings pair, 0 where absent.
+    """
+    if not len(doc_ids):
+        return np.zeros(len(wanted))
+    positions = np.minimum(np.searchsorted(doc_ids, wanted), len(doc_ids) - 1)
+    return np.where(doc_ids[positions] == wanted, frequencies[positions], 0.0)
+
+
+def parse_query(query: str):
+    """
+    Parses a search query into a tree of ("term", field, value),
+    ("and", [...]), ("or", [...]) and ("not", node); raises ValueError.
+    """
+    tokens = _QUERY_TOKEN.findall(query)
+    position = 0
+
+    def peek():
+        return tokens[position] if position < len(tokens) else None
+
+    def take():
+        nonlocal position
+        position += 1
+        return tokens[position - 1]
+
+    def parse_or():
+        nodes = [parse_and()]
+        while peek() is not None and peek().upper() == "OR":
+            take()
+            nodes.append(parse_and())
+        return nodes[0] if len(nodes) == 1 else ("or", nodes)
+
+    def parse_and():
+        nodes = [parse_not()]
+        while peek() is not None and peek() != ")" and peek().upper() != "OR":
+            if peek().upper() == "AND":
+                take()
+            nodes.append(parse_not())
+        return nodes[0] if len(nodes) == 1 else ("and", nodes)
+
+    def parse_not():
+        if peek() is not None and peek().upper() == "NOT":
+            take()
+            return ("not", parse_not())
+        return parse_atom()
+
+    def parse_atom():
+        token = peek()
+        if token is None:
+            raise ValueError("unexpected end of query")
+        if token == ")" or token.upper() in _OPERATORS:
+            raise ValueError(f"unexpected {token!r} in query")
+        take()
+        if token == "(":
+            node = parse_or()
+            if peek() != ")":
+                raise ValueError("missing ')' in query")
+            take()
+            return node
+        field, separator, value = token.partition(":")
+        if not separator or field.lower() not in FIELDS:
+            field, value = None, token
+        value = value.strip('"').strip()
+        if not value:
+            raise ValueError(f"empty term {token!r} in query")
+        return ("term", field.lower() if field else None, value)
+
+    if not tokens:
+        raise ValueError("empty query")
+    tree = parse_or()
+    if position < len(tokens):
+        raise ValueError(f"unexpected {tokens[position]!r} in query")
+    return tree
+
+
+class CandidateIndex:
+    """
+    SQLite-backed inverted index from entity terms to the CVs mentioning them.
+    Merges run in the background, releasing the lock every merge_batch terms,
+    so neither the add that crosses merge_rows nor concurrent searches wait on
+    a whole merge.
+    """
+
+    def __init__(self, path: str, merge_rows: int = CANDIDATE_INDEX_MERGE_ROWS,
+                 merge_batch: int = CANDIDATE_INDEX_MERGE_BATCH):
+        self.path = path
+        self.merge_rows = merge_rows
+        self.merge_batch = merge_batch
+        self._lock = threading.Lock()
+        # One merge at a time; the background one is skipped while another runs
+        self._merge_lock = threading.Lock()
+        self._merger = ThreadPoolExecutor(max_workers=1, thread_name_prefix="candidate-merge")
+        self._segment = lru_cache(maxsize=256)(self._segment_uncached)
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript("""
+            PRAGMA auto_vacuum = INCREMENTAL;
+            PRAGMA journal_mode = WAL;
+            CREATE TABLE IF NOT EXISTS docs (
+                doc_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                cv_id TEXT UNIQUE NOT NULL,
+                name TEXT,
+                indexed REAL NOT NULL,
+                body BLOB NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT PRIMARY KEY,
+                df INTEGER NOT NULL,
+                data BLOB NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS pending (
+                term TEXT NOT NULL,
+                doc_id INTEGER NOT NULL,
+                tf INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS pending_term ON pending (term);
+            CREATE INDEX IF NOT EXISTS pending_doc ON pending (doc_id);
+            CREATE TABLE IF NOT EXISTS deleted (
+                doc_id INTEGER PRIMARY KEY,
+                terms TEXT NOT NULL
+            );
+        """)
+        self._db.commit()
+        self._data_version = self._db.execute("PRAGMA data_version").fetchone()[0]
+        self._load_state()
+
+    def _load_state(self):
+        """
+        (Re)reads the state cached in memory: tombstones, counters, classes,
+        and the decoded segments.
+        """
+        self._segment.cache_clear()
+        self._deleted = {doc_id for (doc_id,) in self._db.execute("SELECT doc_id FROM deleted")}
+        self._pending_rows = self._db.execute("SELECT COUNT(*) FROM pending").fetchone()[0]
+        self._doc_count = self._db.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+        self._all_doc_ids = None
+        self._classes = {
+            term[len("class:"):] for (term,) in self._db.execute(
+                "SELECT term FROM postings WHERE term LIKE 'class:%' "
+                "UNION SELECT DISTINCT term FROM pending WHERE term LIKE 'class:%'"
+            )
+        }
+
+    @contextmanager
+    def _transaction(self, write: bool = False):
+        """
+        Runs a block under the lock as one SQLite transaction, so it sees a
+        single snapshot of the file. The file is shared by every worker
+        process: when another one committed since this process last looked
+        (PRAGMA data_version), the in-memory state is read again first.
+        Write transactions take the write lock up front (BEGIN IMMEDIATE).
+        """
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+            try:
+                # The first read pins the snapshot data_version then describes
+                self._db.execute("SELECT 1 FROM docs LIMIT 1").fetchall()
+                version = self._db.execute("PRAGMA data_version").fetchone()[0]
+                if version != self._data_version:
+                    self._data_version = version
+                    self._load_state()
+                yield
+                self._db.commit()
+            except BaseException:
+                self._db.rollback()
+                raise
+
+    def __len__(self) -> int:
+        return self._doc_count
+
+    def contains(self, cv_id: str) -> bool:
+        with self._transaction():
+            return self._db.execute("SELECT 1 FROM docs WHERE cv_id = ?", (cv_id,)).fetchone() is not None
+
+    # Updates
+
+    def add(self, cv_id: str, name: str, entities):
+        """
+        Indexes (or re-indexes) a CV's entities.
+        """
+        self.add_many([(cv_id, name, entities)])
+
+    def add_many(self, documents):
+        """
+        Indexes (cv_id, name, entities) triples in one transaction.
+        """
+        rows = []
+        for cv_id, name, entities in documents:
+            terms = document_terms(entities)
+            body = zlib.compress(json.dumps({"entities": entity_summary(entities), "terms": terms}).encode("utf-8"))
+            rows.append((cv_id, name, terms, body))
+
+        with self._transaction(write=True):
+            for cv_id, name, terms, body in rows:
+                existing = self._db.execute("SELECT doc_id FROM docs WHERE cv_id = ?", (cv_id,)).fetchone()
+                if existing is not None:
+                    self._delete_doc(existing[0])
+                doc_id = self._db.execute(
+                    "INSERT INTO docs (cv_id, name, indexed, body) VALUES (?, ?, ?, ?)",
+                    (cv_id, name, time.time(), body)
+                ).lastrowid
+                self._db.executemany(
+                    "INSERT INTO pending (term, doc_id, tf) VALUES (?, ?, ?)",
+                    [(term, doc_id, tf) for term, tf in terms.items()]
+                )
+                self._pending_rows += len(terms)
+                self._doc_count += 1
+                self._all_doc_ids = None
+                self._classes.update(term[len("class:"):] for term in terms if term.startswith("class:"))
+        with self._lock:
+            if self._pending_rows >= self.merge_rows and not self._merge_lock.locked():
+                self._merger.submit(self._background_merge)
+
+    def delete(self, cv_id: str) -> bool:
+        with self._transaction(write=True):
+            row = self._db.execute("SELECT doc_id FROM docs WHERE cv_id = ?", (cv_id,)).fetchone()
+            if row is None:
+                return False
+            self._delete_doc(row[0])
+            return True
+
+    def _delete_doc(self, doc_id: int):
+        body = self._db.execute("SELECT body FROM docs WHERE doc_id = ?", (doc_id,)).fetchone()[0]
+        terms = json.loads(zlib.decompress(body))["terms"]
+        self._db.execute("DELETE FROM docs WHERE doc_id = ?", (doc_id,))
+        self._pending_rows -= self._db.execute("DELETE FROM pending WHERE doc_id = ?", (doc_id,)).rowcount
+        self._db.execute("INSERT OR REPLACE INTO deleted (doc_id, terms) VALUES (?, ?)", (doc_id, json.dumps(list(terms))))
+        self._deleted.add(doc_id)
+        self._doc_count -= 1
+        self._all_doc_ids = None
+
+    def merge(self):
+        """
+        Folds pending documents and deletes into the compressed postings.
+        Waits for a background merge that is already running.
+        """
+        with self._merge_lock:
+            self._merge()
+
+    def _background_merge(self):
+        if not self._merge_lock.acquire(blocking=False):
+            return
+        try:
+            self._merge()
+        except sqlite3.Error as e:
+            log.warning("Candidate index merge failed: %s", e)
+        finally:
+            self._merge_lock.release()
+
+    def _merge(self):
+        """
+        Batched merge; the caller holds _merge_lock. Documents deleted before
+        it starts are dropped from every posting list they touched, then
+        forgotten; later deletes wait for the next merge. Until a term's
+        batch is written, queries keep reading its pending rows.
+        """
+        start = time.perf_counter()
+        with self._transaction():
+            touched = {term for (term,) in self._db.execute("SELECT DISTINCT term FROM pending")}
+            deleted_rows = self._db.execute("SELECT doc_id, terms FROM deleted").fetchall()
+            for _, terms in deleted_rows:
+                touched.update(json.loads(terms))
+            deleted = np.array(sorted(doc_id for doc_id, _ in deleted_rows), dtype=np.int64)
+
+        touched = sorted(touched)
+        for batch_start in range(0, len(touched), self.merge_batch):
+            with self._transaction(write=True):
+                self._merge_terms(touched[batch_start:batch_start + self.merge_batch], deleted)
+
+        with self._transaction(write=True):
+            self._db.executemany("DELETE FROM deleted WHERE doc_id = ?", [(int(doc_id),) for doc_id in deleted])
+            self._deleted.difference_update(int(doc_id) for doc_id in deleted)
+        # Give the pages of the pending rows back to the file system, a slice at a time
+        while True:
+            with self._lock:
+                if not self._db.execute("PRAGMA freelist_count").fetchone()[0]:
+                    break
+                self._db.execute("PRAGMA incremental_vacuum(2000)").fetchall()
+        log.info("Merged %d terms into the candidate index in %.2fs", len(touched), time.perf_counter() - start)
+
+    def _merge_terms(self, terms, deleted):
+        placeholders = ",".join("?" * len(terms))
+        rows = self._db.execute(
+            f"SELECT term, doc_id, tf FROM pending WHERE term IN ({placeholders}) ORDER BY term, doc_id", terms
+        )
+        pending = {}
+        for term, group in groupby(rows, key=lambda row: row[0]):
+            group = list(group)
+            pending[term] = (
+                np.fromiter((row[1] for row in group), dtype=np.int64, count=len(group)),
+                np.fromiter((row[2] for row in group), dtype=np.float64, count=len(group)),
+            )
+        for term in terms:
+            doc_ids, frequencies = _concat([_without(self._segment(term), deleted), pending.get(term, EMPTY)])
+            if not len(doc_ids):
+                self._db.execute("DELETE FROM postings WHERE term = ?", (term,))
+                continue
+            self._db.execute(
+                "INSERT OR REPLACE INTO postings (term, df, data) VALUES (?, ?, ?)",
+                (term, len(doc_ids), encode_postings(doc_ids, frequencies))
+            )
+        self._pending_rows -= self._db.execute(f"DELETE FROM pending WHERE term IN ({placeholders})", terms).rowcount
+        self._segment.cache_clear()
+
+    # Queries
+
+    def _segment_uncached(self, term: str):
+        row = self._db.execute("SELECT df, data FROM postings WHERE term = ?", (term,)).fetchone()
+        return decode_postings(row[1], row[0]) if row is not None else EMPTY
+
+    def _all_docs(self):
+        if self._all_doc_ids is None:
+            self._all_doc_ids = np.fromiter(
+                (doc_id for (doc_id,) in self._db.execute("SELECT doc_id FROM docs ORDER BY doc_id")), dtype=np.int64
+            )
+        return self._all_doc_ids
+
+    def _deleted_ids(self):
+        return np.array(sorted(self._deleted), dtype=np.int64)
+
+    def _postings(self, term: str, deleted):
+        """
+        (doc ids, term frequencies) of a term: merged postings without the
+        deleted documents, plus the pending ones.
+        """
+        rows = self._db.execute("SELECT doc_id, tf FROM pending WHERE term = ?", (term,)).fetchall()
+        segment = _without(self._segment(term), deleted)
+        if not rows:
+            return segment
+        pending = (
+            np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows)),
+            np.fromiter((row[1] for row in rows), dtype=np.float64, count=len(rows)),
+        )
+        return _concat([segment, pending])
+
+    def expand(self, field, value: str):
+        """
+        Index terms a query term stands for.
+        """
+        if field == "ndc":
+            return [f"ndc:{value}"]
+        if field == "class":
+            words = set(normalize_name(value).split())
+            return [f"class:{name}" for name in sorted(self._classes) if words <= set(name.split())]
+        name = term_value(value)
+        if field in ("name", "ing"):
+            return [f"{field}:{name}"]
+        return [f"name:{name}", f"ing:{name}"]
+
+    def _leaf(self, node, leaves: dict, deleted):
+        """
+        (doc ids, term frequencies) of a term node, summed over the terms it expands to.
+        """
+        if node not in leaves:
+            parts = [self._postings(term, deleted) for term in self.expand(node[1], node[2])]
+            leaves[node] = _union(parts)
+        return leaves[node]
+
+    def _evaluate(self, node, leaves: dict, deleted):
+        """
+        Sorted doc ids matching a query node.
+        """
+        kind = node[0]
+        if kind == "term":
+            return self._leaf(node, leaves, deleted)[0]
+        if kind == "not":
+            return _difference(self._all_docs(), self._evaluate(node[1], leaves, deleted))
+        if kind == "and":
+            positives = [child for child in node[1] if child[0] != "not"]
+            negatives = [child for child in node[1] if child[0] == "not"]
+            if positives:
+                sets = sorted((self._evaluate(child, leaves, deleted) for child in positives), key=len)
+                result = sets[0]
+                for other in sets[1:]:
+                    result = _intersect(result, other)
+            else:
+                result = self._evaluate(negatives.pop(0), leaves, deleted)
+            for child in negatives:
+                result = _difference(result, self._evaluate(child[1], leaves, deleted))
+            return result
+        return _union_ids([self._evaluate(child, leaves, deleted) for child in node[1]])
+
+    @staticmethod
+    def _positive_leaves(node):
+        if node[0] == "term":
+            yield node
+        elif node[0] in ("and", "or"):
+            for child in node[1]:
+                yield from CandidateIndex._positive_leaves(child)
+
+    def search(self, query: str, ranked: bool = True, limit: int = 20, offset: int = 0, hits: bool = False):
+        """
+        Returns {"total", "results": [{"cv_id", "name", "indexed", "score", "matched"[, "entities"]}]}.
+        Ranked results are ordered by BM25-style score over the query's positive
+        terms, otherwise by most recently indexed. Raises ValueError on a bad query.
+        """
+        tree = parse_query(query)
+        with self._transaction():
+            leaves, deleted = {}, self._deleted_ids()
+            doc_ids = self._evaluate(tree, leaves, deleted)
+            positive = [(node, self._leaf(node, leaves, deleted)) for node in dict.fromkeys(self._positive_leaves(tree))]
+            count = max(self._doc_count, 1)
+
+            scores = np.zeros(len(doc_ids))
+            for _, (ids, frequencies) in positive:
+                tf = _lookup(ids, frequencies, doc_ids)
+                idf = math.log(1 + (count - len(ids) + 0.5) / (len(ids) + 0.5))
+                scores += idf * tf * (BM25_K1 + 1) / (tf + BM25_K1)
+
+            wanted = min(offset + limit, len(doc_ids))
+            if ranked:
+                # Highest score first, newest first among equal scores
+                order = np.lexsort((doc_ids, scores))[::-1][:wanted]
+            else:
+                order = np.arange(len(doc_ids))[::-1][:wanted]
+            order = order[offset:]
+            page = [int(doc_id) for doc_id in doc_ids[order]]
+
+            rows = {}
+            for start in range(0, len(page), 500):
+                chunk = page[start:start + 500]
+                rows.update({
+                    row[0]: row[1:] for row in self._db.execute(
+                        f"SELECT doc_id, cv_id, name, indexed, body FROM docs WHERE doc_id IN ({','.join('?' * len(chunk))})",
+                        chunk
+                    )
+                })
+
+        page_ids = doc_ids[order]
+        matched = [_lookup(ids, frequencies, page_ids) > 0 for _, (ids, frequencies) in positive]
+        results = []
+        for position, (doc_id, index) in enumerate(zip(page, order)):
+            cv_id, name, indexed, body = rows[doc_id]
+            result = {
+                "cv_id": cv_id,
+                "name": name,
+                "indexed": indexed,
+                "score": round(float(scores[index]), 4),
+                "matched": [
+                    f"{node[1] or 'any'}:{node[2]}" for (node, _), found in zip(positive, matched) if found[position]
+                ],
+            }
+            if hits:
+                result["entities"] = json.loads(zlib.decompress(body))["entities"]
+            results.append(result)
+        return {"total": len(doc_ids), "results": results}
+
+    def stats(self):
+        with self._transaction():
+            return {
+                "documents": self._doc_count,
+                "terms": self._db.execute("SELECT COUNT(*) FROM postings").fetchone()[0],
+                "pending_rows": self._pending_rows,
+                "pending_deletes": len(self._deleted),
+                "merging": self._merge_lock.locked(),
+                "classes": len(self._classes),
+                "bytes": sum(os.path.getsize(path) for path in (self.path, f"{self.path}-wal") if os.path.exists(path)),
+            }
+
+
+_INDEXES = {}
+_INDEXES_LOCK = threading.Lock()
+
+
+def get_candidate_index(path: str = CANDIDATE_INDEX_PATH) -> CandidateIndex:
+    """
+    Returns the process-wide candidate index for a given file.
+    """
+    with _INDEXES_LOCK:
+        index = _INDEXES.get(path)
+        if index is None:
+            index = CandidateIndex(path)
+            _INDEXES[path] = index
+        return index
+
+
+def _init_backfill_worker():
+    from utils.resources import get_drug_index
+
+    get_drug_index()
+
+
+def _extract_file(path: str):
+    """
+    Backfill worker: (path, cv_id, entities, error) for one PDF.
+    """
+    from services.pdf_parser import load_pdf_text_from_bytes, scan_text_for_entities
+
+    with open(path, "rb") as f:
+        data = f.read()
+    try:
+        return path, content_hash(data), scan_text_for_entities(load_pdf_text_from_bytes(data)), None
+    except Exception as e:
+        return path, content_hash(data), None, str(e)
+
+
+def file_sha256(path: str) -> str:
+    with open(path, "rb") as f:
+        return content_hash(f.read())
+
+
+def backfill(index: CandidateIndex, directory: str, workers: int, batch_size: int = 50, reindex: bool = False):
+    """
+    Extracts and indexes every PDF under directory in a process pool. CVs
+    already in the index are skipped, so an interrupted backfill resumes.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    paths = sorted(
+        os.path.join(root, filename)
+        for root, _, filenames in os.walk(directory)
+        for filename in filenames if filename.lower().endswith(".pdf")
+    )
+    todo = paths if reindex else [path for path in paths if not index.contains(file_sha256(path))]
+    print(f"{len(paths)} PDFs, {len(paths) - len(todo)} already indexed, {len(todo)} to extract")
+
+    start = time.perf_counter()
+    done, failed, batch = 0, 0, []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_backfill_worker) as pool:
+        for path, cv_id, entities, error in pool.map(_extract_file, todo, chunksize=4):
+            if error is not None:
+                failed += 1
+                print(f"  failed {path}: {error}")
+                continue
+            batch.append((cv_id, os.path.relpath(path, directory), entities))
+            if len(batch) >= batch_size:
+                index.add_many(batch)
+                done += len(batch)
+                batch = []
+                elapsed = time.perf_counter() - start
+                print(f"  {done}/{len(todo)} indexed ({done / elapsed:.1f} CVs/s)")
+        if batch:
+            index.add_many(batch)
+            done += len(batch)
+    index.merge()
+    elapsed = time.perf_counter() - start
+    print(f"Indexed {done} CVs ({failed} failed) in {elapsed:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Candidate search index over extracted CV entities")
+    parser.add_argument("--index", default=CANDIDATE_INDEX_PATH)
+    sub = parser.add_subparsers(dest="command", required=True)
+    fill = sub.add_parser("backfill", help="extract and index every PDF under a directory")
+    fill.add_argument("directory")
+    fill.add_argument("--workers", type=int, default=os.cpu_count())
+    fill.add_argument("--batch-size", type=int, default=50)
+    fill.add_argument("--reindex", action="store_true", help="re-extract CVs already in the index")
+    find = sub.add_parser("search")
+    find.add_argument("query")
+    find.add_argument("--limit", type=int, default=20)
+    find.add_argument("--unranked", action="store_true")
+    remove = sub.add_parser("delete")
+    remove.add_argument("cv_id")
+    sub.add_parser("merge", help="fold pending inserts and deletes into the postings")
+    sub.add_parser("stats")
+    args = parser.parse_args()
+
+    index = CandidateIndex(args.index)
+    if args.command == "backfill":
+        backfill(index, args.directory, args.workers, args.batch_size, args.reindex)
+    elif args.command == "search":
+        start = time.perf_counter()
+        answer = index.search(args.query, ranked=not args.unranked, limit=args.limit)
+        print(f"{answer['total']} CVs in {(time.perf_counter() - start) * 1000:.1f} ms")
+        for result in answer["results"]:
+            print(f"  {result['score']:>8.3f}  {result['name'] or result['cv_id']}  {', '.join(result['matched'])}")
+    elif args.command == "delete":
+        print("deleted" if index.delete(args.cv_id) else "not indexed")
+    elif args.command == "merge":
+        index.merge()
+        print(index.stats())
+    else:
+        print(index.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""
+Builds the fda_drugs Chroma collection from the FDA NDC dump.
+
+The names are the DRUG_DICT keys (brand, generic and ingredient names, see
+record_names), so what gets embedded is exactly what query time looks up.
+The many records that repeat the same name collapse to one key each before
+anything is encoded. Names are processed in sorted order, in chunks:
+
+    encode    SapBERT in large batches, across worker processes (--workers)
+    upsert    into the collection with name_id() ids, in client-sized batches
+    checkpoint  build-checkpoint.json records the chunks already stored
+
+An interrupted build started again with the same data and model resumes at
+the first chunk not yet stored. A finished build writes
+fda-build-manifest.json (model, data version, names checksum, count), which
+ChromaManager verifies at startup (CHROMA_MANIFEST_CHECK).
+
+Run from backend/:
+    python -m utils.chroma_builder build --workers 4
+    python -m utils.chroma_builder status
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+
+from utils.drug_index import record_names
+from utils.logs import get_logger
+
+log = get_logger(__name__)
+
+CHECKPOINT_FILE = "build-checkpoint.json"
+MANIFEST_FILE = "fda-build-manifest.json"
+# warn: log mismatches, strict: refuse to start, off: skip the check
+CHROMA_MANIFEST_CHECK = os.getenv("CHROMA_MANIFEST_CHECK", "warn")
+
+
+def names_checksum(names) -> str:
+    digest = hashlib.sha256()
+    for name in names:
+        digest.update(name.encode("utf-8") + b"\n")
+    return digest.hexdigest()
+
+
+def collect_names(drug_dict):
+    """
+    Returns (sorted unique names, raw name count across all records).
+    """
+    raw = sum(
+        1 for record_id in range(drug_dict.store.record_count) for _ in record_names(drug_dict.record(record_id))
+    )
+    return sorted(drug_dict.keys()), raw
+
+
+def _read_json(path: str):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path: str, payload: dict):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def read_manifest(persist_dir: str):
+    return _read_json(os.path.join(persist_dir, MANIFEST_FILE))
+
+
+def update_manifest(persist_dir: str, **fields):
+    """
+    Updates an existing manifest (e.g. after an incremental sync); no-op without one.
+    """
+    manifest = read_manifest(persist_dir)
+    if manifest is not None:
+        manifest.update(fields)
+        _write_json(os.path.join(persist_dir, MANIFEST_FILE), manifest)
+
+
+def verify_manifest(persist_dir: str, model_name: str, collection, data_version: str = None):
+    """
+    Returns the list of mismatches between the build manifest and the live
+    collection / model / drug data ([] when everything matches). A missing
+    manifest is reported once, as collections built elsewhere have none.
+    """
+    manifest = read_manifest(persist_dir)
+    if manifest is None:
+        return [f"no {MANIFEST_FILE}; rebuild with: python -m utils.chroma_builder build"]
+    problems = []
+    if manifest.get("model") != model_name:
+        problems.append(f"built with model {manifest.get('model')}, querying with {model_name}")
+    if manifest.get("count") != collection.count():
+        problems.append(f"manifest lists {manifest.get('count')} vectors, collection has {collection.count()}")
+    if data_version is not None and manifest.get("data_version") != data_version:
+        problems.append(f"built from drug data {manifest.get('data_version')}, loaded {data_version}")
+    return problems
+
+
+class Encoder:
+    """
+    SentenceTransformer encoding, spread over a multi-process pool when workers > 1.
+    """
+
+    def __init__(self, model_name: str, workers: int, batch_size: int):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name)
+        self.batch_size = batch_size
+        self.pool = self.model.start_multi_process_pool(["cpu"] * workers) if workers > 1 else None
+
+    def encode(self, names):
+        if self.pool is not None:
+            return self.model.encode(names, pool=self.pool, batch_size=self.batch_size, convert_to_numpy=True)
+        return self.model.encode(names, batch_size=self.batch_size, convert_to_numpy=True)
+
+    def close(self):
+        if self.pool is not None:
+            self.model.stop_multi_process_pool(self.pool)
+            self.pool = None
+
+
+def build_collection(persist_dir: str, names, data_version: str, model_name: str, workers: int = 1,
+                     batch_size: int = 256, chunk_size: int = 8192, fresh: bool = False, encoder: Encoder = None):
+    """
+    Embeds and upserts names into the fda_drugs collection, resuming from the
+    checkpoint of an interrupted build of the same names. Returns build stats.
+    """
+    import chromadb
+    from utils.vectorstore_handler import COLLECTION_NAME, name_id
+
+    os.makedirs(persist_dir, exist_ok=True)
+    checkpoint_path = os.path.join(persist_dir, CHECKPOINT_FILE)
+    client = chromadb.PersistentClient(path=persist_dir)
+    checksum = names_checksum(names)
+    identity = {"model": model_name, "names_sha256": checksum, "chunk_size": chunk_size}
+
+    checkpoint = None if fresh else _read_json(checkpoint_path)
+    if checkpoint is not None and any(checkpoint.get(key) != value for key, value in identity.items()):
+        log.info("Checkpoint is for other names, model or chunk size; starting over")
+        checkpoint = None
+    if checkpoint is None:
+        existing = client.get_or_create_collection(name=COLLECTION_NAME)
+        if existing.count() and not fresh:
+            raise ValueError(
+                f"collection {COLLECTION_NAME} already holds {existing.count()} vectors and there is no matching "
+                "checkpoint; pass --fresh to rebuild it"
+            )
+        client.delete_collection(COLLECTION_NAME)
+        checkpoint = {**identity, "done_chunks": 0, "seconds": 0.0}
+        _write_json(checkpoint_path, checkpoint)
+    collection = client.get_or_create_collection(name=COLLECTION_NAME)
+    max_batch = client.get_max_batch_size() if hasattr(client, "get_max_batch_size") else 5000
+
+    chunks = (len(names) + chunk_size - 1) // chunk_size
+    if checkpoint["done_chunks"]:
+        log.info("Resuming at chunk %d/%d", checkpoint["done_chunks"] + 1, chunks)
+    owns_encoder = encoder is None
+    encoder = encoder or Encoder(model_name, workers, batch_size)
+    encode_seconds = upsert_seconds = 0.0
+    start = time.perf_counter()
+    try:
+        for chunk_number in range(checkpoint["done_chunks"], chunks):
+            chunk = names[chunk_number * chunk_size:(chunk_number + 1) * chunk_size]
+            begin = time.perf_counter()
+            embeddings = encoder.encode(chunk)
+            encode_seconds += time.perf_counter() - begin
+
+            begin = time.perf_counter()
+            for i in range(0, len(chunk), max_batch):
+                batch = chunk[i:i + max_batch]
+                collection.upsert(
+                    ids=[name_id(name) for name in batch],
+                    documents=batch,
+                    embeddings=embeddings[i:i + max_batch].tolist(),
+                )
+            upsert_seconds += time.perf_counter() - begin
+
+            checkpoint["done_chunks"] = chunk_number + 1
+            checkpoint["seconds"] = round(checkpoint["seconds"] + time.perf_counter() - start, 3)
+            start = time.perf_counter()
+            _write_json(checkpoint_path, checkpoint)
+            log.info("Chunk %d/%d stored (%d names)", chunk_number + 1, chunks, len(chunk))
+    finally:
+        if owns_encoder:
+            encoder.close()
+
+    manifest = {
+        "model": model_name,
+        "data_version": data_version,
+        "names_sha256": checksum,
+        "count": collection.count(),
+        "collection": COLLECTION_NAME,
+        "collection_id": str(collection.id),
+        "dim": encoder.model.get_sentence_embedding_dimension(),
+        "built": time.time(),
+        "build_seconds": checkpoint["seconds"],
+    }
+    _write_json(os.path.join(persist_dir, MANIFEST_FILE), manifest)
+    os.remove(checkpoint_path)
+    return {**manifest, "encode_seconds": round(encode_seconds, 3), "upsert_seconds": round(upsert_seconds, 3)}
+
+
+def main():
+    from utils.resources import CHROMA_PERSIST_DIR, get_drug_index
+    from utils.vectorstore_handler import EMBEDDING_MODEL_NAME
+
+    parser = argparse.ArgumentParser(description="Build the fda_drugs Chroma collection from the FDA data")
+    parser.add_argument("--persist-dir", default=CHROMA_PERSIST_DIR)
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="embed and store every drug name (resumes an interrupted build)")
+    build.add_argument("--workers", type=int, default=1, help="encoding processes")
+    build.add_argument("--batch-size", type=int, default=256, help="names per forward pass")
+    build.add_argument("--chunk-size", type=int, default=8192, help="names per upsert / checkpoint")
+    build.add_argument("--fresh", action="store_true", help="drop the collection and any checkpoint first")
+    sub.add_parser("status", help="compare the manifest with the collection and the drug data")
+    args = parser.parse_args()
+
+    drug_dict = get_drug_index()
+    if args.command == "status":
+        import chromadb
+        from utils.vectorstore_handler import COLLECTION_NAME
+
+        collection = chromadb.PersistentClient(path=args.persist_dir).get_or_create_collection(name=COLLECTION_NAME)
+        print(json.dumps(read_manifest(args.persist_dir), indent=2))
+        checkpoint = _read_json(os.path.join(args.persist_dir, CHECKPOINT_FILE))
+        if checkpoint is not None:
+            print(f"Interrupted build: {checkpoint['done_chunks']} chunks of {checkpoint['chunk_size']} stored")
+        problems = verify_manifest(args.persist_dir, EMBEDDING_MODEL_NAME, collection, drug_dict.version)
+        print("\n".join(problems) or "Collection matches the manifest and the drug data")
+        return
+
+    names, raw = collect_names(drug_dict)
+    print(f"{raw} names across {drug_dict.store.record_count} records, {len(names)} unique to embed")
+    start = time.perf_counter()
+    stats = build_collection(
+        args.persist_dir, names, drug_dict.version, EMBEDDING_MODEL_NAME, workers=args.workers,
+        batch_size=args.batch_size, chunk_size=args.chunk_size, fresh=args.fresh,
+    )
+    elapsed = time.perf_counter() - start
+    print(
+        f"Stored {stats['count']} vectors in {elapsed:.1f}s this run "
+        f"(encode {stats['encode_seconds']:.1f}s, upsert {stats['upsert_seconds']:.1f}s); "
+        f"manifest written to {os.path.join(args.persist_dir, MANIFEST_FILE)}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+"""
+Prebuilt binary drug-index artifact.
+
+The FDA JSON is compiled offline into a single file that worker processes
+mmap read-only, so every uvicorn worker shares the same pages through the OS
+page cache instead of each parsing and holding its own copy.
+
+Layout (little-endian, sections aligned to 8 bytes):
+    header    magic, format version, source size/mtime/sha256, counts, section offsets
+    keys      sorted UTF-8 name keys: offsets (Q * n_keys+1) + blob
+    values    packed entries (Q * n_keys): record_id << 1 | is_ingredient
+    slots     open-addressing hash table over the keys (crc32, linear probing)
+    records   record offsets (Q * n_records+1) + minified JSON blob
+    ndcs      sorted product_ndc keys: offsets (Q * n_ndcs+1) + blob
+    ndc ids   record ids (Q * n_ndcs)
+    ndc slots hash table over the product_ndc keys
+
+Build it with:
+    python -m utils.drug_artifact build
+"""
+import argparse
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import time
+import zlib
+from array import array
+
+from utils.drug_index import DrugStore
+from utils.logs import get_logger
+
+log = get_logger(__name__)
+
+MAGIC = b"APDRUGIX"
+FORMAT_VERSION = 1
+# magic, format, source size, source mtime_ns, source sha256, n_keys, n_records, n_ndcs, 10 section offsets
+HEADER = struct.Struct("<8sIQQ32sQQQ10Q")
+# Source size and mtime_ns, right after the magic and format
+SOURCE_STAT = struct.Struct("<QQ")
+SOURCE_STAT_OFFSET = struct.calcsize("<8sI")
+
+
+def file_sha256(path: str) -> bytes:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.digest()
+
+
+def store_version(record_count: int, source_sha256: bytes) -> str:
+    return f"{record_count}-{source_sha256.hex()[:12]}"
+
+
+def slot_count(n_keys: int) -> int:
+    """
+    Power of two with a load factor of at most 0.5.
+    """
+    size = 8
+    while size < 2 * n_keys:
+        size *= 2
+    return size
+
+
+class SortedKeyTable:
+    """
+    Read-only mapping str -> int over a sorted, mmap-backed key table.
+    Lookups go through the crc32 slot table; iteration is in sorted order.
+    """
+
+    def __init__(self, buffer, offsets, blob_start: int, values, slots):
+        self._buffer = buffer
+        self._offsets = offsets
+        self._blob_start = blob_start
+        self._values = values
+        self._slots = slots
+        self._mask = len(slots) - 1
+
+    def _key_bytes(self, i: int) -> bytes:
+        start = self._blob_start + self._offsets[i]
+        end = self._blob_start + self._offsets[i + 1]
+        return self._buffer[start:end]
+
+    def _find(self, key) -> int:
+        if not isinstance(key, str):
+            return -1
+        target = key.encode("utf-8")
+        slots, mask = self._slots, self._mask
+        slot = zlib.crc32(target) & mask
+        while True:
+            i = slots[slot] - 1
+            if i < 0:
+                return -1
+            if self._key_bytes(i) == target:
+                return i
+            slot = (slot + 1) & mask
+
+    def get(self, key, default=None):
+        i = self._find(key)
+        if i < 0:
+            return default
+        return self._values[i]
+
+    def __getitem__(self, key):
+        i = self._find(key)
+        if i < 0:
+            raise KeyError(key)
+        return self._values[i]
+
+    def __contains__(self, key) -> bool:
+        return self._find(key) >= 0
+
+    def keys(self):
+        return iter(self)
+
+    def __iter__(self):
+        for i in range(len(self._values)):
+            yield self._key_bytes(i).decode("utf-8")
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+
+class MappedDrugStore(DrugStore):
+    """
+    DrugStore whose tables and record blob live in a read-only mmap.
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        header = read_header(self._mmap)
+        if header is None:
+            self._mmap.close()
+            raise ValueError(f"'{path}' is not a drug index artifact of format {FORMAT_VERSION}")
+
+        view = memoryview(self._mmap)
+        n_keys, n_records, n_ndcs = header["n_keys"], header["n_records"], header["n_ndcs"]
+        (key_offsets, key_blob, key_values, key_slots, record_offsets,
+         record_blob, ndc_offsets, ndc_blob, ndc_values, ndc_slots) = header["sections"]
+
+        def table(offset, count, fmt="Q"):
+            return view[offset:offset + struct.calcsize(fmt) * count].cast(fmt)
+
+        names = SortedKeyTable(
+            self._mmap, table(key_offsets, n_keys + 1), key_blob,
+            table(key_values, n_keys), table(key_slots, slot_count(n_keys), "I")
+        )
+        ndcs = SortedKeyTable(
+            self._mmap, table(ndc_offsets, n_ndcs + 1), ndc_blob,
+            table(ndc_values, n_ndcs), table(ndc_slots, slot_count(n_ndcs), "I")
+        )
+        super().__init__(
+            names, ndcs, self._mmap, table(record_offsets, n_records + 1),
+            store_version(n_records, header["source_sha256"])
+        )
+        self._record_blob_start = record_blob
+        self.path = path
+        self.source_sha256 = header["source_sha256"]
+
+    def record_bytes(self, record_id: int) -> bytes:
+        start = self._record_blob_start + self.offsets[record_id]
+        end = self._record_blob_start + self.offsets[record_id + 1]
+        return self.blob[start:end]
+
+
+def read_header(buffer):
+    if len(buffer) < HEADER.size:
+        return None
+    fields = HEADER.unpack_from(buffer, 0)
+    if fields[0] != MAGIC or fields[1] != FORMAT_VERSION:
+        return None
+    return {
+        "source_size": fields[2],
+        "source_mtime_ns": fields[3],
+        "source_sha256": fields[4],
+        "n_keys": fields[5],
+        "n_records": fields[6],
+        "n_ndcs": fields[7],
+        "sections": fields[8:],
+    }
+
+
+def _pad(f):
+    remainder = f.tell() % 8
+    if remainder:
+        f.write(b"\0" * (8 - remainder))
+
+
+def _write_key_section(f, mapping):
+    """
+    Writes sorted keys, their values and the hash slots;
+    returns (offsets_pos, blob_pos, values_pos, slots_pos).
+    """
+    encoded = sorted((key.encode("utf-8"), value) for key, value in mapping.items())
+    offsets = array("Q", [0])
+    total = 0
+    for key, _ in encoded:
+        total += len(key)
+        offsets.append(total)
+
+    _pad(f)
+    offsets_pos = f.tell()
+    f.write(offsets.tobytes())
+    blob_pos = f.tell()
+    for key, _ in encoded:
+        f.write(key)
+    _pad(f)
+    values_pos = f.tell()
+    f.write(array("Q", [value for _, value in encoded]).tobytes())
+
+    # Slots hold index + 1 so that 0 marks an empty slot
+    slots = array("I", [0]) * slot_count(len(encoded))
+    mask = len(slots) - 1
+    for i, (key, _) in enumerate(encoded):
+        slot = zlib.crc32(key) & mask
+        while slots[slot]:
+            slot = (slot + 1) & mask
+        slots[slot] = i + 1
+    _pad(f)
+    slots_pos = f.tell()
+    f.write(slots.tobytes())
+    return offsets_pos, blob_pos, values_pos, slots_pos
+
+
+def write_artifact(store: DrugStore, output_path: str, source_path: str, source_sha256: bytes = None):
+    """
+    Serializes an in-memory DrugStore. The file is written next to the target
+    and atomically renamed, so readers never see a partial artifact.
+    """
+    stat = os.stat(source_path)
+    source_sha256 = source_sha256 or file_sha256(source_path)
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+
+    with open(tmp_path, "wb") as f:
+        f.write(b"\0" * HEADER.size)
+        key_offsets, key_blob, key_values, key_slots = _write_key_section(f, store.names)
+
+        _pad(f)
+        record_offsets = f.tell()
+        f.write(array("Q", store.offsets).tobytes())
+        record_blob = f.tell()
+        f.write(store.blob[:store.offsets[-1]])
+
+        ndc_offsets, ndc_blob, ndc_values, ndc_slots = _write_key_section(f, store.ndcs)
+
+        f.seek(0)
+        f.write(HEADER.pack(
+            MAGIC, FORMAT_VERSION, stat.st_size, stat.st_mtime_ns, source_sha256,
+            len(store.names), store.record_count, len(store.ndcs),
+            key_offsets, key_blob, key_values, key_slots, record_offsets,
+            record_blob, ndc_offsets, ndc_blob, ndc_values, ndc_slots
+        ))
+    os.replace(tmp_path, output_path)
+
+
+def artifact_status(artifact_path: str, source_path: str) -> str:
+    """
+    Returns "fresh", "stale" or "missing". Size and mtime are checked first;
+    the source checksum is only computed when they differ, and when it still
+    matches the header takes the new mtime so the next start skips it.
+    """
+    if not os.path.exists(artifact_path):
+        return "missing"
+    with open(artifact_path, "rb") as f:
+        header = read_header(f.read(HEADER.size))
+    if header is None:
+        return "stale"
+    if not os.path.exists(source_path):
+        # Nothing to compare against; the artifact is the only copy of the data
+        return "fresh"
+
+    stat = os.stat(source_path)
+    if stat.st_size == header["source_size"] and stat.st_mtime_ns == header["source_mtime_ns"]:
+        return "fresh"
+    if stat.st_size == header["source_size"] and file_sha256(source_path) == header["source_sha256"]:
+        _update_source_stat(artifact_path, stat)
+        return "fresh"
+    return "stale"
+
+
+def _update_source_stat(artifact_path: str, stat):
+    """
+    Records the source's current size and mtime in place; mapped readers
+    never look at these fields after opening.
+    """
+    try:
+        with open(artifact_path, "r+b") as f:
+            f.seek(SOURCE_STAT_OFFSET)
+            f.write(SOURCE_STAT.pack(stat.st_size, stat.st_mtime_ns))
+    except OSError as e:
+        log.warning("Could not update the source mtime in %s: %s", artifact_path, e)
+
+
+def build_artifact(source_path: str, output_path: str):
+    """
+    Compiles the FDA JSON into an artifact and returns the in-memory store.
+    """
+    from utils.drug_lookup_dict import build_store_from_json
+
+    store, source_sha256 = build_store_from_json(source_path)
+    write_artifact(store, output_path, source_path, source_sha256=source_sha256)
+    return store
+
+
+def load_or_build_artifact(source_path: str, artifact_path: str, autobuild: bool = True):
+    """
+    Returns a mmap-backed store, rebuilding a stale or missing artifact first.
+    A file lock makes concurrent workers wait for a single rebuild.
+    Returns None when no artifact can be used, so the caller falls back to JSON.
+    """
+    status = artifact_status(artifact_path, source_path)
+    if status != "fresh":
+        if not autobuild or not os.path.exists(source_path):
+            log.warning("Drug index artifact is %s and cannot be rebuilt", status)
+            return None
+        try:
+            with open(f"{artifact_path}.lock", "w") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                # Another worker may have rebuilt it while we waited
+                if artifact_status(artifact_path, source_path) != "fresh":
+                    log.info("Drug index artifact is %s, rebuilding %s", status, artifact_path)
+                    build_artifact(source_path, artifact_path)
+        except OSError as e:
+            log.warning("Could not rebuild drug index artifact: %s", e)
+            return None
+
+    try:
+        return MappedDrugStore(artifact_path)
+    except (OSError, ValueError) as e:
+        log.warning("Could not load drug index artifact: %s", e)
+        return None
+
+
+def main():
+    from utils.drug_lookup_dict import FDA_DATA_PATH, DRUG_INDEX_ARTIFACT
+
+    parser = argparse.ArgumentParser(description="Compile the FDA NDC JSON into a binary drug index artifact")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="build the artifact")
+    build.add_argument("--source", default=FDA_DATA_PATH)
+    build.add_argument("--output", default=DRUG_INDEX_ARTIFACT)
+    status = sub.add_parser("status", help="check whether the artifact matches the source")
+    status.add_argument("--source", default=FDA_DATA_PATH)
+    status.add_argument("--output", default=DRUG_INDEX_ARTIFACT)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        start = time.perf_counter()
+        store = build_artifact(args.source, args.output)
+        print(
+            f"Wrote {args.output}: {len(store.names)} keys, {store.record_count} records, "
+            f"{len(store.ndcs)} NDCs, version {store.version} in {time.perf_counter() - start:.2f}s"
+        )
+    else:
+        print(artifact_status(args.output, args.source))
+
+
+if __name__ == "__main__":
+    main()
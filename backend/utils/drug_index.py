@@ -0,0 +1,190 @@
+import json
+import sys
+import zlib
+from array import array
+from functools import lru_cache
+
+
+def _encode_record(record: dict) -> bytes:
+    return json.dumps(record, separators=(",", ":")).encode("utf-8")
+
+
+def _decode_record(data: bytes) -> dict:
+    return json.loads(data)
+
+
+def record_names(record: dict):
+    """
+    Yields the (upper-cased name key, is_ingredient) pairs an FDA record is indexed under.
+    """
+    # Brand name
+    brand = record.get("brand_name")
+    if brand:
+        yield brand.upper(), False
+
+    # Generic name
+    generic = record.get("generic_name")
+    if generic:
+        yield generic.upper(), False
+
+    # Active ingredients
+    for ing in record.get("active_ingredients", []):
+        ing_name = ing.get("name")
+        if ing_name:
+            yield ing_name.upper(), True
+
+
+class DrugStore:
+    """
+    Immutable snapshot of the drug index.
+
+    Name keys are interned strings mapped to a packed integer
+    (record_id << 1 | is_ingredient). Records live once each in a single
+    byte blob of minified JSON, addressed by an offset table, and are only
+    decoded when a lookup needs them.
+    """
+
+    def __init__(self, names: dict, ndcs: dict, blob: bytes, offsets: array, version: str):
+        self.names = names
+        self.ndcs = ndcs
+        self.blob = blob
+        self.offsets = offsets
+        self.version = version
+
+    @property
+    def record_count(self) -> int:
+        return len(self.offsets) - 1
+
+    def record_bytes(self, record_id: int) -> bytes:
+        return self.blob[self.offsets[record_id]:self.offsets[record_id + 1]]
+
+
+class DrugStoreBuilder:
+    """
+    Accumulates FDA records one at a time into a DrugStore.
+    Later records win for duplicated names, as in the original dict build.
+    """
+
+    def __init__(self):
+        self.names = {}
+        self.ndcs = {}
+        self.blob = bytearray()
+        self.offsets = array("Q", [0])
+        self.checksum = 0
+
+    def add_record(self, record: dict):
+        record_id = len(self.offsets) - 1
+        data = _encode_record(record)
+        self.blob += data
+        self.offsets.append(len(self.blob))
+        self.checksum = zlib.crc32(data, self.checksum)
+
+        for name, is_ingredient in record_names(record):
+            self.names[sys.intern(name)] = record_id << 1 | is_ingredient
+
+        # ndc_dict
+        product_ndc = record.get("product_ndc")
+        if product_ndc:
+            self.ndcs[sys.intern(product_ndc)] = record_id
+
+    def build(self, version: str = None) -> DrugStore:
+        version = version or f"{len(self.offsets) - 1}-{self.checksum:08x}"
+        return DrugStore(self.names, self.ndcs, bytes(self.blob), self.offsets, version)
+
+
+class DrugIndex:
+    """
+    Read-only mapping view over a DrugStore, shaped like the former DRUG_DICT:
+    DRUG_DICT["CISPLATIN"] -> {"is_ingredient": bool, "record": {...}}.
+
+    The backing store can be swapped in place (load), so modules that imported
+    the object keep seeing the current data.
+    """
+
+    def __init__(self, store: DrugStore = None):
+        self._store = store or DrugStoreBuilder().build()
+        self._decode = lru_cache(maxsize=2048)(self._decode_uncached)
+
+    def load(self, store: DrugStore):
+        self._store = store
+        self._decode.cache_clear()
+
+    @property
+    def store(self) -> DrugStore:
+        return self._store
+
+    @property
+    def version(self) -> str:
+        return self._store.version
+
+    def _decode_uncached(self, store: DrugStore, record_id: int) -> dict:
+        return _decode_record(store.record_bytes(record_id))
+
+    def record(self, record_id: int) -> dict:
+        return self._decode(self._store, record_id)
+
+    def entry(self, key: str):
+        """
+        Returns (record_id, is_ingredient) without decoding the record, or None.
+        """
+        packed = self._store.names.get(key)
+        if packed is None:
+            return None
+        return packed >> 1, bool(packed & 1)
+
+    def __contains__(self, key) -> bool:
+        return key in self._store.names
+
+    def __getitem__(self, key: str) -> dict:
+        store = self._store
+        packed = store.names[key]
+        return {
+            "is_ingredient": bool(packed & 1),
+            "record": self._decode(store, packed >> 1)
+        }
+
+    def get(self, key: str, default=None):
+        if key not in self._store.names:
+            return default
+        return self[key]
+
+    def keys(self):
+        return self._store.names.keys()
+
+    def __iter__(self):
+        return iter(self._store.names)
+
+    def __len__(self) -> int:
+        return len(self._store.names)
+
+
+class NdcIndex:
+    """
+    Read-only mapping view product_ndc -> FDA record sharing the DrugIndex store.
+    """
+
+    def __init__(self, drug_index: DrugIndex):
+        self._drug_index = drug_index
+
+    def record_id(self, product_ndc: str):
+        return self._drug_index.store.ndcs.get(product_ndc)
+
+    def __contains__(self, product_ndc) -> bool:
+        return product_ndc in self._drug_index.store.ndcs
+
+    def __getitem__(self, product_ndc: str) -> dict:
+        return self._drug_index.record(self._drug_index.store.ndcs[product_ndc])
+
+    def get(self, product_ndc: str, default=None):
+        if product_ndc not in self:
+            return default
+        return self[product_ndc]
+
+    def keys(self):
+        return self._drug_index.store.ndcs.keys()
+
+    def __iter__(self):
+        return iter(self._drug_index.store.ndcs)
+
+    def __len__(self) -> int:
+        return len(self._drug_index.store.ndcs)
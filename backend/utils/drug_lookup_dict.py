@@ -1,24 +1,61 @@
+import hashlib
 import json
+import os
+from utils.drug_index import DrugIndex, DrugStoreBuilder, NdcIndex, record_names
+from utils.drug_artifact import MappedDrugStore, load_or_build_artifact, store_version, write_artifact
+from utils.fda_stream import iter_fda_records
+from utils.logs import get_logger
 
-DRUG_DICT = {}
-NDC_DICT = {}
+FDA_DATA_PATH = "../data/drug-ndc-0001-of-0001.json"
 
+# Prebuilt, mmap-shared binary index (see utils/drug_artifact.py)
+DRUG_INDEX_ARTIFACT = os.getenv("DRUG_INDEX_ARTIFACT", "../data/drug-index.bin")
+DRUG_INDEX_USE_ARTIFACT = os.getenv("DRUG_INDEX_USE_ARTIFACT", "1") == "1"
+DRUG_INDEX_AUTOBUILD = os.getenv("DRUG_INDEX_AUTOBUILD", "1") == "1"
 
-def init_drug_dict():
+# Compact, lazily decoded views. Both keep their identity across reloads,
+# so `from utils.drug_lookup_dict import DRUG_DICT` stays valid.
+DRUG_DICT = DrugIndex()
+NDC_DICT = NdcIndex(DRUG_DICT)
+
+log = get_logger(__name__)
+
+
+def build_store_from_json(path: str = FDA_DATA_PATH):
+    """
+    Streams the FDA JSON record by record into an in-memory DrugStore, so
+    peak memory is the compact store plus one read chunk.
+    Returns (store, sha256 of the source file).
+    """
+    digest = hashlib.sha256()
+    builder = DrugStoreBuilder()
+    with open(path, "rb") as f:
+        for record in iter_fda_records(f, digest=digest):
+            builder.add_record(record)
+    source_sha256 = digest.digest()
+    return builder.build(version=store_version(len(builder.offsets) - 1, source_sha256)), source_sha256
+
+
+def init_drug_dict(path: str = FDA_DATA_PATH, artifact_path: str = DRUG_INDEX_ARTIFACT):
     # for now it look in /data folder
-    global DRUG_DICT, NDC_DICT
-    print("Building drug dictionaries from FDA data...")
-    with open("../data/drug-ndc-0001-of-0001.json", "r") as f:
-        fda_data = json.load(f)
-        build_drug_dict(fda_data)
-    print(f"Loaded {len(DRUG_DICT)} drug/ingredient entries into DRUG_DICT.")
-    print(f"Loaded {len(NDC_DICT)} drug/ingredient entries into NDC_DICT.")
+    store = None
+    if DRUG_INDEX_USE_ARTIFACT:
+        store = load_or_build_artifact(path, artifact_path, autobuild=DRUG_INDEX_AUTOBUILD)
+        if store is not None:
+            log.info("Mapped drug index artifact %s (version %s)", artifact_path, store.version)
+
+    if store is None:
+        log.info("Building drug dictionaries from FDA data")
+        store, _ = build_store_from_json(path)
+
+    DRUG_DICT.load(store)
+    log.info("Loaded %d drug/ingredient entries into DRUG_DICT, %d into NDC_DICT", len(DRUG_DICT), len(NDC_DICT))
 
 
 def build_drug_dict(fda_data: dict):
     """
     Builds a dictionary of drugs and ingredients from FDA dataset.
-    
+
     Structure:
     {
         "MUCINEX CHILDRENS MIGHTY CHEWS COUGH NIGHTTIME": { ... full FDA record ... },
@@ -26,37 +63,98 @@ def build_drug_dict(fda_data: dict):
         "DOXYLAMINE SUCCINATE": { ... FDA record ... },
         ...
     }
+
+    Every FDA record is stored once (minified JSON) and name keys only hold its
+    integer id; records are decoded on lookup.
+    """
+    builder = DrugStoreBuilder()
+    for record in fda_data.get("results", []):
+        builder.add_record(record)
+    DRUG_DICT.load(builder.build())
+
+
+def diff_stores(old, new):
+    """
+    Compares two stores by product_ndc.
+
+    Returns the added / updated / removed NDCs plus the name keys that appear
+    or disappear because of them; names of unchanged records are never touched.
+    Records without a product_ndc cannot be diffed and are only picked up
+    through the names of diffed records.
     """
-    global DRUG_DICT, NDC_DICT
-
-    results = fda_data.get("results", [])
-    for record in results:
-        # Brand name
-        brand = record.get("brand_name")
-        if brand:
-            DRUG_DICT[brand.upper()] = {
-                "is_ingredient": False,
-                "record": record
-            }
-
-        # Generic name
-        generic = record.get("generic_name")
-        if generic:
-            DRUG_DICT[generic.upper()] = {
-                "is_ingredient": False,
-                "record": record
-            }
-
-        # Active ingredients
-        for ing in record.get("active_ingredients", []):
-            ing_name = ing.get("name")
-            if ing_name:
-                DRUG_DICT[ing_name.upper()] = {
-                    "is_ingredient": True,
-                    "record": record
-                }
-
-        # ndc_dict
-        product_ndc = record.get("product_ndc")
-        if product_ndc:
-            NDC_DICT[product_ndc] = record
\ No newline at end of file
+    added, updated, removed = [], [], []
+    touched_names = set()
+
+    for product_ndc in new.ndcs:
+        new_id = new.ndcs[product_ndc]
+        old_id = old.ndcs.get(product_ndc)
+        if old_id is None:
+            added.append(product_ndc)
+        elif old.record_bytes(old_id) == new.record_bytes(new_id):
+            continue
+        else:
+            updated.append(product_ndc)
+            touched_names.update(name for name, _ in record_names(json.loads(old.record_bytes(old_id))))
+        touched_names.update(name for name, _ in record_names(json.loads(new.record_bytes(new_id))))
+
+    for product_ndc in old.ndcs:
+        if product_ndc not in new.ndcs:
+            removed.append(product_ndc)
+            touched_names.update(name for name, _ in record_names(json.loads(old.record_bytes(old.ndcs[product_ndc]))))
+
+    return {
+        "added": added,
+        "updated": updated,
+        "removed": removed,
+        "added_names": sorted(name for name in touched_names if name in new.names and name not in old.names),
+        "removed_names": sorted(name for name in touched_names if name not in new.names and name in old.names),
+    }
+
+
+def reload_drug_dict(path: str = FDA_DATA_PATH, artifact_path: str = DRUG_INDEX_ARTIFACT):
+    """
+    Streams a new FDA dump, diffs it against the loaded index and swaps the
+    index in place without interrupting readers. When artifacts are enabled
+    the artifact is rewritten too, so new workers start from the new dump.
+    Returns the diff (see diff_stores).
+    """
+    old = DRUG_DICT.store
+    new, source_sha256 = build_store_from_json(path)
+    diff = diff_stores(old, new)
+
+    if DRUG_INDEX_USE_ARTIFACT:
+        try:
+            write_artifact(new, artifact_path, path, source_sha256=source_sha256)
+            new = MappedDrugStore(artifact_path)
+        except (OSError, ValueError) as e:
+            log.warning("Could not refresh drug index artifact, keeping the in-memory index: %s", e)
+
+    DRUG_DICT.load(new)
+    log.info(
+        "Reloaded drug index %s -> %s: %d added, %d updated, %d removed NDCs",
+        old.version, new.version, len(diff["added"]), len(diff["updated"]), len(diff["removed"]),
+    )
+    return diff
+
+
+def load_drug_version(version: str, path: str = FDA_DATA_PATH, artifact_path: str = DRUG_INDEX_ARTIFACT):
+    """
+    Loads the index another worker reloaded to: the rewritten artifact when it
+    holds that version, otherwise the FDA JSON. Returns the loaded version.
+    """
+    store = None
+    if DRUG_INDEX_USE_ARTIFACT:
+        try:
+            store = MappedDrugStore(artifact_path)
+        except (OSError, ValueError) as e:
+            log.warning("Could not map drug index artifact: %s", e)
+        if store is not None and store.version != version:
+            log.warning("Drug index artifact is version %s, expected %s; reading the FDA JSON", store.version, version)
+            store = None
+    if store is None:
+        store, _ = build_store_from_json(path)
+
+    old_version = DRUG_DICT.version
+    DRUG_DICT.load(store)
+    log.info("Followed drug index reload %s -> %s", old_version, store.version)
+    return store.version
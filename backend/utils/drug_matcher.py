@@ -0,0 +1,91 @@
+import re
+import threading
+
+from utils.logs import get_logger
+
+log = get_logger(__name__)
+
+# Words are maximal alphanumeric runs (allowing inner apostrophes/dots, e.g. "0.9"),
+# so every match is bounded by non-word characters on both sides
+TOKEN_PATTERN = re.compile(r"[A-Za-z0-9]+(?:['.][A-Za-z0-9]+)*")
+
+# Longest drug name (in words) the matcher looks for
+MAX_NAME_TOKENS = 16
+
+
+class DrugNameMatcher:
+    """
+    Token-trie style multi-pattern matcher over every DRUG_DICT key.
+
+    The compiled table maps the first word of each key to a bitmask of the key
+    lengths (in words) that start with it. Scanning is a single left-to-right
+    pass over the text's words: at each word only the lengths recorded for it
+    are probed against the drug index, and the longest hit wins.
+    """
+
+    def __init__(self, drug_dict):
+        self.drug_dict = drug_dict
+        self.version = None
+        self._first_words = {}
+        self._lock = threading.Lock()
+
+    def compile(self):
+        """
+        (Re)builds the first-word table if the drug index changed since the last build.
+        """
+        with self._lock:
+            if self.version == self.drug_dict.version:
+                return
+            first_words = {}
+            for key in self.drug_dict.keys():
+                words = TOKEN_PATTERN.findall(key)
+                if not words or len(words) > MAX_NAME_TOKENS:
+                    continue
+                first_words[words[0]] = first_words.get(words[0], 0) | (1 << len(words))
+            self._first_words = first_words
+            self.version = self.drug_dict.version
+            log.info("Compiled drug name matcher: %d first words", len(first_words))
+
+    def find(self, text: str):
+        """
+        Returns non-overlapping, leftmost-longest hits as dicts:
+        {"key": DRUG_DICT key, "text": surface text, "start": int, "end": int, "words": int}
+        """
+        self.compile()
+        first_words = self._first_words
+        drug_dict = self.drug_dict
+
+        words = list(TOKEN_PATTERN.finditer(text))
+        hits = []
+        i = 0
+        while i < len(words):
+            mask = first_words.get(words[i].group().upper())
+            if not mask:
+                i += 1
+                continue
+
+            hit = None
+            for length in range(min(mask.bit_length() - 1, len(words) - i), 0, -1):
+                if not mask & (1 << length):
+                    continue
+                start, end = words[i].start(), words[i + length - 1].end()
+                surface = text[start:end]
+                key = " ".join(surface.split()).upper()
+                if key in drug_dict:
+                    hit = {"key": key, "text": surface, "start": start, "end": end, "words": length}
+                    break
+
+            if hit is None:
+                i += 1
+            else:
+                hits.append(hit)
+                i += hit["words"]
+        return hits
+
+
+def find_offsets(text: str, name: str):
+    """
+    Returns [[start, end], ...] of case-insensitive, word-bounded occurrences of name.
+    """
+    pattern = r"(?<![A-Za-z0-9])" + r"\s+".join(re.escape(part) for part in name.split()) + r"(?![A-Za-z0-9])"
+    return [[m.start(), m.end()] for m in re.finditer(pattern, text, re.IGNORECASE)]
@@ -0,0 +1,276 @@
+"""
+Pluggable CPU inference backends for SapBERT query embeddings.
+
+    sentence-transformers  fp32 PyTorch (reference)
+    onnx                   ONNX Runtime export of the same model
+    onnx-int8              dynamically int8-quantized ONNX export
+
+Selected with EMBEDDING_BACKEND. The ONNX variants are exported offline and
+checked against the reference on the fda_drugs collection (run from backend/):
+
+    python -m utils.embedding_backends export
+    python -m utils.embedding_backends validate --terms 1000 --threshold 0.97
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+import numpy as np
+
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "sentence-transformers")
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "../models/sapbert-onnx")
+# ONNX Runtime intra-op threads (0 lets the runtime decide)
+ONNX_THREADS = int(os.getenv("ONNX_THREADS", "0"))
+
+BACKENDS = ("sentence-transformers", "onnx", "onnx-int8")
+ONNX_FILES = {"onnx": "model.onnx", "onnx-int8": "model.int8.onnx"}
+METADATA_FILE = "export.json"
+
+
+class SentenceTransformerBackend:
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name)
+        self.backend_name = model_name
+
+    def encode(self, sentences, batch_size: int = 32, **kwargs):
+        return self.model.encode(list(sentences), batch_size=batch_size, convert_to_numpy=True, **kwargs)
+
+
+class OnnxBackend:
+    """
+    Runs the exported transformer in ONNX Runtime and reproduces the
+    SentenceTransformer pooling (and normalization, if any) recorded at export.
+    """
+
+    def __init__(self, model_dir: str, variant: str = "onnx"):
+        import onnxruntime
+        from transformers import AutoTokenizer
+
+        with open(os.path.join(model_dir, METADATA_FILE), encoding="utf-8") as f:
+            self.metadata = json.load(f)
+        self.pooling = self.metadata["pooling"]
+        self.normalize = self.metadata["normalize"]
+        self.max_seq_length = self.metadata["max_seq_length"]
+        self.input_names = self.metadata["inputs"]
+        self.backend_name = f"{self.metadata['model']}+{variant}"
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if ONNX_THREADS:
+            options.intra_op_num_threads = ONNX_THREADS
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(model_dir, ONNX_FILES[variant]), options, providers=["CPUExecutionProvider"]
+        )
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+
+    def _pool(self, hidden, attention_mask):
+        if self.pooling == "cls":
+            return hidden[:, 0]
+        mask = attention_mask[..., None].astype(np.float32)
+        if self.pooling == "max":
+            return np.where(mask > 0, hidden, -1e9).max(axis=1)
+        return (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+    def encode(self, sentences, batch_size: int = 32, **kwargs):
+        sentences = list(sentences)
+        outputs = []
+        for i in range(0, len(sentences), batch_size):
+            encoded = self.tokenizer(
+                sentences[i:i + batch_size], padding=True, truncation=True,
+                max_length=self.max_seq_length, return_tensors="np"
+            )
+            feeds = {name: encoded[name].astype(np.int64) for name in self.input_names}
+            hidden = self.session.run(["last_hidden_state"], feeds)[0]
+            pooled = self._pool(hidden, encoded["attention_mask"])
+            if self.normalize:
+                pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            outputs.append(pooled.astype(np.float32))
+        if not outputs:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.concatenate(outputs)
+
+
+def load_embedding_backend(backend: str = EMBEDDING_BACKEND, model_dir: str = ONNX_MODEL_DIR):
+    from utils.vectorstore_handler import EMBEDDING_MODEL_NAME
+
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown EMBEDDING_BACKEND '{backend}', expected one of {', '.join(BACKENDS)}")
+    if backend == "sentence-transformers":
+        return SentenceTransformerBackend(EMBEDDING_MODEL_NAME)
+    if not os.path.exists(os.path.join(model_dir, ONNX_FILES[backend])):
+        raise ValueError(
+            f"{backend} model not found in {model_dir}; run: python -m utils.embedding_backends export"
+        )
+    return OnnxBackend(model_dir, backend)
+
+
+def export_onnx(model_dir: str = ONNX_MODEL_DIR, opset: int = 17, quantize: bool = True):
+    """
+    Exports the SapBERT transformer to ONNX (and an int8 copy) together with
+    its tokenizer and the pooling settings of the SentenceTransformer model.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from utils.vectorstore_handler import EMBEDDING_MODEL_NAME
+
+    model = SentenceTransformer(EMBEDDING_MODEL_NAME, device="cpu")
+    transformer = model[0].auto_model.eval()
+    pooling = next((module for module in model if type(module).__name__ == "Pooling"), None)
+    metadata = {
+        "model": EMBEDDING_MODEL_NAME,
+        "pooling": pooling.get_pooling_mode_str() if pooling is not None else "mean",
+        "normalize": any(type(module).__name__ == "Normalize" for module in model),
+        "max_seq_length": model.max_seq_length,
+        "opset": opset,
+    }
+    if metadata["pooling"] not in ("mean", "cls", "max"):
+        raise ValueError(f"Unsupported pooling mode {metadata['pooling']}")
+
+    os.makedirs(model_dir, exist_ok=True)
+    sample = model.tokenizer(["aspirin", "cisplatin injection"], padding=True, return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    metadata["inputs"] = input_names
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    fp32_path = os.path.join(model_dir, ONNX_FILES["onnx"])
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            tuple(sample[name] for name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+            do_constant_folding=True,
+        )
+    print(f"Exported {fp32_path}")
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        int8_path = os.path.join(model_dir, ONNX_FILES["onnx-int8"])
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+        print(f"Quantized {int8_path}")
+
+    model.tokenizer.save_pretrained(model_dir)
+    with open(os.path.join(model_dir, METADATA_FILE), "w", encoding="utf-8") as f:
+        json.dump(metadata, f, indent=2)
+
+
+def sample_terms(collection, count: int, seed: int = 0):
+    """
+    Drug names from the collection plus lightly corrupted copies, so the check
+    also covers queries that are not exact index entries.
+    """
+    rng = random.Random(seed)
+    total = collection.count()
+    documents = collection.get(
+        limit=count, offset=rng.randrange(max(1, total - count)), include=["documents"]
+    )["documents"]
+    terms = []
+    for document in documents:
+        if rng.random() < 0.5 or len(document) < 6:
+            terms.append(document.lower())
+        else:
+            i = rng.randrange(1, len(document) - 1)
+            terms.append(document[:i] + document[i + 1:])
+    return terms
+
+
+def neighbours(collection, embeddings, k: int):
+    result = collection.query(query_embeddings=np.asarray(embeddings).tolist(), n_results=k)
+    return result["ids"], result["distances"]
+
+
+def time_backend(backend, terms, batch_size: int = 64, single: int = 100):
+    start = time.perf_counter()
+    backend.encode(terms, batch_size=batch_size)
+    throughput = len(terms) / (time.perf_counter() - start)
+    latencies = []
+    for term in terms[:single]:
+        start = time.perf_counter()
+        backend.encode([term])
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return throughput, statistics.median(latencies), latencies[max(0, int(len(latencies) * 0.95) - 1)]
+
+
+def validate(backends, count: int, k: int, threshold: float, model_dir: str = ONNX_MODEL_DIR) -> bool:
+    """
+    Compares each backend's nearest neighbours on fda_drugs with the fp32
+    reference and times every backend. Returns False if any backend's top-1
+    agreement is below threshold.
+    """
+    import chromadb
+    from services.pdf_parser import MAX_VECTOR_DISTANCE
+    from utils.resources import CHROMA_PERSIST_DIR
+    from utils.vectorstore_handler import COLLECTION_NAME
+
+    collection = chromadb.PersistentClient(path=CHROMA_PERSIST_DIR).get_collection(COLLECTION_NAME)
+    terms = sample_terms(collection, count)
+    reference = load_embedding_backend("sentence-transformers")
+    reference_embeddings = reference.encode(terms)
+    reference_ids, reference_distances = neighbours(collection, reference_embeddings, k)
+
+    throughput, p50, p95 = time_backend(reference, terms)
+    print(f"{'backend':<22}{'top1':>7}{'top-k':>7}{'accept':>8}{'cosine':>8}{'terms/s':>9}{'p50 ms':>8}{'p95 ms':>8}")
+    print(f"{'sentence-transformers':<22}{1:>7.3f}{1:>7.3f}{1:>8.3f}{1:>8.3f}{throughput:>9.1f}{p50 * 1e3:>8.2f}{p95 * 1e3:>8.2f}")
+
+    passed = True
+    for name in backends:
+        backend = load_embedding_backend(name, model_dir)
+        embeddings = backend.encode(terms)
+        ids, distances = neighbours(collection, embeddings, k)
+
+        top1 = np.mean([a[:1] == b[:1] for a, b in zip(ids, reference_ids)])
+        top_k = np.mean([len(set(a) & set(b)) / k for a, b in zip(ids, reference_ids)])
+        # Same accept / reject decision at the pipeline's distance threshold
+        accept = np.mean([
+            (a[0] <= MAX_VECTOR_DISTANCE) == (b[0] <= MAX_VECTOR_DISTANCE)
+            for a, b in zip(distances, reference_distances)
+        ])
+        cosine = np.mean(np.sum(embeddings * reference_embeddings, axis=1) / (
+            np.linalg.norm(embeddings, axis=1) * np.linalg.norm(reference_embeddings, axis=1)
+        ))
+        throughput, p50, p95 = time_backend(backend, terms)
+        print(f"{name:<22}{top1:>7.3f}{top_k:>7.3f}{accept:>8.3f}{cosine:>8.4f}{throughput:>9.1f}{p50 * 1e3:>8.2f}{p95 * 1e3:>8.2f}")
+        if top1 < threshold:
+            print(f"  {name}: top-1 agreement {top1:.3f} is below {threshold}")
+            passed = False
+    return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export and validate ONNX SapBERT embedding backends")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="export the ONNX and int8 models")
+    export.add_argument("--output", default=ONNX_MODEL_DIR)
+    export.add_argument("--opset", type=int, default=17)
+    export.add_argument("--no-quantize", action="store_true")
+    check = sub.add_parser("validate", help="compare neighbours with fp32 and benchmark the backends")
+    check.add_argument("--model-dir", default=ONNX_MODEL_DIR)
+    check.add_argument("--backends", default="onnx,onnx-int8")
+    check.add_argument("--terms", type=int, default=1000)
+    check.add_argument("--k", type=int, default=5)
+    check.add_argument("--threshold", type=float, default=0.97, help="minimum top-1 agreement with fp32")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        start = time.perf_counter()
+        export_onnx(args.output, opset=args.opset, quantize=not args.no_quantize)
+        print(f"Export finished in {time.perf_counter() - start:.1f}s")
+    else:
+        passed = validate(args.backends.split(","), args.terms, args.k, args.threshold, args.model_dir)
+        sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+
+def normalize_term(term: str) -> str:
+    """
+    Cache key for a query term. SapBERT uses an uncased vocabulary, so
+    lower-casing and collapsing whitespace does not change the embedding.
+    """
+    return " ".join(term.split()).lower()
+
+
+class LRUCache:
+    """
+    Small size-bounded in-process LRU.
+    """
+
+    def __init__(self, max_items: int):
+        self.max_items = max_items
+        self._items = OrderedDict()
+
+    def get(self, key):
+        value = self._items.get(key)
+        if value is not None:
+            self._items.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self._items[key] = value
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_items:
+            self._items.popitem(last=False)
+
+    def clear(self):
+        self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+
+class EmbeddingCache:
+    """
+    Two-level cache for query embeddings and nearest-neighbour results.
+
+    Level 1 is an in-process LRU, level 2 is a SQLite file that survives
+    restarts. Embeddings are keyed by (model, normalized term); neighbour
+    results are additionally keyed by the collection fingerprint and
+    n_results, so they are dropped when the collection or model changes.
+    """
+
+    def __init__(self, path: str, max_memory_items: int = 10000):
+        self.path = path
+        self.model_name = None
+        self.fingerprint = None
+        self._lock = threading.Lock()
+        self._embeddings = LRUCache(max_memory_items)
+        self._neighbors = LRUCache(max_memory_items)
+        self._encode_seconds_per_term = 0.0
+        self.counters = {
+            "embedding_memory_hits": 0,
+            "embedding_disk_hits": 0,
+            "embedding_misses": 0,
+            "neighbor_memory_hits": 0,
+            "neighbor_disk_hits": 0,
+            "neighbor_misses": 0,
+        }
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Shared by every worker process: WAL lets readers run beside a writer,
+        # and writers wait for each other instead of failing with "database is locked"
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.executescript("""
+            PRAGMA journal_mode = WAL;
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                term TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                PRIMARY KEY (model, term)
+            );
+            CREATE TABLE IF NOT EXISTS neighbors (
+                fingerprint TEXT NOT NULL,
+                n_results INTEGER NOT NULL,
+                term TEXT NOT NULL,
+                result TEXT NOT NULL,
+                PRIMARY KEY (fingerprint, n_results, term)
+            );
+        """)
+        self._db.commit()
+
+    def bind(self, model_name: str, fingerprint: str):
+        """
+        Attaches the cache to a model and collection. Entries written for any
+        other model or collection state are invalidated.
+        """
+        with self._lock:
+            if self.model_name == model_name and self.fingerprint == fingerprint:
+                return
+            self.model_name = model_name
+            self.fingerprint = fingerprint
+            self._embeddings.clear()
+            self._neighbors.clear()
+            self._db.execute("DELETE FROM embeddings WHERE model != ?", (model_name,))
+            self._db.execute("DELETE FROM neighbors WHERE fingerprint != ?", (fingerprint,))
+            self._db.commit()
+
+    def invalidate_neighbors(self, fingerprint: str):
+        """
+        Moves to a new collection fingerprint, e.g. after the collection was
+        updated, dropping neighbour results stored under any other one. Rows
+        another worker already wrote for the new fingerprint are kept.
+        """
+        with self._lock:
+            self.fingerprint = fingerprint
+            self._neighbors.clear()
+            self._db.execute("DELETE FROM neighbors WHERE fingerprint != ?", (fingerprint,))
+            self._db.commit()
+
+    def get_embeddings(self, terms):
+        """
+        Returns {term: vector} for the normalized terms found in either level.
+        """
+        found = {}
+        with self._lock:
+            missing = []
+            for term in terms:
+                vector = self._embeddings.get(term)
+                if vector is not None:
+                    found[term] = vector
+                    self.counters["embedding_memory_hits"] += 1
+                else:
+                    missing.append(term)
+
+            for term in missing:
+                row = self._db.execute(
+                    "SELECT vector FROM embeddings WHERE model = ? AND term = ?",
+                    (self.model_name, term)
+                ).fetchone()
+                if row is None:
+                    self.counters["embedding_misses"] += 1
+                    continue
+                vector = array("f", row[0]).tolist()
+                self._embeddings.put(term, vector)
+                found[term] = vector
+                self.counters["embedding_disk_hits"] += 1
+        return found
+
+    def put_embeddings(self, vectors: dict, encode_seconds: float = None):
+        with self._lock:
+            for term, vector in vectors.items():
+                self._embeddings.put(term, vector)
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, term, vector) VALUES (?, ?, ?)",
+                [(self.model_name, term, array("f", vector).tobytes()) for term, vector in vectors.items()]
+            )
+            self._db.commit()
+            if encode_seconds is not None and vectors:
+                self._encode_seconds_per_term = encode_seconds / len(vectors)
+
+    def get_neighbors(self, terms, n_results: int):
+        """
+        Returns {term: single-query result} for the normalized terms found in either level.
+        """
+        found = {}
+        with self._lock:
+            for term in terms:
+                result = self._neighbors.get((n_results, term))
+                if result is not None:
+                    found[term] = result
+                    self.counters["neighbor_memory_hits"] += 1
+                    continue
+
+                row = self._db.execute(
+                    "SELECT result FROM neighbors WHERE fingerprint = ? AND n_results = ? AND term = ?",
+                    (self.fingerprint, n_results, term)
+                ).fetchone()
+                if row is None:
+                    self.counters["neighbor_misses"] += 1
+                    continue
+                result = json.loads(row[0])
+                self._neighbors.put((n_results, term), result)
+                found[term] = result
+                self.counters["neighbor_disk_hits"] += 1
+        return found
+
+    def put_neighbors(self, results: dict, n_results: int):
+        with self._lock:
+            for term, result in results.items():
+                self._neighbors.put((n_results, term), result)
+            self._db.executemany(
+                "INSERT OR REPLACE INTO neighbors (fingerprint, n_results, term, result) VALUES (?, ?, ?, ?)",
+                [(self.fingerprint, n_results, term, json.dumps(result)) for term, result in results.items()]
+            )
+            self._db.commit()
+
+    def stats(self):
+        """
+        Hit/miss counters plus an estimate of the encode time saved.
+        """
+        counters = dict(self.counters)
+        embedding_hits = counters["embedding_memory_hits"] + counters["embedding_disk_hits"]
+        neighbor_hits = counters["neighbor_memory_hits"] + counters["neighbor_disk_hits"]
+        # A neighbour hit skips the encode as well as the collection query
+        counters["estimated_encode_seconds_saved"] = round(
+            (embedding_hits + neighbor_hits) * self._encode_seconds_per_term, 4
+        )
+        counters["memory_embeddings"] = len(self._embeddings)
+        counters["memory_neighbors"] = len(self._neighbors)
+        counters["model"] = self.model_name
+        counters["fingerprint"] = self.fingerprint
+        return counters
+
+
+_CACHES = {}
+_CACHES_LOCK = threading.Lock()
+
+
+def get_embedding_cache(path: str, max_memory_items: int = 10000) -> EmbeddingCache:
+    """
+    Returns the process-wide cache for a given file, so every ChromaManager
+    instance shares the same entries and counters.
+    """
+    with _CACHES_LOCK:
+        cache = _CACHES.get(path)
+        if cache is None:
+            cache = EmbeddingCache(path, max_memory_items=max_memory_items)
+            _CACHES[path] = cache
+        return cache
+
+
+def timed_encode(encode, terms):
+    """
+    Runs an encode call and returns (vectors as lists, elapsed seconds).
+    """
+    start = time.perf_counter()
+    vectors = encode(terms).tolist()
+    return vectors, time.perf_counter() - start
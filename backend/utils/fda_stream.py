@@ -0,0 +1,107 @@
+import codecs
+import json
+
+_DECODER = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+
+
+class _StreamReader:
+    """
+    Incremental text buffer over a binary file. Only the unconsumed tail of
+    the current chunk is kept, so memory stays bounded by the largest record.
+    """
+
+    def __init__(self, f, chunk_size: int, digest=None):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.digest = digest
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        """
+        Reads the next chunk; returns False at end of file.
+        """
+        if self.eof:
+            return False
+        data = self.f.read(self.chunk_size)
+        if self.digest is not None:
+            self.digest.update(data)
+        if not data:
+            self.eof = True
+            self.buffer = self.buffer[self.pos:] + self.decoder.decode(b"", final=True)
+        else:
+            self.buffer = self.buffer[self.pos:] + self.decoder.decode(data)
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """
+        Returns the next non-whitespace character without consuming it ("" at EOF).
+        """
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(f"Malformed FDA data: expected '{char}' at offset {self.pos}")
+        self.pos += 1
+
+    def decode(self):
+        """
+        Decodes the next JSON value, reading more data while it is incomplete.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+            # A bare number may continue in the next chunk
+            if end == len(self.buffer) and not self.eof:
+                self.fill()
+                continue
+            self.pos = end
+            return value
+
+
+def iter_fda_records(f, chunk_size: int = 1 << 20, digest=None):
+    """
+    Streams the records of the top-level "results" array from a binary file
+    object, one at a time. Other top-level values (e.g. "meta") are skipped.
+    If a hashlib digest is given it is fed every byte read.
+    """
+    reader = _StreamReader(f, chunk_size, digest)
+    reader.expect("{")
+
+    while reader.peek() != "}":
+        key = reader.decode()
+        reader.expect(":")
+
+        if key != "results":
+            reader.decode()
+        else:
+            reader.expect("[")
+            while reader.peek() != "]":
+                yield reader.decode()
+                if reader.peek() == ",":
+                    reader.pos += 1
+            reader.pos += 1
+
+        if reader.peek() == ",":
+            reader.pos += 1
+
+    # Drain the file so the digest covers every byte
+    if digest is not None:
+        while reader.fill():
+            pass
+
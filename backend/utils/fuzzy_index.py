@@ -0,0 +1,158 @@
+import re
+import threading
+from array import array
+from collections import Counter
+
+from utils.logs import get_logger
+
+log = get_logger(__name__)
+
+_NON_ALNUM = re.compile(r"[^A-Z0-9]+")
+
+
+def normalize_name(name: str) -> str:
+    """
+    Upper-cases and folds punctuation/hyphenation to single spaces,
+    so "Co-Trimoxazole" and "co trimoxazole" compare equal.
+    """
+    return _NON_ALNUM.sub(" ", name.upper()).strip()
+
+
+def _trigrams(norm: str):
+    padded = f"${norm}$"
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+def bounded_levenshtein(a: str, b: str, k: int) -> int:
+    """
+    Edit distance between a and b, or k + 1 as soon as it is known to exceed k.
+    Only the diagonal band of width 2k + 1 is computed.
+    """
+    if abs(len(a) - len(b)) > k:
+        return k + 1
+    if len(a) > len(b):
+        a, b = b, a
+
+    big = k + 1
+    previous = [j if j <= k else big for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        lo, hi = max(1, i - k), min(len(b), i + k)
+        current = [big] * (len(b) + 1)
+        current[0] = i if i <= k else big
+        row_min = current[0]
+        char_a = a[i - 1]
+        for j in range(lo, hi + 1):
+            cost = 0 if char_a == b[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            current[j] = value if value <= k else big
+            if current[j] < row_min:
+                row_min = current[j]
+        if row_min > k:
+            return big
+        previous = current
+    return previous[len(b)]
+
+
+class FuzzyDrugIndex:
+    """
+    Typo-tolerant lexical index over DRUG_DICT keys.
+
+    Normalized keys are indexed by (trigram, position, key length) in compact
+    posting arrays. One edit destroys at most three trigrams, shifts the rest
+    by at most one position and changes the length by at most one, so a key
+    within distance k shows up in the (position ± k, length ± k) window of all
+    but 3k of the query trigrams. A lookup reads the rarest 3k + 1 + extra
+    windows, keeps keys seen in at least extra + 1 of them and verifies those
+    few candidates with a banded Levenshtein.
+    """
+
+    def __init__(self, drug_dict, min_length: int = 5, extra_windows: int = 2):
+        self.drug_dict = drug_dict
+        self.min_length = min_length
+        self.extra_windows = extra_windows
+        self.version = None
+        self._norms = []
+        self._keys = []
+        self._postings = {}
+        self._lock = threading.Lock()
+
+    def compile(self):
+        """
+        (Re)builds the index if the drug index changed since the last build.
+        """
+        with self._lock:
+            if self.version == self.drug_dict.version:
+                return
+            norms, keys, postings, seen = [], [], {}, set()
+            for key in self.drug_dict.keys():
+                norm = normalize_name(key)
+                if len(norm) < self.min_length or norm in seen:
+                    continue
+                seen.add(norm)
+                key_id = len(norms)
+                norms.append(norm)
+                keys.append(key)
+                length = len(norm)
+                for position, gram in enumerate(_trigrams(norm)):
+                    posting = postings.get((gram, position, length))
+                    if posting is None:
+                        posting = postings[(gram, position, length)] = array("I")
+                    posting.append(key_id)
+            self._norms, self._keys, self._postings = norms, keys, postings
+            self.version = self.drug_dict.version
+            log.info("Compiled fuzzy drug index: %d names, %d posting lists", len(norms), len(postings))
+
+    def max_distance(self, norm: str) -> int:
+        return 1 if len(norm) < 10 else 2
+
+    def lookup(self, term: str, max_distance: int = None):
+        """
+        Returns (DRUG_DICT key, edit distance) of the closest name within the
+        allowed distance, or None. Ties go to the shorter key.
+        """
+        self.compile()
+        norm = normalize_name(term)
+        if len(norm) < self.min_length:
+            return None
+        k = self.max_distance(norm) if max_distance is None else max_distance
+
+        # Posting lists each query trigram may have moved into
+        postings = self._postings
+        lengths = range(len(norm) - k, len(norm) + k + 1)
+        windows = []
+        for position, gram in enumerate(_trigrams(norm)):
+            lists = []
+            for length in lengths:
+                for shifted in range(max(0, position - k), position + k + 1):
+                    posting = postings.get((gram, shifted, length))
+                    if posting is not None:
+                        lists.append(posting)
+            windows.append((sum(len(posting) for posting in lists), lists))
+
+        # At most 3k windows can miss a matching key, so of the rarest
+        # 3k + 1 + extra windows it must appear in at least extra + 1
+        windows.sort(key=lambda window: window[0])
+        selected = windows[:3 * k + 1 + self.extra_windows]
+        required = len(selected) - 3 * k
+        counts = Counter()
+        for _, lists in selected:
+            key_ids = set()
+            for posting in lists:
+                key_ids.update(posting)
+            counts.update(key_ids)
+
+        best = None
+        for key_id, count in counts.items():
+            if count < required:
+                continue
+            candidate = self._norms[key_id]
+            distance = bounded_levenshtein(norm, candidate, k)
+            if distance > k:
+                continue
+            rank = (distance, len(candidate), candidate)
+            if best is None or rank < best[0]:
+                best = (rank, key_id)
+
+        if best is None:
+            return None
+        return self._keys[best[1]], best[0][0]
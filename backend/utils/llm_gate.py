@@ -0,0 +1,370 @@
+"""
+Local classifier that decides the easy (word, sentence) pairs before they
+reach the LLM.
+
+A logistic regression over hashed features scores each pair. The features are
+character 2-4-grams of the word, its shape, the words around it, the sentence
+words and a DRUG_DICT membership flag. Pairs scoring at or below LLM_GATE_LOW
+are decided False locally, pairs at or above LLM_GATE_HIGH True. Only the
+uncertainty band in between still goes to the LLM.
+
+The model is trained offline from the verdicts the LLM already gave (the
+verdict cache) and switched on and off at runtime (POST /admin/llm-gate).
+Run from backend/:
+
+    python -m utils.llm_gate train
+    python -m utils.llm_gate eval --low 0.1 --high 0.9
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+
+import numpy as np
+
+LLM_GATE_ENABLED = os.getenv("LLM_GATE_ENABLED", "0") == "1"
+LLM_GATE_MODEL = os.getenv("LLM_GATE_MODEL", "../models/llm-gate.npz")
+LLM_GATE_LOW = float(os.getenv("LLM_GATE_LOW", "0.1"))
+LLM_GATE_HIGH = float(os.getenv("LLM_GATE_HIGH", "0.9"))
+
+FEATURE_BITS = 18
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:['\-][a-z0-9]+)*")
+# Sentence words used as bag-of-words context
+MAX_CONTEXT_WORDS = 40
+
+
+def word_shape(word: str) -> str:
+    if word.isupper():
+        shape = "upper"
+    elif word.istitle():
+        shape = "title"
+    elif word.islower():
+        shape = "lower"
+    else:
+        shape = "mixed"
+    if any(char.isdigit() for char in word):
+        shape += "+digit"
+    if "-" in word:
+        shape += "+hyphen"
+    return shape
+
+
+def surface_form(word: str, sentence: str) -> str:
+    """
+    The word as written in its sentence (cached verdicts store it lowercased).
+    """
+    index = sentence.lower().find(word.lower())
+    return sentence[index:index + len(word)] if index >= 0 else word
+
+
+def pair_features(word: str, sentence: str, in_dict: bool, bits: int = FEATURE_BITS):
+    """
+    Hashed feature indices of a (word, sentence) pair.
+    """
+    lowered = word.lower()
+    names = [f"shape={word_shape(word)}", f"len={min(len(word), 20) // 3}"]
+    if in_dict:
+        names.append("in_dict")
+    padded = f"<{lowered}>"
+    for n in (2, 3, 4):
+        names.extend(f"c{n}={padded[i:i + n]}" for i in range(len(padded) - n + 1))
+
+    tokens = TOKEN_PATTERN.findall(sentence.lower())
+    first = lowered.split()[0] if lowered.split() else lowered
+    position = tokens.index(first) if first in tokens else -1
+    if position >= 0:
+        for offset in (-2, -1, 1, 2):
+            neighbour = position + offset
+            if 0 <= neighbour < len(tokens):
+                names.append(f"w{offset}={tokens[neighbour]}")
+    else:
+        names.append("not_in_sentence")
+    names.extend(f"s={token}" for token in tokens[:MAX_CONTEXT_WORDS] if token != first)
+
+    mask = (1 << bits) - 1
+    return [zlib.crc32(name.encode("utf-8")) & mask for name in names]
+
+
+def sigmoid(z):
+    return 1.0 / (1.0 + np.exp(-np.clip(z, -30, 30)))
+
+
+class GateModel:
+    def __init__(self, weights, bias: float, metadata: dict):
+        self.weights = weights
+        self.bias = bias
+        self.metadata = metadata
+        self.bits = metadata["bits"]
+
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data["weights"], float(data["bias"]), json.loads(str(data["metadata"])))
+
+    def save(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "wb") as f:
+            np.savez_compressed(f, weights=self.weights, bias=self.bias, metadata=json.dumps(self.metadata))
+
+    @property
+    def version(self) -> str:
+        return hashlib.sha1(self.weights.tobytes() + str(self.bias).encode()).hexdigest()[:12]
+
+    def score(self, word: str, sentence: str, in_dict: bool) -> float:
+        z = self.bias + float(self.weights[pair_features(word, sentence, in_dict, self.bits)].sum())
+        return float(sigmoid(z))
+
+
+def _design(rows):
+    """
+    rows of feature indices -> (flat indices, row offsets) for the vectorized passes.
+    """
+    lengths = np.fromiter((len(row) for row in rows), dtype=np.int64, count=len(rows))
+    indices = np.fromiter((index for row in rows for index in row), dtype=np.int64, count=int(lengths.sum()))
+    offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    return indices, offsets, lengths
+
+
+def _scores(weights, bias, design):
+    indices, offsets, _ = design
+    return sigmoid(np.add.reduceat(weights[indices], offsets) + bias)
+
+
+def train_model(rows, labels, bits: int = FEATURE_BITS, epochs: int = 200, learning_rate: float = 0.5,
+                l2: float = 1e-4, balanced: bool = False) -> GateModel:
+    """
+    Full-batch logistic regression with AdaGrad steps over hashed binary features.
+    """
+    design = _design(rows)
+    indices, _, lengths = design
+    labels = np.asarray(labels, dtype=np.float64)
+    sample_weights = np.ones_like(labels)
+    if balanced and 0 < labels.sum() < len(labels):
+        positive = labels.mean()
+        sample_weights = np.where(labels > 0, 0.5 / positive, 0.5 / (1 - positive))
+
+    weights = np.zeros(1 << bits)
+    bias = 0.0
+    weight_squares, bias_squares = np.full(1 << bits, 1e-8), 1e-8
+    for _ in range(epochs):
+        error = (_scores(weights, bias, design) - labels) * sample_weights / len(labels)
+        gradient = np.bincount(indices, weights=np.repeat(error, lengths), minlength=1 << bits) + l2 * weights
+        bias_gradient = error.sum()
+        weight_squares += gradient ** 2
+        bias_squares += bias_gradient ** 2
+        weights -= learning_rate * gradient / np.sqrt(weight_squares)
+        bias -= learning_rate * bias_gradient / np.sqrt(bias_squares)
+
+    metadata = {"bits": bits, "epochs": epochs, "l2": l2, "examples": len(labels), "created": time.time()}
+    return GateModel(weights.astype(np.float32), bias, metadata)
+
+
+class LlmGate:
+    """
+    Runtime switch around the gate model; loaded lazily on first use.
+    """
+
+    def __init__(self, path: str = LLM_GATE_MODEL, enabled: bool = LLM_GATE_ENABLED,
+                 low: float = LLM_GATE_LOW, high: float = LLM_GATE_HIGH):
+        self.path = path
+        self.enabled = enabled
+        self.low = low
+        self.high = high
+        self.model = None
+        self.error = None
+        self._lock = threading.Lock()
+        self.counters = {"scored": 0, "decided_true": 0, "decided_false": 0, "sent_to_llm": 0}
+
+    def _load(self):
+        with self._lock:
+            if self.model is None:
+                try:
+                    self.model = GateModel.load(self.path)
+                    self.error = None
+                except (OSError, ValueError, KeyError) as e:
+                    self.error = str(e)
+        return self.model
+
+    def configure(self, enabled: bool = None, low: float = None, high: float = None, reload: bool = False):
+        """
+        Changes the gate at runtime. Raises ValueError for a bad band, or when
+        enabling without a loadable model.
+        """
+        low = self.low if low is None else low
+        high = self.high if high is None else high
+        if not 0.0 <= low <= high <= 1.0:
+            raise ValueError("the band needs 0 <= low <= high <= 1")
+        if reload:
+            with self._lock:
+                self.model = None
+        if enabled and self._load() is None:
+            raise ValueError(f"no gate model at {self.path} ({self.error}); run: python -m utils.llm_gate train")
+        self.low, self.high = low, high
+        if enabled is not None:
+            self.enabled = enabled
+        return self.status()
+
+    def fingerprint(self) -> str:
+        """
+        Identifies what the gate decides; part of the /extract result fingerprint.
+        """
+        if not self.enabled or self._load() is None:
+            return "gate-off"
+        return f"gate-{self.model.version}-{self.low}-{self.high}"
+
+    def decide(self, word_to_sentence: dict, drug_dict) -> dict:
+        """
+        Returns {word: verdict} for the pairs scored outside the uncertainty
+        band; the others are left for the LLM.
+        """
+        if not self.enabled or not word_to_sentence or self._load() is None:
+            return {}
+        decided = {}
+        for word, sentence in word_to_sentence.items():
+            probability = self.model.score(word, sentence, word.upper() in drug_dict)
+            if probability >= self.high:
+                decided[word] = True
+            elif probability <= self.low:
+                decided[word] = False
+        true_count = sum(decided.values())
+        self.counters["scored"] += len(word_to_sentence)
+        self.counters["decided_true"] += true_count
+        self.counters["decided_false"] += len(decided) - true_count
+        self.counters["sent_to_llm"] += len(word_to_sentence) - len(decided)
+        return decided
+
+    def status(self) -> dict:
+        model = self._load() if self.enabled else self.model
+        return {
+            "enabled": self.enabled,
+            "low": self.low,
+            "high": self.high,
+            "model_path": self.path,
+            "model": {"version": model.version, **model.metadata} if model is not None else None,
+            "error": self.error,
+            **self.counters,
+        }
+
+
+LLM_GATE = LlmGate()
+
+
+def load_logged_verdicts(path: str, provider: str = None):
+    """
+    (surface word, sentence, verdict) triples from the verdict cache.
+    """
+    db = sqlite3.connect(path)
+    try:
+        query = "SELECT word, context, verdict FROM verdicts"
+        params = ()
+        if provider:
+            query += " WHERE provider = ?"
+            params = (provider,)
+        return [(surface_form(word, context), context, bool(verdict)) for word, context, verdict in db.execute(query, params)]
+    finally:
+        db.close()
+
+
+def split_by_word(examples, test_fraction: float):
+    """
+    Train / test split on the word, so test words are never seen in training.
+    """
+    train, test = [], []
+    for example in examples:
+        bucket = zlib.crc32(example[0].lower().encode("utf-8")) % 1000
+        (test if bucket < test_fraction * 1000 else train).append(example)
+    return train, test
+
+
+def featurize(examples, drug_dict, bits: int = FEATURE_BITS):
+    rows = [pair_features(word, sentence, word.upper() in drug_dict, bits) for word, sentence, _ in examples]
+    return rows, [verdict for _, _, verdict in examples]
+
+
+def evaluate(model: GateModel, rows, labels, low: float, high: float) -> dict:
+    """
+    Agreement with the LLM on the pairs the gate decides, and the share of
+    LLM calls it avoids.
+    """
+    labels = np.asarray(labels, dtype=bool)
+    scores = _scores(model.weights.astype(np.float64), model.bias, _design(rows))
+    decided = (scores <= low) | (scores >= high)
+    local = scores >= high
+    agreement = float((local[decided] == labels[decided]).mean()) if decided.any() else None
+    return {
+        "pairs": int(len(labels)),
+        "avoided_fraction": round(float(decided.mean()), 4),
+        "agreement_on_decided": round(agreement, 4) if agreement is not None else None,
+        "wrong_decisions": int((local[decided] != labels[decided]).sum()),
+        "accuracy_at_0.5": round(float(((scores >= 0.5) == labels).mean()), 4),
+    }
+
+
+def main():
+    from utils.llm_handler import LLM_CACHE_PATH
+    from utils.resources import get_drug_index
+
+    parser = argparse.ArgumentParser(description="Train and evaluate the local LLM gate")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name in ("train", "eval"):
+        command = sub.add_parser(name)
+        command.add_argument("--cache", default=LLM_CACHE_PATH, help="verdict cache SQLite file")
+        command.add_argument("--provider", help="only verdicts of this LLM provider")
+        command.add_argument("--model", default=LLM_GATE_MODEL)
+        command.add_argument("--test-fraction", type=float, default=0.2)
+        command.add_argument("--low", type=float, default=LLM_GATE_LOW)
+        command.add_argument("--high", type=float, default=LLM_GATE_HIGH)
+        if name == "train":
+            command.add_argument("--epochs", type=int, default=200)
+            command.add_argument("--l2", type=float, default=1e-4)
+            command.add_argument("--balanced", action="store_true", help="weight both classes equally")
+    args = parser.parse_args()
+
+    drug_dict = get_drug_index()
+    examples = load_logged_verdicts(args.cache, args.provider)
+    if not examples:
+        raise SystemExit(f"No logged verdicts in {args.cache}")
+    train, test = split_by_word(examples, args.test_fraction)
+    print(f"{len(examples)} logged verdicts: {len(train)} train / {len(test)} test "
+          f"({sum(verdict for *_, verdict in examples)} positive)")
+
+    if args.command == "train":
+        start = time.perf_counter()
+        rows, labels = featurize(train, drug_dict)
+        model = train_model(rows, labels, epochs=args.epochs, l2=args.l2, balanced=args.balanced)
+        model.metadata.update({"source": os.path.abspath(args.cache), "provider": args.provider})
+        print(f"Trained in {time.perf_counter() - start:.1f}s")
+    else:
+        model = GateModel.load(args.model)
+
+    rows, labels = featurize(test or train, drug_dict, model.bits)
+    print(f"{'low':>6}{'high':>6}{'avoided':>9}{'agree':>8}{'wrong':>7}")
+    bands = sorted({(args.low, args.high), (0.05, 0.95), (0.1, 0.9), (0.2, 0.8), (0.3, 0.7)})
+    for low, high in bands:
+        result = evaluate(model, rows, labels, low, high)
+        marker = "  <- selected" if (low, high) == (args.low, args.high) else ""
+        print(f"{low:>6.2f}{high:>6.2f}{result['avoided_fraction']:>9.3f}"
+              f"{result['agreement_on_decided'] or 0:>8.3f}{result['wrong_decisions']:>7}{marker}")
+    print(f"accuracy at 0.5: {result['accuracy_at_0.5']:.3f}")
+
+    sample = test[:1000] or train[:1000]
+    start = time.perf_counter()
+    for word, sentence, _ in sample:
+        model.score(word, sentence, word.upper() in drug_dict)
+    print(f"scoring: {(time.perf_counter() - start) / len(sample) * 1e6:.1f} us per pair")
+
+    if args.command == "train":
+        model.metadata["evaluation"] = evaluate(model, rows, labels, args.low, args.high)
+        model.save(args.model)
+        print(f"Saved {args.model} (version {model.version})")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,59 +1,63 @@
+import asyncio
 import os
+import random
+import threading
+import time
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
 from pydantic import BaseModel, Field
 from typing import Dict
+from utils.drug_lookup_dict import DRUG_DICT
+from utils.llm_gate import LLM_GATE
+from utils.logs import get_logger
+from utils.metrics import count_items, stage_timer
+from utils.verdict_cache import estimate_tokens, get_verdict_cache
 
 load_dotenv()
 
-class PharmaceuticalValidation(BaseModel):
-    results: Dict[str, bool] = Field(description="Dictionary mapping each word to boolean indicating if it's pharmaceutical")
+log = get_logger(__name__)
 
-def llm_validate_pharmaceutical_terms(word_to_sentence):
-    if not word_to_sentence:
-        return {}
+OPENAI_MODEL = "gpt-4o-mini"
+GEMINI_MODEL = "gemini-2.0-flash-exp"
+STUB_MODEL = "stub"
 
-    # Get LLM provider from environment (default to openai)
-    llm_provider = os.getenv("LLM_PROVIDER", "openai").lower()
+# Bump whenever the prompt below changes, so cached verdicts are not reused
+PROMPT_VERSION = "1"
 
-    if llm_provider == "openai":
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            print("Warning: OPENAI_API_KEY not found, skipping LLM validation")
-            return {word: False for word in word_to_sentence.keys()}
-
-        # Setup OpenAI LLM
-        llm = ChatOpenAI(
-            model="gpt-4o-mini",
-            api_key=api_key,
-            temperature=0
-        )
-    else:  # gemini
-        api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            print("Warning: GEMINI_API_KEY not found, skipping LLM validation")
-            return {word: False for word in word_to_sentence.keys()}
-
-        # Setup Gemini LLM
-        llm = ChatGoogleGenerativeAI(
-            model="gemini-2.0-flash-exp",
-            google_api_key=api_key,
-            temperature=0
-        )
+# Verdict cache settings
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") == "1"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "../cache/llm_verdicts.sqlite3")
+LLM_WORD_TIER_MIN = int(os.getenv("LLM_WORD_TIER_MIN", "3"))
 
-    parser = JsonOutputParser(pydantic_object=PharmaceuticalValidation)
+# Async validation engine settings
+LLM_CHUNK_SIZE = int(os.getenv("LLM_CHUNK_SIZE", "25"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+LLM_DEADLINE_SECONDS = float(os.getenv("LLM_DEADLINE_SECONDS", "20"))
 
-    # Create word-sentence pairs for the prompt
-    word_contexts = []
-    for word, sentence in word_to_sentence.items():
-        word_contexts.append(f"Word: '{word}' in sentence: '{sentence}'")
-    contexts_text = "\n".join(word_contexts)
+# Stub provider settings (LLM_PROVIDER=stub)
+LLM_STUB_LATENCY = float(os.getenv("LLM_STUB_LATENCY", "0"))
+LLM_STUB_FAIL_EVERY = int(os.getenv("LLM_STUB_FAIL_EVERY", "0"))
+
+# Estimated response tokens per word ('"word": true,')
+RESPONSE_TOKENS_PER_WORD = 6
+
+# Exception class name fragments treated as transient (worth a retry)
+TRANSIENT_ERROR_NAMES = (
+    "RateLimit", "Timeout", "Connection", "ServiceUnavailable", "InternalServer",
+    "ResourceExhausted", "DeadlineExceeded", "APIError",
+)
+
+class PharmaceuticalValidation(BaseModel):
+    results: Dict[str, bool] = Field(description="Dictionary mapping each word to boolean indicating if it's pharmaceutical")
 
-    prompt = PromptTemplate(
-        template="""Analyze each word to determine if it's a SPECIFIC pharmaceutical entity name (drug/compound/ingredient) in its sentence.
+
+PARSER = JsonOutputParser(pydantic_object=PharmaceuticalValidation)
+
+PROMPT = PromptTemplate(
+    template="""Analyze each word to determine if it's a SPECIFIC pharmaceutical entity name (drug/compound/ingredient) in its sentence.
 
         {contexts_text}
 
@@ -72,20 +76,267 @@ def llm_validate_pharmaceutical_terms(word_to_sentence):
         {format_instructions}
 
         Return the results as a flat dictionary where each key is a word and each value is true/false.""",
-        input_variables=["contexts_text"],
-        partial_variables={"format_instructions": parser.get_format_instructions()}
-    )
+    input_variables=["contexts_text"],
+    partial_variables={"format_instructions": PARSER.get_format_instructions()}
+)
+
+# Prompt tokens every chunk pays regardless of its size
+SHARED_PROMPT_TOKENS = estimate_tokens(PROMPT.template) + estimate_tokens(PARSER.get_format_instructions())
+
+
+def get_provider():
+    """
+    Returns (provider, model name) from the environment (default to openai).
+    """
+    llm_provider = os.getenv("LLM_PROVIDER", "openai").lower()
+    if llm_provider == "openai":
+        return llm_provider, OPENAI_MODEL
+    if llm_provider == "stub":
+        return llm_provider, STUB_MODEL
+    return "gemini", GEMINI_MODEL
+
+
+_CHAINS = {}
+_CHAINS_LOCK = threading.Lock()
+
+
+def get_chain(llm_provider: str, model_name: str):
+    """
+    Returns the pooled prompt | llm | parser chain for a provider, creating the
+    client once per process. Returns None when the provider has no API key.
+    """
+    with _CHAINS_LOCK:
+        if llm_provider in _CHAINS:
+            return _CHAINS[llm_provider]
+
+        if llm_provider == "openai":
+            api_key = os.getenv("OPENAI_API_KEY")
+            if not api_key:
+                log.warning("OPENAI_API_KEY not found, skipping LLM validation")
+                return None
+
+            from langchain_openai import ChatOpenAI
+
+            # Setup OpenAI LLM
+            llm = ChatOpenAI(
+                model=model_name,
+                api_key=api_key,
+                temperature=0
+            )
+        elif llm_provider == "stub":
+            from utils.llm_stub import build_stub_llm
+
+            llm = build_stub_llm(latency=LLM_STUB_LATENCY, fail_every=LLM_STUB_FAIL_EVERY)
+        else:  # gemini
+            api_key = os.getenv("GEMINI_API_KEY")
+            if not api_key:
+                log.warning("GEMINI_API_KEY not found, skipping LLM validation")
+                return None
+
+            from langchain_google_genai import ChatGoogleGenerativeAI
+
+            # Setup Gemini LLM
+            llm = ChatGoogleGenerativeAI(
+                model=model_name,
+                google_api_key=api_key,
+                temperature=0
+            )
+
+        _CHAINS[llm_provider] = PROMPT | llm | PARSER
+        return _CHAINS[llm_provider]
+
+
+def heuristic_verdict(word: str) -> bool:
+    """
+    Conservative fallback for terms the LLM could not decide in time: only
+    multi-word FDA names. Single words are rejected even when they are FDA
+    keys, as many of those are ordinary words the LLM step exists to filter.
+    """
+    key = word.upper().strip()
+    return len(key.split()) > 1 and key in DRUG_DICT
+
+
+def is_transient_error(error: Exception) -> bool:
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    return any(fragment in type(error).__name__ for fragment in TRANSIENT_ERROR_NAMES)
+
+
+# All LLM I/O runs on one background event loop, so the pooled async clients
+# are always used from the loop they were created on
+_LOOP = None
+_LOOP_LOCK = threading.Lock()
+
+
+def _get_loop():
+    global _LOOP
+    with _LOOP_LOCK:
+        if _LOOP is None:
+            _LOOP = asyncio.new_event_loop()
+            threading.Thread(target=_LOOP.run_forever, name="llm-loop", daemon=True).start()
+        return _LOOP
+
+
+def llm_validate_pharmaceutical_terms(word_to_sentence, stats: dict = None):
+    """
+    Blocking entry point; runs the async validation engine on the LLM loop.
+    """
+    if not word_to_sentence:
+        return {}
+    stats = {} if stats is None else stats
+    with stage_timer("llm"):
+        future = asyncio.run_coroutine_threadsafe(_validate(word_to_sentence, stats), _get_loop())
+        verdicts = future.result()
+    _count_llm_items(stats)
+    return verdicts
+
+
+async def allm_validate_pharmaceutical_terms(word_to_sentence, stats: dict = None):
+    """
+    Awaitable entry point for async callers.
+    """
+    if not word_to_sentence:
+        return {}
+    stats = {} if stats is None else stats
+    with stage_timer("llm"):
+        future = asyncio.run_coroutine_threadsafe(_validate(word_to_sentence, stats), _get_loop())
+        verdicts = await asyncio.wrap_future(future)
+    _count_llm_items(stats)
+    return verdicts
+
+
+def _count_llm_items(stats: dict):
+    # Recorded on the caller's side, where the request's timings are current
+    count_items("llm_terms", stats["llm_terms"])
+    count_items("llm_cache_hits", stats["cache_context_hits"] + stats["cache_word_hits"])
+    count_items("llm_heuristic_terms", stats["heuristic_terms"])
+    count_items("llm_gated_terms", stats["gated_terms"])
+    count_items("llm_retries", stats["retries"])
+
+
+async def _validate(word_to_sentence: dict, stats: dict = None):
+    """
+    Asks the LLM which words are pharmaceutical entities in their sentence.
+
+    Verdicts seen before are answered from the verdict cache. When the local
+    gate (utils.llm_gate) is enabled it decides the pairs it is confident
+    about; those verdicts are not cached either. The remaining pairs are split into chunks of LLM_CHUNK_SIZE and validated concurrently
+    (at most LLM_MAX_CONCURRENCY in flight), each with retries on transient
+    errors. Chunks still unresolved at LLM_DEADLINE_SECONDS, or failed for
+    good, fall back to heuristic_verdict. Only real LLM answers are cached.
+    If a stats dict is given it is filled with per-request counters.
+    """
+    start = time.perf_counter()
+    llm_provider, model_name = get_provider()
+    namespace = (llm_provider, model_name, PROMPT_VERSION)
+
+    cache = get_verdict_cache(LLM_CACHE_PATH, word_tier_min=LLM_WORD_TIER_MIN) if LLM_CACHE_ENABLED else None
+    cached, savings = ({}, {"context_hits": 0, "word_hits": 0, "tokens": 0.0, "seconds": 0.0})
+    if cache is not None:
+        cached, savings = cache.lookup(namespace, word_to_sentence)
+    if cached:
+        log.info(
+            "LLM verdict cache: %d/%d terms answered (%d context, %d word-only), saved ~%d tokens and ~%.2fs",
+            len(cached), len(word_to_sentence), savings["context_hits"], savings["word_hits"],
+            round(savings["tokens"]), savings["seconds"],
+        )
+
+    pending = {word: sentence for word, sentence in word_to_sentence.items() if word not in cached}
+    verdicts = dict(cached)
+    gated = LLM_GATE.decide(pending, DRUG_DICT)
+    if gated:
+        verdicts.update(gated)
+        pending = {word: sentence for word, sentence in pending.items() if word not in gated}
+        log.info("LLM gate decided %d terms locally, %d left for the LLM", len(gated), len(pending))
+    counters = {"chunks": 0, "failed_chunks": 0, "retries": 0, "heuristic_terms": 0}
+
+    chain = get_chain(llm_provider, model_name) if pending else None
+    if pending and chain is None:
+        # No LLM configured: fallback verdicts, never cached
+        counters["heuristic_terms"] = len(pending)
+        verdicts.update({word: False for word in pending})
+    elif pending:
+        words = list(pending)
+        chunks = [
+            {word: pending[word] for word in words[i:i + LLM_CHUNK_SIZE]}
+            for i in range(0, len(words), LLM_CHUNK_SIZE)
+        ]
+        counters["chunks"] = len(chunks)
+        semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+        tasks = {
+            asyncio.ensure_future(_validate_chunk(chain, chunk, semaphore, counters)): chunk
+            for chunk in chunks
+        }
+        done, not_done = await asyncio.wait(tasks, timeout=LLM_DEADLINE_SECONDS)
+        for task in not_done:
+            task.cancel()
+        if not_done:
+            log.warning("LLM deadline of %ss reached with %d chunks unresolved", LLM_DEADLINE_SECONDS, len(not_done))
+
+        for task, chunk in tasks.items():
+            result = task.result() if task in done else None
+            if result is None:
+                counters["heuristic_terms"] += len(chunk)
+                verdicts.update({word: heuristic_verdict(word) for word in chunk})
+                continue
+            if cache is not None:
+                cache.store(namespace, chunk, result["verdicts"], result["tokens"], result["seconds_per_word"])
+            verdicts.update(result["verdicts"])
+            # Words the LLM skipped are decided locally
+            verdicts.update({word: heuristic_verdict(word) for word in chunk if word not in result["verdicts"]})
+
+    if stats is not None:
+        stats.update({
+            "llm_terms": len(pending),
+            "cache_context_hits": savings["context_hits"],
+            "cache_word_hits": savings["word_hits"],
+            "gated_terms": len(gated),
+            "tokens_saved": round(savings["tokens"]),
+            "seconds_saved": round(savings["seconds"], 3),
+            "seconds": round(time.perf_counter() - start, 3),
+            **counters,
+        })
+    return verdicts
+
+
+async def _validate_chunk(chain, chunk: dict, semaphore: asyncio.Semaphore, counters: dict):
+    """
+    Validates one chunk with retry and exponential backoff on transient errors.
+    Returns {"verdicts", "tokens", "seconds_per_word"}, or None when it failed.
+    """
+    # Create word-sentence pairs for the prompt
+    word_contexts = []
+    for word, sentence in chunk.items():
+        word_contexts.append(f"Word: '{word}' in sentence: '{sentence}'")
+    contexts_text = "\n".join(word_contexts)
 
-    chain = prompt | llm | parser
-    try:
-        result = chain.invoke({"contexts_text": contexts_text})
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        try:
+            async with semaphore:
+                start = time.perf_counter()
+                result = await chain.ainvoke({"contexts_text": contexts_text})
+                elapsed = time.perf_counter() - start
 
-        print(f"LLM RESPONSE: {result}")
+            if "results" in result:
+                result = result["results"]
+            if not isinstance(result, dict):
+                raise ValueError(f"unexpected LLM output type {type(result).__name__}")
+            break
 
-        if "results" in result:
-            return result["results"]
-        return result
+        except Exception as e:
+            if attempt < LLM_MAX_RETRIES and is_transient_error(e):
+                counters["retries"] += 1
+                delay = LLM_RETRY_BASE_DELAY * (2 ** attempt) * (1 + random.random() / 2)
+                log.warning("LLM validation transient error (%s), retrying in %.2fs", e, delay)
+                await asyncio.sleep(delay)
+                continue
+            log.error("LLM validation error: %s", e)
+            counters["failed_chunks"] += 1
+            return None
 
-    except Exception as e:
-        print(f"LLM validation error: {e}")
-        return {word: False for word in word_to_sentence.keys()}
\ No newline at end of file
+    # Spread the prompt overhead evenly over the words it validated
+    tokens = {
+        word: estimate_tokens(line) + SHARED_PROMPT_TOKENS / len(word_contexts) + RESPONSE_TOKENS_PER_WORD
+        for word, line in zip(chunk, word_contexts)
+    }
+    return {"verdicts": result, "tokens": tokens, "seconds_per_word": elapsed / len(chunk)}
@@ -0,0 +1,67 @@
+"""
+Deterministic local stand-in for the OpenAI / Gemini chat models.
+
+Selected with LLM_PROVIDER=stub. It answers the validation prompt without any
+network call, so the async engine, the verdict cache and the benchmarks can be
+exercised offline. Latency and transient failures can be simulated.
+"""
+import asyncio
+import itertools
+import json
+import re
+import time
+
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+from utils.drug_lookup_dict import DRUG_DICT
+from utils.name_normalizer import NormalizedDrugIndex
+
+WORD_PATTERN = re.compile(r"Word: '(.+?)' in sentence: '")
+
+# Suffixes of common drug name stems (USAN)
+DRUG_STEMS = (
+    "mab", "nib", "platin", "azole", "statin", "pril", "sartan", "olol", "cillin",
+    "mycin", "vir", "taxel", "parin", "prazole", "dronate", "tide", "lukast",
+)
+
+
+# Lets the stub know drugs by their bare names too ("doxylamine"), as a real model does
+NORMALIZED_NAMES = NormalizedDrugIndex(DRUG_DICT)
+
+
+def stub_verdict(word: str) -> bool:
+    return (
+        word.upper() in DRUG_DICT or word.lower().endswith(DRUG_STEMS)
+        or NORMALIZED_NAMES.lookup(word) is not None
+    )
+
+
+def _prompt_text(prompt_value) -> str:
+    return prompt_value.to_string() if hasattr(prompt_value, "to_string") else str(prompt_value)
+
+
+def build_stub_llm(latency: float = 0.0, fail_every: int = 0):
+    """
+    Returns a Runnable usable in place of a chat model (prompt | llm | parser).
+    latency:    seconds each call takes
+    fail_every: every n-th call raises a TimeoutError (0 disables)
+    """
+    calls = itertools.count(1)
+
+    def respond(prompt_value):
+        words = WORD_PATTERN.findall(_prompt_text(prompt_value))
+        if fail_every and next(calls) % fail_every == 0:
+            raise TimeoutError("stub LLM simulated timeout")
+        return AIMessage(content=json.dumps({"results": {word: stub_verdict(word) for word in words}}))
+
+    def invoke(prompt_value):
+        if latency:
+            time.sleep(latency)
+        return respond(prompt_value)
+
+    async def ainvoke(prompt_value):
+        if latency:
+            await asyncio.sleep(latency)
+        return respond(prompt_value)
+
+    return RunnableLambda(invoke, afunc=ainvoke)
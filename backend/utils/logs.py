@@ -0,0 +1,77 @@
+"""
+Leveled, rate-limited logging for the service.
+
+Every module logs through get_logger(__name__). Records share one handler on
+the "alpapharma" logger, and each message template may be emitted at most
+LOG_RATE_LIMIT times per LOG_RATE_WINDOW seconds. Later repeats are dropped,
+and the number dropped is appended to the next record that gets through.
+Pass values as logging arguments (log.info("found %d", n)) rather than
+f-strings, so repeats of one message share a template.
+"""
+import logging
+import os
+import sys
+import threading
+import time
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_RATE_LIMIT = int(os.getenv("LOG_RATE_LIMIT", "20"))
+LOG_RATE_WINDOW = float(os.getenv("LOG_RATE_WINDOW", "60"))
+
+ROOT_LOGGER = "alpapharma"
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets through at most `limit` records per (logger, template) and window;
+    0 disables the limit.
+    """
+
+    def __init__(self, limit: int = LOG_RATE_LIMIT, window: float = LOG_RATE_WINDOW):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.limit <= 0:
+            return True
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            start, count, suppressed = self._windows.get(key, (now, 0, 0))
+            if now - start >= self.window:
+                start, count = now, 0
+            if count >= self.limit:
+                self._windows[key] = (start, count, suppressed + 1)
+                return False
+            self._windows[key] = (start, count + 1, 0)
+        if suppressed:
+            record.msg = f"{record.msg} ({suppressed} similar messages suppressed)"
+        return True
+
+
+_CONFIGURED = False
+_CONFIGURE_LOCK = threading.Lock()
+
+
+def _configure():
+    global _CONFIGURED
+    with _CONFIGURE_LOCK:
+        if _CONFIGURED:
+            return
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        handler.addFilter(RateLimitFilter())
+        root = logging.getLogger(ROOT_LOGGER)
+        root.addHandler(handler)
+        root.setLevel(LOG_LEVEL)
+        root.propagate = False
+        _CONFIGURED = True
+
+
+def get_logger(name: str) -> logging.Logger:
+    _configure()
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
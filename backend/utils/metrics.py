@@ -0,0 +1,237 @@
+"""
+In-process pipeline metrics, exported in the Prometheus text format by
+GET /metrics.
+
+Stages of /extract are timed with stage_timer() into one histogram labelled
+by stage:
+
+    pdf           PDF text extraction
+    spacy         noun-chunk parsing (time waiting for pages excluded)
+    blacklist     blacklist filtering of single-word candidates and exact hits
+    exact_scan    whole-text scan for known drug names
+    llm           LLM validation of ambiguous words
+    normalize     salt / dosage-form / combination name folding tier
+    fuzzy         typo-tolerant lexical tier
+    embedding     SapBERT encoding of vector-tier queries
+    vector_query  nearest-neighbour search (Chroma or in-process index)
+    dictionary    resolving tokens against the drug dictionary into entities
+
+Item counts (paragraphs, candidates, LLM terms, vector queries, ...) go to a
+counter labelled by kind. While a request is being timed (request_timings()),
+the same seconds and counts are also summed per request, for ?debug=timings.
+Cache hit rates are read from the caches themselves when /metrics is scraped.
+"""
+import bisect
+import contextlib
+import contextvars
+import threading
+import time
+
+METRIC_PREFIX = "alpapharma"
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(labelnames, values) -> str:
+    if not labelnames:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in zip(labelnames, values)
+    )
+    return "{" + pairs + "}"
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        return [(self.name, _format_labels(self.labelnames, key), value) for key, value in sorted(values.items())]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        lines.extend(f"{name}{labels} {_format_value(value)}" for name, labels, value in self.samples())
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=STAGE_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # key -> [per-bucket counts..., +Inf count, sum]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            row[index] += 1
+            row[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            values = {key: list(row) for key, row in self._values.items()}
+        for key, row in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), row[:-1]):
+                cumulative += count
+                labels = _format_labels(self.labelnames + ("le",), key + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(row[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name: str, documentation: str, labelnames=()) -> Counter:
+        metric = Counter(f"{METRIC_PREFIX}_{name}", documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames=(), buckets=STAGE_BUCKETS) -> Histogram:
+        metric = Histogram(f"{METRIC_PREFIX}_{name}", documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, func):
+        """
+        Registers func() -> [(name, type, help, [(labels dict, value), ...]), ...],
+        called at scrape time for values owned elsewhere (cache counters, gauges).
+        """
+        self._collectors.append(func)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                families = collector()
+            except Exception as e:
+                lines.append(f"# collector {getattr(collector, '__name__', collector)} failed: {e}")
+                continue
+            for name, kind, documentation, samples in families:
+                name = f"{METRIC_PREFIX}_{name}"
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(tuple(labels), tuple(labels.values()))} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = MetricsRegistry()
+STAGE_SECONDS = METRICS.histogram("stage_seconds", "Time spent per /extract pipeline stage", ("stage",))
+ITEMS = METRICS.counter("items_total", "Items processed by the pipeline, by kind", ("kind",))
+BLACKLIST_REJECTIONS = METRICS.counter(
+    "blacklist_rejections_total", "Candidates dropped by the blacklist, by category", ("category",)
+)
+EXTRACT_REQUESTS = METRICS.counter(
+    "extract_requests_total", "Completed extractions, by result cache outcome", ("cache",)
+)
+EXTRACT_SECONDS = METRICS.histogram("extract_seconds", "End-to-end extraction time", ())
+
+
+class RequestTimings:
+    """
+    Per-request sums of stage seconds and item counts; shared by the threads
+    working on the request.
+    """
+
+    def __init__(self):
+        self.seconds = {}
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+
+    def count(self, kind: str, amount: int):
+        with self._lock:
+            self.counts[kind] = self.counts.get(kind, 0) + amount
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "seconds": {stage: round(seconds, 4) for stage, seconds in self.seconds.items()},
+                "counts": dict(self.counts),
+            }
+
+
+_REQUEST_TIMINGS = contextvars.ContextVar("request_timings", default=None)
+
+
+@contextlib.contextmanager
+def request_timings():
+    """
+    Collects the stages and counts recorded in this context (and in executor
+    calls made with copy_context) into a fresh RequestTimings.
+    """
+    timings = RequestTimings()
+    token = _REQUEST_TIMINGS.set(timings)
+    try:
+        yield timings
+    finally:
+        _REQUEST_TIMINGS.reset(token)
+
+
+def current_timings():
+    return _REQUEST_TIMINGS.get()
+
+
+def observe_stage(stage: str, seconds: float):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timings = _REQUEST_TIMINGS.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+
+@contextlib.contextmanager
+def stage_timer(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
+
+
+def count_items(kind: str, amount: int = 1):
+    if not amount:
+        return
+    ITEMS.inc(amount, kind=kind)
+    timings = _REQUEST_TIMINGS.get()
+    if timings is not None:
+        timings.count(kind, amount)
+
+
+def render_metrics() -> str:
+    return METRICS.render()
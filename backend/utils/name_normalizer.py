@@ -0,0 +1,128 @@
+import re
+import threading
+
+from utils.fuzzy_index import normalize_name
+from utils.logs import get_logger
+
+log = get_logger(__name__)
+
+# Counter-ions and ester groups FDA names carry after the active moiety
+# ("DEXTROMETHORPHAN HYDROBROMIDE", "BETAMETHASONE DIPROPIONATE")
+SALT_WORDS = frozenset("""
+    ACETATE ACETONIDE ANHYDROUS BENZOATE BESILATE BESYLATE BICARBONATE BISULFATE BITARTRATE BROMIDE
+    BUTYRATE CALCIUM CAMSYLATE CARBONATE CHLORIDE CITRATE CYPIONATE DECANOATE DIACETATE DIHYDRATE
+    DIHYDROCHLORIDE DIMESYLATE DIPOTASSIUM DIPROPIONATE DISODIUM EDISYLATE ENANTHATE ERBUMINE
+    ESTOLATE ETHYLSUCCINATE FUMARATE FUROATE GLUCONATE HBR HCL HEMIFUMARATE HEMIHYDRATE HEXAHYDRATE
+    HYCLATE HYDROBROMIDE HYDROCHLORIDE HYDRATE IODIDE ISETHIONATE LACTATE MAGNESIUM
+    MALEATE MALATE MEGLUMINE MESILATE MESYLATE METHYLBROMIDE MONOHYDRATE MONOSODIUM NAPSYLATE NITRATE
+    OLAMINE OXALATE PALMITATE PAMOATE PENTAHYDRATE PHOSPHATE POLISTIREX POTASSIUM PROPIONATE
+    SESQUIHYDRATE SODIUM STEARATE SUCCINATE SULFATE SULPHATE TANNATE TARTRATE TEBUTATE TOSYLATE
+    TRIHYDRATE TROMETHAMINE VALERATE XINAFOATE
+""".split())
+
+# Dosage forms, routes and release modifiers that are part of some product names
+DOSAGE_WORDS = frozenset("""
+    AEROSOL CAPLET CAPLETS CAPSULE CAPSULES CHEWABLE CREAM ELIXIR EMULSION EXTENDED FILM
+    GEL GRANULES INHALATION INJECTABLE INJECTION LIQUID LOTION OINTMENT ORAL PASTE PATCH POWDER
+    RELEASE SHAMPOO SOLUTION SPRAY SR SUPPOSITORY SUSPENSION SYRUP TABLET TABLETS TOPICAL
+    TRANSDERMAL USP XL XR
+""".split())
+
+# Also ordinary words ("Dr. Smith", "for"), so only dropped in the trailing
+# form suffix after the drug name ("METFORMIN ER", "AMOXICILLIN FOR ORAL SUSPENSION")
+SUFFIX_WORDS = frozenset(("DR", "ER", "FOR"))
+
+_FOLDED_WORDS = SALT_WORDS | DOSAGE_WORDS | SUFFIX_WORDS
+
+# Separators of multi-ingredient generics ("ACETAMINOPHEN AND CODEINE PHOSPHATE")
+_COMPONENT_SPLIT = re.compile(r"\s*(?:\bAND\b|\bWITH\b|,|/|\+|;|&)\s*")
+
+
+def normalize_drug_name(name: str) -> str:
+    """
+    Canonical lookup form of a drug name: upper-cased, punctuation folded,
+    salt / ester and dosage-form words dropped (SUFFIX_WORDS only after the
+    last other word). Returns "" when nothing but such words remain
+    (e.g. "SODIUM CHLORIDE").
+    """
+    words = normalize_name(name).split()
+    last = max((i for i, word in enumerate(words) if word not in _FOLDED_WORDS), default=-1)
+    kept = [
+        word for i, word in enumerate(words)
+        if word not in SALT_WORDS and word not in DOSAGE_WORDS and not (word in SUFFIX_WORDS and i > last)
+    ]
+    return " ".join(kept)
+
+
+def name_components(name: str):
+    """
+    Normalized components of a multi-ingredient name; [] for a single ingredient.
+    """
+    parts = _COMPONENT_SPLIT.split(name.upper())
+    if len(parts) < 2:
+        return []
+    components = []
+    for part in parts:
+        component = normalize_drug_name(part)
+        if component and component not in components:
+            components.append(component)
+    return components if len(components) > 1 else []
+
+
+class NormalizedDrugIndex:
+    """
+    Secondary index from normalized names to DRUG_DICT keys, so "doxylamine"
+    resolves to "DOXYLAMINE SUCCINATE" without the vector store.
+
+    Every key is indexed under its normalized form, and each component of a
+    multi-ingredient key under its own. When several keys share a form, a key
+    that normalizes to it directly beats a combination that contains it, then
+    ingredient keys beat product names, then the shortest key wins. Forms that
+    are DRUG_DICT keys themselves are not stored; lookup checks them first.
+    """
+
+    def __init__(self, drug_dict, min_length: int = 4):
+        self.drug_dict = drug_dict
+        self.min_length = min_length
+        self.version = None
+        self._canonical = {}
+        self._lock = threading.Lock()
+
+    def compile(self):
+        """
+        (Re)builds the index if the drug index changed since the last build.
+        """
+        with self._lock:
+            if self.version == self.drug_dict.version:
+                return
+            drug_dict = self.drug_dict
+            ranked = {}
+            for key in drug_dict.keys():
+                _, is_ingredient = drug_dict.entry(key)
+                forms = [(normalize_drug_name(key), 0)]
+                forms += [(component, 1) for component in name_components(key)]
+                for form, via_component in forms:
+                    if len(form) < self.min_length or form in drug_dict:
+                        continue
+                    rank = (via_component, not is_ingredient, len(key), key)
+                    best = ranked.get(form)
+                    if best is None or rank < best:
+                        ranked[form] = rank
+            self._canonical = {form: rank[-1] for form, rank in ranked.items()}
+            self.version = drug_dict.version
+            log.info("Compiled normalized drug name index: %d forms", len(self._canonical))
+
+    def lookup(self, term: str):
+        """
+        Returns the DRUG_DICT key term normalizes to, or None.
+        """
+        self.compile()
+        form = normalize_drug_name(term)
+        if len(form) < self.min_length:
+            return None
+        if form in self.drug_dict:
+            return form
+        return self._canonical.get(form)
+
+    def __len__(self) -> int:
+        return len(self._canonical)
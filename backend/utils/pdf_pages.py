@@ -0,0 +1,123 @@
+"""
+Page-level PDF text extraction.
+
+The helpers here run inside the PDF process pool, so this module must stay
+light: only PyMuPDF and the standard library. It is the only module the
+forkserver preloads for the pool.
+"""
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import fitz
+
+# Upload guards
+PDF_MAX_BYTES = int(float(os.getenv("PDF_MAX_MB", "25")) * 1024 * 1024)
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "200"))
+
+# Process pool for page extraction (0 disables it; pages are then extracted in threads)
+PDF_PAGE_WORKERS = int(os.getenv("PDF_PAGE_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Documents shorter than this are not worth the process round-trips
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "8"))
+# The pool is created on the first large PDF, when torch, the LLM loop and the
+# thread pools are already running; fork would copy locks those threads hold
+# and can deadlock a worker. The forkserver is a fresh single-threaded process
+# that preloads only this module (not main.py and its models); "fork" is
+# faster to start but only safe if nothing else has started threads.
+# Workers still re-import the script that started the server, so under
+# `python main.py` they are started by the warm-up rather than on a request.
+PDF_MP_START_METHOD = os.getenv("PDF_MP_START_METHOD", "forkserver")
+
+
+class PdfLimitError(ValueError):
+    """
+    Raised when an upload exceeds PDF_MAX_BYTES or PDF_MAX_PAGES.
+    """
+
+
+def count_pages(path: str) -> int:
+    with fitz.open(path) as doc:
+        return doc.page_count
+
+
+def check_page_count(page_count: int):
+    if page_count > PDF_MAX_PAGES:
+        raise PdfLimitError(f"PDF has {page_count} pages, the limit is {PDF_MAX_PAGES}")
+
+
+# Document handle of the current worker process, reused across page ranges
+# of the same file: (path, mtime_ns, size, document)
+_DOCUMENT = None
+
+
+def _open_shared(path: str):
+    global _DOCUMENT
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    if _DOCUMENT is None or _DOCUMENT[:3] != key:
+        if _DOCUMENT is not None:
+            _DOCUMENT[3].close()
+        _DOCUMENT = (*key, fitz.open(path))
+    return _DOCUMENT[3]
+
+
+def extract_page_range(path: str, start: int, stop: int, shared: bool = True):
+    """
+    Returns [(page number, text, seconds)] for pages start..stop-1.
+    shared reuses the worker process' document handle; threads must pass False.
+    """
+    pages = []
+    doc = _open_shared(path) if shared else fitz.open(path)
+    try:
+        for page_number in range(start, stop):
+            page_start = time.perf_counter()
+            text = doc[page_number].get_text()
+            pages.append((page_number, text, time.perf_counter() - page_start))
+    finally:
+        if not shared:
+            doc.close()
+    return pages
+
+
+def page_ranges(page_count: int, workers: int):
+    """
+    Splits the pages into about two ranges per worker, so text reaches the
+    tokenizer early while each task still amortizes its document open.
+    """
+    size = max(1, -(-page_count // (max(1, workers) * 2)))
+    return [(start, min(start + size, page_count)) for start in range(0, page_count, size)]
+
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_page_pool():
+    """
+    Returns the process pool for page extraction, or None when disabled.
+    """
+    global _POOL
+    if PDF_PAGE_WORKERS <= 0:
+        return None
+    with _POOL_LOCK:
+        if _POOL is None:
+            context = multiprocessing.get_context(PDF_MP_START_METHOD)
+            if PDF_MP_START_METHOD == "forkserver":
+                context.set_forkserver_preload([__name__])
+            _POOL = ProcessPoolExecutor(max_workers=PDF_PAGE_WORKERS, mp_context=context)
+    return _POOL
+
+
+def _worker_pid(_):
+    return os.getpid()
+
+
+def start_page_pool():
+    """
+    Starts every pool worker now (warm-up) instead of on the first large PDF.
+    """
+    pool = get_page_pool()
+    if pool is not None:
+        list(pool.map(_worker_pid, range(PDF_PAGE_WORKERS)))
@@ -0,0 +1,207 @@
+"""
+Process-wide registry of the heavy shared resources: the spaCy pipeline, the
+SapBERT embedding model, the Chroma vector store and the drug index.
+
+Each resource is created once, on first use or by warm_up() (run from the
+FastAPI lifespan), and every module gets the same instance through the
+get_* accessors below.
+"""
+import os
+import threading
+import time
+
+from utils.logs import get_logger
+
+log = get_logger(__name__)
+
+# Taken when the registry is first imported (main.py imports it first)
+IMPORT_TIME = time.perf_counter()
+
+SPACY_MODEL = os.getenv("SPACY_MODEL", "en_core_web_sm")
+CHROMA_PERSIST_DIR = os.getenv("CHROMA_PERSIST_DIR", "../chroma_store")
+# Load everything at startup instead of on the first request
+RESOURCES_WARM_UP = os.getenv("RESOURCES_WARM_UP", "1") == "1"
+
+
+def process_rss_bytes() -> int:
+    """
+    Current resident set size of this process (peak RSS where /proc is missing).
+    """
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class LazyResource:
+    """
+    A singleton built by loader on first get(); thread-safe.
+    """
+
+    def __init__(self, name: str, loader):
+        self.name = name
+        self._loader = loader
+        self._value = None
+        self._loaded = False
+        self._lock = threading.Lock()
+        self.seconds = None
+        self.rss_delta = None
+        self.error = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def get(self):
+        if self._loaded:
+            return self._value
+        with self._lock:
+            if not self._loaded:
+                start, rss = time.perf_counter(), process_rss_bytes()
+                try:
+                    self._value = self._loader()
+                except Exception as e:
+                    self.error = str(e)
+                    raise
+                self.seconds = round(time.perf_counter() - start, 3)
+                self.rss_delta = process_rss_bytes() - rss
+                self.error = None
+                self._loaded = True
+                log.info("Loaded %s in %ss (+%.0f MB RSS)", self.name, self.seconds, self.rss_delta / 2**20)
+        return self._value
+
+    def status(self) -> dict:
+        return {
+            "loaded": self._loaded,
+            "seconds": self.seconds,
+            "rss_mb": round(self.rss_delta / 2**20, 1) if self.rss_delta is not None else None,
+            "error": self.error,
+        }
+
+
+class ResourceRegistry:
+    def __init__(self):
+        self._resources = {}
+        self._warm_ups = []
+        self.ready_time = None
+        self.warm_up_error = None
+
+    def register(self, name: str, loader) -> LazyResource:
+        resource = LazyResource(name, loader)
+        self._resources[name] = resource
+        return resource
+
+    def get(self, name: str):
+        return self._resources[name].get()
+
+    def is_loaded(self, name: str) -> bool:
+        return self._resources[name].loaded
+
+    def add_warm_up(self, name: str, func):
+        """
+        Registers an extra step run by warm_up() after every resource is loaded
+        (e.g. compiling indexes, a dummy encode).
+        """
+        self._warm_ups.append((name, func))
+
+    @property
+    def ready(self) -> bool:
+        return self.ready_time is not None
+
+    def warm_up(self, load: bool = True):
+        """
+        Loads every resource and runs the warm-up steps. Blocking; returns the
+        seconds from registry import to ready. With load=False resources stay
+        lazy and the process is marked ready right away.
+        """
+        try:
+            for resource in self._resources.values() if load else ():
+                resource.get()
+            for name, func in self._warm_ups if load else ():
+                start = time.perf_counter()
+                func()
+                log.info("Warm-up %s: %.2fs", name, time.perf_counter() - start)
+        except Exception as e:
+            self.warm_up_error = str(e)
+            log.error("Warm-up failed: %s", e)
+            raise
+        self.ready_time = time.perf_counter()
+        seconds = self.ready_time - IMPORT_TIME
+        log.info("Ready %.2fs after import, RSS %.0f MB", seconds, process_rss_bytes() / 2**20)
+        return seconds
+
+    def status(self) -> dict:
+        return {
+            "ready": self.ready,
+            "import_to_ready_seconds": round(self.ready_time - IMPORT_TIME, 3) if self.ready else None,
+            "rss_mb": round(process_rss_bytes() / 2**20, 1),
+            "pid": os.getpid(),
+            "error": self.warm_up_error,
+            "resources": {name: resource.status() for name, resource in self._resources.items()},
+        }
+
+
+def _load_nlp():
+    import spacy
+
+    return spacy.load(SPACY_MODEL)
+
+
+def _load_drug_index():
+    from utils.drug_lookup_dict import DRUG_DICT, init_drug_dict
+
+    init_drug_dict()
+    return DRUG_DICT
+
+
+def _load_embedding_model():
+    from utils.embedding_backends import load_embedding_backend
+
+    return load_embedding_backend()
+
+
+def _load_vector_store():
+    from utils.vectorstore_handler import ChromaManager
+
+    return ChromaManager(CHROMA_PERSIST_DIR, embedding_model=get_embedding_model())
+
+
+RESOURCES = ResourceRegistry()
+_NLP = RESOURCES.register("nlp", _load_nlp)
+_DRUG_INDEX = RESOURCES.register("drug_index", _load_drug_index)
+_EMBEDDING_MODEL = RESOURCES.register("embedding_model", _load_embedding_model)
+_VECTOR_STORE = RESOURCES.register("vector_store", _load_vector_store)
+
+
+def get_nlp():
+    return _NLP.get()
+
+
+def get_drug_index():
+    """
+    Returns DRUG_DICT, loading the FDA data first if needed.
+    """
+    return _DRUG_INDEX.get()
+
+
+def get_embedding_model():
+    return _EMBEDDING_MODEL.get()
+
+
+def get_vector_store():
+    return _VECTOR_STORE.get()
+
+
+def _warm_models():
+    # First calls pay for lazy init / kernel selection; do it before traffic
+    get_nlp()("Warm-up sentence with cisplatin treatment.")
+    get_embedding_model().encode(["warm up"])
+    get_vector_store().collection.count()
+
+
+RESOURCES.add_warm_up("models", _warm_models)
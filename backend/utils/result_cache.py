@@ -0,0 +1,137 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+
+def content_hash(data) -> str:
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+class ResultCache:
+    """
+    Size-bounded SQLite store of /extract results.
+
+    Entries are keyed by "<tier>:<sha256(fingerprint + content hash)>", where
+    the fingerprint identifies everything that shapes a result (drug index
+    version, models, prompt and blacklist versions), so a change to any of them
+    simply stops old entries from being hit. Bodies are zlib-compressed JSON.
+    When the total body size exceeds max_bytes the least recently used entries
+    are evicted. The total is summed inside each write transaction, so worker
+    processes sharing the file respect one bound between them.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.counters = {"bytes_hits": 0, "text_hits": 0, "misses": 0, "evictions": 0}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL
+            );
+            -- Covers the LRU scan and SUM(size) without reading the bodies
+            CREATE INDEX IF NOT EXISTS results_lru ON results (last_used, size);
+            DROP INDEX IF EXISTS results_last_used;
+        """)
+        self._db.commit()
+
+    @staticmethod
+    def key(tier: str, fingerprint: str, digest: str) -> str:
+        return f"{tier}:{content_hash(f'{fingerprint}|{digest}')}"
+
+    def get(self, tier: str, fingerprint: str, digest: str):
+        """
+        Returns the cached value for a content digest, or None.
+        """
+        key = self.key(tier, fingerprint, digest)
+        with self._lock:
+            row = self._db.execute("SELECT body FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+            self.counters[f"{tier}_hits"] += 1
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, tier: str, fingerprint: str, digest: str, value):
+        key = self.key(tier, fingerprint, digest)
+        body = zlib.compress(json.dumps(value).encode("utf-8"))
+        if len(body) > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            # Other processes write to the file too: hold its write lock while summing and evicting
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO results (key, body, size, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                    (key, body, len(body), now, now)
+                )
+                self._evict()
+                self._db.commit()
+            except BaseException:
+                self._db.rollback()
+                raise
+
+    def record_miss(self):
+        with self._lock:
+            self.counters["misses"] += 1
+
+    def _total_bytes(self) -> int:
+        return self._db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+
+    def _evict(self):
+        total = self._total_bytes()
+        while total > self.max_bytes:
+            rows = self._db.execute(
+                "SELECT key, size FROM results ORDER BY last_used LIMIT 64"
+            ).fetchall()
+            if not rows:
+                return
+            for key, size in rows:
+                if total <= self.max_bytes:
+                    break
+                self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+                total -= size
+                self.counters["evictions"] += 1
+
+    def stats(self):
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+            return {
+                **self.counters,
+                "entries": entries,
+                "bytes": self._total_bytes(),
+                "max_bytes": self.max_bytes,
+            }
+
+
+_CACHES = {}
+_CACHES_LOCK = threading.Lock()
+
+
+def get_result_cache(path: str, max_bytes: int) -> ResultCache:
+    """
+    Returns the process-wide result cache for a given file.
+    """
+    with _CACHES_LOCK:
+        cache = _CACHES.get(path)
+        if cache is None:
+            cache = ResultCache(path, max_bytes)
+            _CACHES[path] = cache
+        return cache
@@ -1,4 +1,12 @@
+import glob
+import hashlib
+import os
 import re
+import threading
+
+# Extra domain blacklists: *.txt files, one term per line ("re:" prefix for a regex).
+# The file name (without .txt) is the category reported for its terms.
+BLACKLIST_DIR = os.getenv("BLACKLIST_DIR", "../data/blacklists")
 
 # Compiled regex patterns for performance
 MOSTLY_SPECIAL_CHARS = re.compile(r'^[^a-zA-Z0-9]*$|^[^a-zA-Z0-9]+[a-zA-Z0-9]*[^a-zA-Z0-9]+$')
@@ -128,47 +136,186 @@ def clean_text(text: str) -> str:
     return cleaned.strip()
 
 
+BLACKLISTS = {
+    "credentials": CREDENTIALS,
+    "business": BUSINESS_TERMS,
+    "structural": STRUCTURAL_TERMS,
+    "symbols": SYMBOLS_AND_FORMATTING,
+    "job_titles": JOB_TITLES,
+    "cv_sections": CV_SECTIONS,
+    "dates": DATE_TERMS,
+    "common_cv_words": COMMON_CV_WORDS,
+    "us_states": US_STATES,
+    "geographic": GEOGRAPHIC_TERMS,
+    "pharma_companies": PHARMA_COMPANIES,
+    "academic": ACADEMIC_TERMS,
+    "organizations": ORGANIZATION_ABBREVS,
+}
+# Checked in this order after the term lists; the first match names the category
+BLACKLIST_PATTERNS = {
+    "study_code": STUDY_CODE_PATTERN,
+    "date_pattern": DATE_PATTERN,
+    "special_chars": MOSTLY_SPECIAL_CHARS,
+}
+
+
+def load_blacklist_files(directory: str = BLACKLIST_DIR):
+    """
+    Reads the extra blacklists in directory.
+    Returns ({category: set of terms}, {category: [regex source, ...]}).
+    """
+    terms, patterns = {}, {}
+    for path in sorted(glob.glob(os.path.join(directory, "*.txt"))):
+        category = os.path.splitext(os.path.basename(path))[0]
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                if line.startswith("re:"):
+                    re.compile(line[3:])  # fail on the bad file, not in the combined regex
+                    patterns.setdefault(category, []).append(line[3:])
+                else:
+                    terms.setdefault(category, set()).add(line)
+    return terms, patterns
+
+
+class CompiledBlacklist:
+    """
+    Every term list folded into a case-sensitive and a casefolded
+    {term: category} dict and every pattern into one regex with a named group
+    per pattern, so a lookup is at most two dict probes plus one regex match.
+
+    The casefolded dict catches casing variants of listed words ("board",
+    "present"), but never for a term whose upper-cased form is in protected
+    (the drug names): "LEAD" stays an ingredient although "Lead" is a job title.
+    """
+
+    def __init__(self, term_lists: dict, patterns: dict, protected=()):
+        self.protected = protected
+        self.exact, self.categories = {}, {}
+        for category, terms in term_lists.items():
+            for term in terms:
+                # First list wins, like the old `or` chain
+                term_clean = clean_text(term)
+                self.exact.setdefault(term_clean, category)
+                self.categories.setdefault(term_clean.casefold(), category)
+
+        groups, self.group_categories = [], {}
+        for category, sources in patterns.items():
+            for source in sources:
+                name = f"p{len(groups)}"
+                groups.append(f"(?P<{name}>{source})")
+                self.group_categories[name] = category
+        self.pattern = re.compile("|".join(groups)) if groups else None
+
+        digest = hashlib.sha1()
+        for term, category in sorted(self.categories.items()):
+            digest.update(f"{term}\x1f{category}\x1e".encode("utf-8"))
+        for group in groups:
+            digest.update(group.encode("utf-8"))
+            digest.update(b"\x1e")
+        self.version = digest.hexdigest()[:12]
+
+    def category(self, term: str):
+        """
+        Returns the category term is excluded under, or None to keep it.
+        """
+        if not term or not term.strip():
+            return "empty"
+
+        term_clean = clean_text(term)
+        category = self.exact.get(term_clean)
+        if category is None and term_clean.upper() not in self.protected:
+            category = self.categories.get(term_clean.casefold())
+        if category is not None:
+            return category
+
+        if self.pattern is not None:
+            match = self.pattern.match(term_clean)
+            if match is not None:
+                # Very short strings caught by the special-character pattern are "short"
+                if len(term_clean) <= 2 and self.group_categories[match.lastgroup] == "special_chars":
+                    return "short"
+                return self.group_categories[match.lastgroup]
+
+        # Filter out very short terms (1-2 characters) unless they could be chemical symbols
+        # (uppercase); states/countries are already caught by the lists above
+        if len(term_clean) <= 2 and not (term_clean.isupper() and term_clean.isalpha()):
+            return "short"
+
+        return None
+
+    def filter(self, terms):
+        """
+        Splits terms in one pass (each distinct term is checked once).
+        Returns (kept terms in input order, {rejected term: category}).
+        """
+        verdicts = {}
+        for term in terms:
+            if term not in verdicts:
+                verdicts[term] = self.category(term)
+        kept = [term for term in terms if verdicts[term] is None]
+        rejected = {term: category for term, category in verdicts.items() if category is not None}
+        return kept, rejected
+
+
+_BLACKLIST = None
+_BLACKLIST_LOCK = threading.Lock()
+
+
+def compile_blacklist(directory: str = BLACKLIST_DIR) -> CompiledBlacklist:
+    from utils.drug_lookup_dict import DRUG_DICT
+
+    extra_terms, extra_patterns = load_blacklist_files(directory)
+    term_lists = dict(BLACKLISTS)
+    for category, terms in extra_terms.items():
+        term_lists[category] = term_lists.get(category, set()) | terms
+    patterns = {category: [pattern.pattern] for category, pattern in BLACKLIST_PATTERNS.items()}
+    for category, sources in extra_patterns.items():
+        patterns.setdefault(category, []).extend(sources)
+    # DRUG_DICT keeps its identity across reloads, so this tracks the current names
+    return CompiledBlacklist(term_lists, patterns, protected=DRUG_DICT)
+
+
+def get_blacklist() -> CompiledBlacklist:
+    global _BLACKLIST
+    if _BLACKLIST is None:
+        with _BLACKLIST_LOCK:
+            if _BLACKLIST is None:
+                _BLACKLIST = compile_blacklist()
+    return _BLACKLIST
+
+
+def reload_blacklist(directory: str = BLACKLIST_DIR) -> CompiledBlacklist:
+    """
+    Recompiles the blacklist, picking up changed files in directory.
+    """
+    global _BLACKLIST
+    blacklist = compile_blacklist(directory)
+    with _BLACKLIST_LOCK:
+        _BLACKLIST = blacklist
+    return blacklist
+
+
+def exclusion_category(term: str):
+    return get_blacklist().category(term)
+
+
 def should_exclude_term(term: str):
-    if not term or not term.strip():
-        return True
-
-    term_clean = clean_text(term)
-
-    # Check against all blacklists
-    if (term_clean in CREDENTIALS or
-        term_clean in BUSINESS_TERMS or
-        term_clean in STRUCTURAL_TERMS or
-        term_clean in SYMBOLS_AND_FORMATTING or
-        term_clean in JOB_TITLES or
-        term_clean in CV_SECTIONS or
-        term_clean in DATE_TERMS or
-        term_clean in COMMON_CV_WORDS or
-        term_clean in US_STATES or
-        term_clean in GEOGRAPHIC_TERMS or
-        term_clean in PHARMA_COMPANIES or
-        term_clean in ACADEMIC_TERMS or
-        term_clean in ORGANIZATION_ABBREVS):
-        return True
-
-    # Filter out study codes and clinical trial patterns
-    if STUDY_CODE_PATTERN.match(term_clean):
-        return True
-
-    # Filter out date patterns
-    if DATE_PATTERN.match(term_clean):
-        return True
-
-    # Filter out very short terms (1-2 characters) unless they could be chemical symbols
-    if len(term_clean) <= 2:
-        # Now that we've filtered out states/countries above,
-        # keep potential chemical elements/compounds (uppercase)
-        if term_clean.isupper() and term_clean.isalpha():
-            return False
-        else:
-            return True
-
-    # Filter out terms that are mostly special characters
-    if MOSTLY_SPECIAL_CHARS.match(term_clean):
-        return True
-
-    return False
+    return get_blacklist().category(term) is not None
+
+
+def filter_terms(terms):
+    """
+    Batch should_exclude_term: returns (kept terms, {rejected term: category}).
+    """
+    return get_blacklist().filter(list(terms))
+
+
+def blacklist_version() -> str:
+    """
+    Short digest of the compiled term lists and patterns (extra files included);
+    changes whenever the blacklist does.
+    """
+    return get_blacklist().version
@@ -0,0 +1,217 @@
+"""
+In-process nearest-neighbour search over the fda_drugs embeddings, as an
+alternative to going through the Chroma client for every query.
+
+The collection is exported once into a directory holding a contiguous
+float32 / float16 matrix (memory-mapped .npy), its squared row norms, the ids,
+documents and metadatas, and optionally an HNSW graph (hnswlib). Distances are
+squared L2, the same as Chroma's default "l2" space, so MAX_VECTOR_DISTANCE
+keeps its meaning.
+
+Run from backend/:
+    python -m utils.vector_index export [--dtype float16] [--hnsw]
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+VECTOR_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", "../data/fda-vectors")
+HNSW_EF = int(os.getenv("HNSW_EF", "64"))
+# Rows multiplied at once; bounds the temporary distance matrix
+MATRIX_BLOCK_ROWS = 65536
+
+MANIFEST_FILE = "manifest.json"
+
+
+class MatrixIndex:
+    """
+    Exact top-k by squared L2 over a memory-mapped matrix:
+    |q - x|^2 = |q|^2 - 2 q.x + |x|^2, one matrix multiply per row block and
+    argpartition to keep the k best.
+    """
+
+    def __init__(self, index_dir: str):
+        with open(os.path.join(index_dir, MANIFEST_FILE), encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.matrix = np.load(os.path.join(index_dir, "vectors.npy"), mmap_mode="r")
+        self.norms = np.load(os.path.join(index_dir, "norms.npy"), mmap_mode="r")
+        with open(os.path.join(index_dir, "documents.json"), encoding="utf-8") as f:
+            payload = json.load(f)
+        self.ids = payload["ids"]
+        self.documents = payload["documents"]
+        self.metadatas = payload["metadatas"]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def search(self, embeddings, k: int):
+        """
+        Returns (row indices, squared distances), both (n_queries, k), nearest first.
+        """
+        queries = np.asarray(embeddings, dtype=np.float32)
+        k = min(k, len(self))
+        query_norms = np.einsum("ij,ij->i", queries, queries)[:, None]
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        best_distances = np.empty((len(queries), 0), dtype=np.float32)
+
+        for start in range(0, len(self), MATRIX_BLOCK_ROWS):
+            block = np.asarray(self.matrix[start:start + MATRIX_BLOCK_ROWS], dtype=np.float32)
+            distances = query_norms - 2.0 * queries @ block.T + self.norms[start:start + len(block)]
+            if len(block) > k:
+                top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+            else:
+                top = np.broadcast_to(np.arange(len(block)), distances.shape)
+            best_rows = np.concatenate([best_rows, top + start], axis=1)
+            best_distances = np.concatenate([best_distances, np.take_along_axis(distances, top, axis=1)], axis=1)
+            if best_rows.shape[1] > k:
+                keep = np.argpartition(best_distances, k - 1, axis=1)[:, :k]
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+                best_distances = np.take_along_axis(best_distances, keep, axis=1)
+
+        order = np.argsort(best_distances, axis=1)
+        rows = np.take_along_axis(best_rows, order, axis=1)
+        distances = np.maximum(np.take_along_axis(best_distances, order, axis=1), 0.0)
+        return rows, distances
+
+    def query(self, embeddings, n_results: int):
+        """
+        Chroma-shaped result: {"ids", "distances", "documents", "metadatas"}.
+        """
+        rows, distances = self.search(embeddings, n_results)
+        return self._result(rows, distances)
+
+    def _result(self, rows, distances):
+        return {
+            "ids": [[self.ids[row] for row in query_rows] for query_rows in rows],
+            "distances": [[float(distance) for distance in query_distances] for query_distances in distances],
+            "documents": [[self.documents[row] for row in query_rows] for query_rows in rows],
+            "metadatas": [[self.metadatas[row] for row in query_rows] for query_rows in rows],
+        }
+
+
+class HnswIndex(MatrixIndex):
+    """
+    Approximate search with an hnswlib graph built over the exported matrix
+    (also squared L2); documents and ids come from the same export.
+    """
+
+    def __init__(self, index_dir: str, ef: int = HNSW_EF):
+        import hnswlib
+
+        super().__init__(index_dir)
+        path = os.path.join(index_dir, "hnsw.bin")
+        if not os.path.exists(path):
+            raise ValueError(f"{path} not found; export with --hnsw")
+        self.hnsw = hnswlib.Index(space="l2", dim=self.matrix.shape[1])
+        self.hnsw.load_index(path, max_elements=len(self))
+        self.hnsw.set_ef(max(ef, 1))
+
+    def search(self, embeddings, k: int):
+        k = min(k, len(self))
+        rows, distances = self.hnsw.knn_query(np.asarray(embeddings, dtype=np.float32), k=k)
+        return rows.astype(np.int64), distances
+
+
+def load_vector_index(backend: str = VECTOR_BACKEND, index_dir: str = VECTOR_INDEX_DIR):
+    """
+    Returns the in-process index for VECTOR_BACKEND ("matrix" or "hnsw"),
+    or None for "chroma".
+    """
+    if backend == "chroma":
+        return None
+    if backend not in ("matrix", "hnsw"):
+        raise ValueError(f"Unknown VECTOR_BACKEND '{backend}', expected chroma, matrix or hnsw")
+    if not os.path.exists(os.path.join(index_dir, MANIFEST_FILE)):
+        raise ValueError(f"No vector index in {index_dir}; run: python -m utils.vector_index export")
+    return HnswIndex(index_dir) if backend == "hnsw" else MatrixIndex(index_dir)
+
+
+def export_collection(collection, index_dir: str = VECTOR_INDEX_DIR, dtype: str = "float32",
+                      hnsw: bool = False, page_size: int = 5000):
+    """
+    Writes the collection's embeddings, ids, documents and metadatas to index_dir.
+    """
+    total = collection.count()
+    os.makedirs(index_dir, exist_ok=True)
+    ids, documents, metadatas = [], [], []
+    matrix = None
+    for offset in range(0, total, page_size):
+        page = collection.get(
+            limit=page_size, offset=offset, include=["embeddings", "documents", "metadatas"]
+        )
+        vectors = np.asarray(page["embeddings"], dtype=np.float32)
+        if matrix is None:
+            matrix = np.lib.format.open_memmap(
+                os.path.join(index_dir, "vectors.npy"), mode="w+", dtype=dtype, shape=(total, vectors.shape[1])
+            )
+        matrix[len(ids):len(ids) + len(vectors)] = vectors
+        ids.extend(page["ids"])
+        documents.extend(page["documents"])
+        metadatas.extend(page["metadatas"] or [None] * len(vectors))
+        print(f"Exported {len(ids)}/{total} vectors")
+
+    if matrix is None:
+        raise ValueError("collection is empty")
+    matrix.flush()
+    # Norms of the stored (possibly float16-rounded) rows, so distances stay consistent
+    norms = np.empty(total, dtype=np.float32)
+    for start in range(0, total, MATRIX_BLOCK_ROWS):
+        block = np.asarray(matrix[start:start + MATRIX_BLOCK_ROWS], dtype=np.float32)
+        norms[start:start + len(block)] = np.einsum("ij,ij->i", block, block)
+    np.save(os.path.join(index_dir, "norms.npy"), norms)
+
+    with open(os.path.join(index_dir, "documents.json"), "w", encoding="utf-8") as f:
+        json.dump({"ids": ids, "documents": documents, "metadatas": metadatas}, f)
+
+    if hnsw:
+        import hnswlib
+
+        graph = hnswlib.Index(space="l2", dim=matrix.shape[1])
+        graph.init_index(max_elements=total, ef_construction=200, M=16)
+        for start in range(0, total, MATRIX_BLOCK_ROWS):
+            block = np.asarray(matrix[start:start + MATRIX_BLOCK_ROWS], dtype=np.float32)
+            graph.add_items(block, np.arange(start, start + len(block)))
+        graph.save_index(os.path.join(index_dir, "hnsw.bin"))
+
+    manifest = {
+        "collection": collection.name,
+        "collection_id": str(collection.id),
+        "count": total,
+        "dim": int(matrix.shape[1]),
+        "dtype": dtype,
+        "hnsw": hnsw,
+        "created": time.time(),
+    }
+    with open(os.path.join(index_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def main():
+    import chromadb
+    from utils.resources import CHROMA_PERSIST_DIR
+    from utils.vectorstore_handler import COLLECTION_NAME
+
+    parser = argparse.ArgumentParser(description="Export the fda_drugs collection into an in-process vector index")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="export embeddings to a memory-mapped matrix")
+    export.add_argument("--output", default=VECTOR_INDEX_DIR)
+    export.add_argument("--dtype", choices=("float32", "float16"), default="float32")
+    export.add_argument("--hnsw", action="store_true", help="also build an hnswlib graph")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    collection = chromadb.PersistentClient(path=CHROMA_PERSIST_DIR).get_collection(COLLECTION_NAME)
+    manifest = export_collection(collection, args.output, dtype=args.dtype, hnsw=args.hnsw)
+    print(
+        f"Wrote {args.output}: {manifest['count']} x {manifest['dim']} {manifest['dtype']}"
+        f"{' + hnsw' if manifest['hnsw'] else ''} in {time.perf_counter() - start:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,233 @@
+import hashlib
 import os
 import chromadb
 from sentence_transformers import SentenceTransformer
+from utils.chroma_builder import CHROMA_MANIFEST_CHECK, names_checksum, read_manifest, update_manifest, verify_manifest
+from utils.drug_lookup_dict import DRUG_DICT
+from utils.embedding_cache import get_embedding_cache, normalize_term, timed_encode
+from utils.logs import get_logger
+from utils.metrics import count_items, stage_timer
+from utils.vector_index import VECTOR_BACKEND, load_vector_index
+
+log = get_logger(__name__)
+
+
+EMBEDDING_MODEL_NAME = "cambridgeltl/SapBERT-from-PubMedBERT-fulltext"
+COLLECTION_NAME = "fda_drugs"
+
+# Embedding / neighbour cache settings
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "1") == "1"
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "../cache/embeddings.sqlite3")
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+
+
+def name_id(name: str) -> str:
+    """
+    Stable Chroma id for a drug name key, so upserts and deletes are idempotent.
+    """
+    return "name-" + hashlib.sha1(name.encode("utf-8")).hexdigest()[:16]
 
 
 class ChromaManager:
-    def __init__(self, persist_dir: str = "../chroma_store"):
+    def __init__(self, persist_dir: str = "../chroma_store", embedding_model: SentenceTransformer = None):
         # check if persist_dir exists, if not error
-        print(f"Using Chroma persist directory: {persist_dir}")
+        log.info("Using Chroma persist directory: %s", persist_dir)
         if not os.path.exists(persist_dir):
             raise ValueError(f"Chroma persist directory '{persist_dir}' does not exist. Please create it and add data before querying.")
 
         # Use SapBERT for biomedical embeddings (same as used for indexing)
-        self.embedding_model = SentenceTransformer("cambridgeltl/SapBERT-from-PubMedBERT-fulltext")
+        self.embedding_model = embedding_model or SentenceTransformer(EMBEDDING_MODEL_NAME)
+        # Backends other than the fp32 model get their own cache namespace
+        self.model_name = getattr(self.embedding_model, "backend_name", EMBEDDING_MODEL_NAME)
+        self.persist_dir = persist_dir
+        # Reference model for index-time embeddings, loaded on first use when queries run on another backend
+        self._index_model = self.embedding_model if self.model_name == EMBEDDING_MODEL_NAME else None
         self.client = chromadb.PersistentClient(path=persist_dir)
-        self.collection = self.client.get_or_create_collection(name="fda_drugs")
+        self.collection = self.client.get_or_create_collection(name=COLLECTION_NAME)
+        self._check_manifest()
+        self._names_sha256 = self._manifest_names()
+        self.vector_index = self._load_vector_index()
+
+        self.cache = None
+        if EMBEDDING_CACHE_ENABLED:
+            self.cache = get_embedding_cache(EMBEDDING_CACHE_PATH, max_memory_items=EMBEDDING_CACHE_SIZE)
+            self.cache.bind(self.model_name, self.collection_fingerprint())
+
+    def _check_manifest(self):
+        """
+        Compares the collection with the manifest its build wrote
+        (python -m utils.chroma_builder build); strict mode refuses to start.
+        """
+        if CHROMA_MANIFEST_CHECK == "off":
+            return
+        # The drug data may not be loaded yet when the store is opened on its own
+        data_version = DRUG_DICT.version if len(DRUG_DICT) else None
+        problems = verify_manifest(self.persist_dir, EMBEDDING_MODEL_NAME, self.collection, data_version)
+        if problems and CHROMA_MANIFEST_CHECK == "strict":
+            raise ValueError(f"Chroma collection does not match its build manifest: {'; '.join(problems)}")
+        for problem in problems:
+            log.warning("Chroma manifest check: %s", problem)
+
+    def _load_vector_index(self):
+        """
+        Loads the in-process index selected by VECTOR_BACKEND if its export
+        matches the collection; otherwise queries keep going through Chroma.
+        """
+        if VECTOR_BACKEND == "chroma":
+            return None
+        try:
+            index = load_vector_index(VECTOR_BACKEND)
+        except (OSError, ValueError, ImportError) as e:
+            log.warning("Vector index unavailable (%s), using Chroma", e)
+            return None
+        manifest = index.manifest
+        if manifest["collection_id"] != str(self.collection.id) or manifest["count"] != self.collection.count():
+            log.warning("Vector index export does not match the collection, using Chroma; "
+                        "re-run: python -m utils.vector_index export")
+            return None
+        log.info("Using in-process %s vector index (%d x %d %s)", VECTOR_BACKEND, len(index), manifest["dim"], manifest["dtype"])
+        return index
+
+    def _manifest_names(self):
+        return (read_manifest(self.persist_dir) or {}).get("names_sha256")
+
+    def collection_fingerprint(self) -> str:
+        """
+        Identifies the current model + collection state; cached neighbours are
+        only valid for the fingerprint they were stored under. The names
+        checksum tells apart syncs that leave the count unchanged.
+        """
+        backend = VECTOR_BACKEND if self.vector_index is not None else "chroma"
+        return (f"{self.model_name}:{self.collection.name}:{self.collection.id}:{self.collection.count()}:"
+                f"{self._names_sha256}:{backend}")
+
+    def search(self, query_embeddings, n_results: int):
+        """
+        Nearest neighbours of the given embeddings, from the in-process index
+        when one is loaded, otherwise from the Chroma collection.
+        """
+        with stage_timer("vector_query"):
+            if self.vector_index is not None:
+                return self.vector_index.query(query_embeddings, n_results)
+            return self.collection.query(query_embeddings=query_embeddings, n_results=n_results)
+
+    def cache_stats(self):
+        if self.cache is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.cache.stats()}
 
     def query(self, query: str, n_results: int = 5):
-        query_embedding = self.embedding_model.encode([query]).tolist()[0]
-        return self.collection.query(
-            query_embeddings=[query_embedding],
-            n_results=n_results
+        return self.query_many([query], n_results=n_results)
+
+    def query_many(self, terms: list, n_results: int = 5):
+        """
+        Encodes all terms in one batched forward pass and resolves them with a
+        single collection round-trip. Result lists follow the order of terms.
+        Cached neighbours and embeddings are reused when the cache is enabled.
+        """
+        if not terms:
+            return {"ids": [], "distances": [], "documents": [], "metadatas": []}
+
+        if self.cache is None:
+            with stage_timer("embedding"):
+                query_embeddings = self.embedding_model.encode(list(terms)).tolist()
+            count_items("embeddings_encoded", len(terms))
+            return self.search(query_embeddings, n_results)
+
+        keys = [normalize_term(term) for term in terms]
+        unique_keys = list(dict.fromkeys(keys))
+        results = self.cache.get_neighbors(unique_keys, n_results)
+
+        missing = [key for key in unique_keys if key not in results]
+        if missing:
+            embeddings = self.embed(missing)
+            fresh = self.search([embeddings[key] for key in missing], n_results)
+            fresh_results = {}
+            for i, key in enumerate(missing):
+                fresh_results[key] = {
+                    field: (fresh.get(field) or [[]] * len(missing))[i]
+                    for field in ("ids", "distances", "documents", "metadatas")
+                }
+            self.cache.put_neighbors(fresh_results, n_results)
+            results.update(fresh_results)
+
+        return {
+            field: [results[key][field] for key in keys]
+            for field in ("ids", "distances", "documents", "metadatas")
+        }
+
+    def embed(self, keys: list):
+        """
+        Returns {normalized term: embedding}, encoding only the cache misses.
+        """
+        embeddings = self.cache.get_embeddings(keys)
+        missing = [key for key in keys if key not in embeddings]
+        if missing:
+            with stage_timer("embedding"):
+                vectors, elapsed = timed_encode(self.embedding_model.encode, missing)
+            count_items("embeddings_encoded", len(missing))
+            encoded = dict(zip(missing, vectors))
+            self.cache.put_embeddings(encoded, encode_seconds=elapsed)
+            embeddings.update(encoded)
+        return embeddings
+
+    def index_model(self):
+        """
+        The fp32 SentenceTransformer the collection was built with. Vectors
+        written to the collection always come from it, whatever the query
+        backend (EMBEDDING_BACKEND), so they match the build manifest.
+        """
+        if self._index_model is None:
+            log.info("Query backend is %s; loading %s for index-time embeddings", self.model_name, EMBEDDING_MODEL_NAME)
+            self._index_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+        return self._index_model
+
+    def refresh_after_reload(self):
+        """
+        Catches up with a sync_names run by another worker: the in-process
+        index is re-checked against the collection and neighbour results
+        cached by this process are dropped.
+        """
+        self._names_sha256 = self._manifest_names()
+        if self.vector_index is not None:
+            self.vector_index = self._load_vector_index()
+        if self.cache is not None:
+            self.cache.invalidate_neighbors(self.collection_fingerprint())
+
+    def sync_names(self, added_names: list, removed_names: list, batch_size: int = 256):
+        """
+        Applies a drug index diff to the collection: embeds (with the
+        reference model) and upserts only the new names and deletes the names
+        that disappeared. Cached neighbour results are invalidated afterwards.
+        """
+        for i in range(0, len(added_names), batch_size):
+            batch = added_names[i:i + batch_size]
+            self.collection.upsert(
+                ids=[name_id(name) for name in batch],
+                documents=batch,
+                embeddings=self.index_model().encode(batch).tolist()
+            )
+
+        for name in removed_names:
+            ids = [name_id(name)]
+            # Entries indexed before the id scheme existed are matched by document
+            existing = self.collection.get(where_document={"$contains": name}, include=["documents"])
+            ids.extend(
+                doc_id for doc_id, document in zip(existing["ids"], existing["documents"])
+                if document.upper() == name
+            )
+            self.collection.delete(ids=ids)
+
+        # The collection now matches the reloaded drug data, even if no names changed
+        update_manifest(
+            self.persist_dir, count=self.collection.count(), data_version=DRUG_DICT.version,
+            names_sha256=names_checksum(sorted(DRUG_DICT.keys())),
         )
-    
\ No newline at end of file
+        self._names_sha256 = self._manifest_names()
+        if self.vector_index is not None and (added_names or removed_names):
+            # The export no longer matches the collection
+            self.vector_index = None
+            log.warning("Vector index is stale after sync, using Chroma; re-run: python -m utils.vector_index export")
+        if self.cache is not None and (added_names or removed_names):
+            self.cache.invalidate_neighbors(self.collection_fingerprint())
+        log.info("Synced vector store: %d names upserted, %d names removed", len(added_names), len(removed_names))
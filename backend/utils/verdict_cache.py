@@ -0,0 +1,160 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+
+def normalize_word(word: str) -> str:
+    return " ".join(word.split()).lower()
+
+
+def context_hash(sentence: str) -> str:
+    return hashlib.sha1(" ".join(sentence.split()).lower().encode("utf-8")).hexdigest()
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count (about four characters per token) used for savings reports.
+    """
+    return len(text) // 4 + 1
+
+
+class VerdictCache:
+    """
+    SQLite store of LLM pharmaceutical-term verdicts.
+
+    Context tier: (provider, model, prompt version, word, context hash) -> verdict.
+    Word tier:    (provider, model, prompt version, word) -> true/false counts; a word
+                  whose verdict has always been the same over at least
+                  word_tier_min observations is answered for any context.
+
+    Each verdict also keeps the LLM tokens and seconds it cost, which is what a
+    later hit saves. Only real LLM answers are ever stored.
+    """
+
+    def __init__(self, path: str, word_tier_min: int = 3):
+        self.path = path
+        self.word_tier_min = word_tier_min
+        self._lock = threading.Lock()
+        self.counters = {"context_hits": 0, "word_hits": 0, "misses": 0}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS verdicts (
+                provider TEXT NOT NULL,
+                model TEXT NOT NULL,
+                prompt_version TEXT NOT NULL,
+                word TEXT NOT NULL,
+                context_hash TEXT NOT NULL,
+                context TEXT NOT NULL,
+                verdict INTEGER NOT NULL,
+                tokens REAL NOT NULL,
+                seconds REAL NOT NULL,
+                created REAL NOT NULL,
+                PRIMARY KEY (provider, model, prompt_version, word, context_hash)
+            );
+            CREATE TABLE IF NOT EXISTS word_verdicts (
+                provider TEXT NOT NULL,
+                model TEXT NOT NULL,
+                prompt_version TEXT NOT NULL,
+                word TEXT NOT NULL,
+                true_count INTEGER NOT NULL,
+                false_count INTEGER NOT NULL,
+                tokens REAL NOT NULL,
+                seconds REAL NOT NULL,
+                PRIMARY KEY (provider, model, prompt_version, word)
+            );
+        """)
+        self._db.commit()
+
+    def lookup(self, namespace: tuple, word_to_sentence: dict):
+        """
+        Returns (verdicts, savings) for the pairs answerable from the cache:
+        verdicts maps the original word to its bool, savings sums the tokens
+        and seconds those hits would have cost and counts hits per tier.
+        """
+        verdicts = {}
+        savings = {"context_hits": 0, "word_hits": 0, "tokens": 0.0, "seconds": 0.0}
+        with self._lock:
+            for word, sentence in word_to_sentence.items():
+                key = normalize_word(word)
+                row = self._db.execute(
+                    "SELECT verdict, tokens, seconds FROM verdicts WHERE provider = ? AND model = ? "
+                    "AND prompt_version = ? AND word = ? AND context_hash = ?",
+                    (*namespace, key, context_hash(sentence))
+                ).fetchone()
+                if row is not None:
+                    verdicts[word] = bool(row[0])
+                    savings["context_hits"] += 1
+                    savings["tokens"] += row[1]
+                    savings["seconds"] += row[2]
+                    continue
+
+                row = self._db.execute(
+                    "SELECT true_count, false_count, tokens, seconds FROM word_verdicts WHERE provider = ? "
+                    "AND model = ? AND prompt_version = ? AND word = ?",
+                    (*namespace, key)
+                ).fetchone()
+                if row is None:
+                    self.counters["misses"] += 1
+                    continue
+                true_count, false_count, tokens, seconds = row
+                observations = true_count + false_count
+                if observations >= self.word_tier_min and (true_count == 0 or false_count == 0):
+                    verdicts[word] = true_count > 0
+                    savings["word_hits"] += 1
+                    savings["tokens"] += tokens / observations
+                    savings["seconds"] += seconds / observations
+                else:
+                    self.counters["misses"] += 1
+            self.counters["context_hits"] += savings["context_hits"]
+            self.counters["word_hits"] += savings["word_hits"]
+        return verdicts, savings
+
+    def store(self, namespace: tuple, word_to_sentence: dict, verdicts: dict, tokens: dict, seconds_per_word: float):
+        """
+        Records verdicts returned by the LLM. Words the LLM did not answer with a
+        boolean are skipped.
+        """
+        now = time.time()
+        with self._lock:
+            for word, verdict in verdicts.items():
+                if word not in word_to_sentence or not isinstance(verdict, bool):
+                    continue
+                key = normalize_word(word)
+                sentence = word_to_sentence[word]
+                cost = tokens.get(word, 0)
+                self._db.execute(
+                    "INSERT OR REPLACE INTO verdicts (provider, model, prompt_version, word, context_hash, "
+                    "context, verdict, tokens, seconds, created) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (*namespace, key, context_hash(sentence), sentence, int(verdict), cost, seconds_per_word, now)
+                )
+                self._db.execute(
+                    "INSERT INTO word_verdicts (provider, model, prompt_version, word, true_count, false_count, "
+                    "tokens, seconds) VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (provider, model, prompt_version, word) DO UPDATE SET "
+                    "true_count = true_count + excluded.true_count, false_count = false_count + excluded.false_count, "
+                    "tokens = tokens + excluded.tokens, seconds = seconds + excluded.seconds",
+                    (*namespace, key, int(verdict), int(not verdict), cost, seconds_per_word)
+                )
+            self._db.commit()
+
+
+_CACHES = {}
+_CACHES_LOCK = threading.Lock()
+
+
+def get_verdict_cache(path: str, word_tier_min: int = 3) -> VerdictCache:
+    """
+    Returns the process-wide verdict cache for a given file.
+    """
+    with _CACHES_LOCK:
+        cache = _CACHES.get(path)
+        if cache is None:
+            cache = VerdictCache(path, word_tier_min=word_tier_min)
+            _CACHES[path] = cache
+        return cache